@@ -2,4 +2,21 @@ name = 'libdna'
 from libdna.libdna import *
 from libdna.decode import *
 from libdna.encode import *
-
+from libdna.cache import *
+from libdna.variants import *
+from libdna.motif import *
+from libdna.shared import *
+from libdna.manifest import *
+from libdna.tensor import *
+from libdna.rank import *
+from libdna.diff import *
+from libdna.storage import *
+from libdna.spliced import *
+from libdna.translate import *
+from libdna.transcript import *
+from libdna.columnar import *
+from libdna.background import *
+from libdna.repeats import *
+from libdna.dataset import *
+from libdna.kmer import *
+from libdna.packed import *
@@ -0,0 +1,392 @@
+from array import array
+import random
+
+import gal
+
+from .decode import DNA2Bit
+from .rank import popcount
+
+# Bases summarised per bin. A multiple of 8 so bins are byte aligned in
+# the 2 bit and 1 bit files.
+DEFAULT_BACKGROUND_BIN_SIZE = 1000
+
+# Number of GC strata foreground and background regions are matched on
+DEFAULT_GC_STRATA = 20
+
+# Bins read in one go when building a summary
+BACKGROUND_CHUNK_BINS = 1000
+
+# Regions drawn from the windows of a stratum before moving on to the
+# next nearest one
+BACKGROUND_MAX_TRIES = 50
+
+
+class GCSummary:
+    """
+    Per bin counts of G/C, N and soft-masked bases for one chromosome,
+    with prefix sums so the counts of any run of bins are found in
+    constant time.
+    """
+
+    def __init__(self, chr: str, bin_size: int, gc: array, n: array, masked: array):
+        self.__chr = chr
+        self.__bin_size = bin_size
+        self.__gc = GCSummary._prefix(gc)
+        self.__n = GCSummary._prefix(n)
+        self.__masked = GCSummary._prefix(masked)
+
+    @staticmethod
+    def _prefix(counts: array) -> array:
+        ret = array("q", [0]) * (len(counts) + 1)
+
+        total = 0
+
+        for i, c in enumerate(counts):
+            total += c
+            ret[i + 1] = total
+
+        return ret
+
+    @property
+    def chr(self) -> str:
+        return self.__chr
+
+    @property
+    def bin_size(self) -> int:
+        return self.__bin_size
+
+    @property
+    def bins(self) -> int:
+        """
+        Number of complete bins.
+        """
+
+        return len(self.__gc) - 1
+
+    def gc(self, start: int, end: int) -> int:
+        """
+        G/C bases in bins [start, end).
+        """
+
+        return self.__gc[end] - self.__gc[start]
+
+    def n(self, start: int, end: int) -> int:
+        """
+        N bases in bins [start, end).
+        """
+
+        return self.__n[end] - self.__n[start]
+
+    def masked(self, start: int, end: int) -> int:
+        """
+        Soft-masked bases in bins [start, end).
+        """
+
+        return self.__masked[end] - self.__masked[start]
+
+
+def _gc_mask(n: int) -> int:
+    """
+    Mask selecting the low bit of every 2 bit base in n bytes.
+    """
+
+    return int.from_bytes(b"\x55" * n, "big")
+
+
+def _summary_2bit(dna: DNA2Bit, chr: str, bin_size: int, bins: int) -> tuple:
+    """
+    Count G/C, N and masked bases per bin straight from the packed
+    files. C (01) and G (10) are the codes whose two bits differ, so
+    popcount((x ^ (x >> 1)) & 0x55..) counts them; N is stored as A and
+    so never counts as G/C.
+    """
+
+    gc = array("I")
+    n = array("I")
+    masked = array("I")
+
+    b2 = bin_size // 4
+    b1 = bin_size // 8
+    m = _gc_mask(b2)
+
+    has_n = dna.manifest.has_n(chr) is not False
+    has_mask = dna.manifest.has_mask(chr) is not False
+
+    for c in range(0, bins, BACKGROUND_CHUNK_BINS):
+        k = min(BACKGROUND_CHUNK_BINS, bins - c)
+
+        data = dna.read_data(f"{chr}.dna.2bit", c * b2, k * b2)
+        n_data = dna.read_data(f"{chr}.n.1bit", c * b1, k * b1) if has_n else None
+        mask_data = (
+            dna.read_data(f"{chr}.mask.1bit", c * b1, k * b1) if has_mask else None
+        )
+
+        for i in range(k):
+            x = int.from_bytes(data[i * b2 : (i + 1) * b2], "big")
+            gc.append(popcount(((x ^ (x >> 1)) & m).to_bytes(b2, "big")))
+
+            n.append(popcount(n_data[i * b1 : (i + 1) * b1]) if n_data else 0)
+
+            masked.append(
+                popcount(mask_data[i * b1 : (i + 1) * b1]) if mask_data else 0
+            )
+
+    return gc, n, masked
+
+
+def _count_bytes(d: bytes) -> tuple:
+    """
+    G/C, N and masked bases in decoded chars.
+    """
+
+    gc = sum([d.count(b) for b in [b"C", b"G", b"c", b"g"]])
+    n = d.count(b"N") + d.count(b"n")
+    masked = sum([d.count(b) for b in [b"a", b"c", b"g", b"t", b"n"]])
+
+    return gc, n, masked
+
+
+def _summary_bytes(dna, chr: str, bin_size: int, bins: int) -> tuple:
+    """
+    Count G/C, N and masked bases per bin from decoded chars, for
+    readers without separate N and mask files.
+    """
+
+    gc = array("I")
+    n = array("I")
+    masked = array("I")
+
+    for c in range(0, bins, BACKGROUND_CHUNK_BINS):
+        k = min(BACKGROUND_CHUNK_BINS, bins - c)
+
+        data = dna._dna_bytes(
+            gal.genomic.Location(chr, c * bin_size + 1, (c + k) * bin_size),
+            mask="lower",
+        )
+
+        for i in range(k):
+            g, x, m = _count_bytes(data[i * bin_size : (i + 1) * bin_size])
+            gc.append(g)
+            n.append(x)
+            masked.append(m)
+
+    return gc, n, masked
+
+
+class BackgroundSampler:
+    """
+    Draws random background regions matching the lengths and GC content
+    of a set of foreground regions while avoiding N, and optionally
+    soft-masked, bases.
+
+    A coarse summary of each chromosome is built once from the packed
+    files. A region of length L is drawn from a window of whole bins
+    covering it, and windows are grouped into GC and soft-mask strata
+    using the summary alone. Only the drawn region is then read to
+    confirm it falls in the same strata as its foreground region, so
+    few sequences are discarded.
+    """
+
+    def __init__(
+        self,
+        dna,
+        bin_size: int = DEFAULT_BACKGROUND_BIN_SIZE,
+        strata: int = DEFAULT_GC_STRATA,
+        avoid_masked: bool = False,
+        chrs: list = None,
+        seed: int = None,
+    ):
+        """
+        Parameters
+        ----------
+        dna : DNA2Bit or DNA4Bit
+            Reader.
+        bin_size : int, optional
+            Bases per summary bin, a multiple of 8.
+        strata : int, optional
+            Number of equal width GC strata, and of mask strata.
+        avoid_masked : bool, optional
+            Exclude windows containing soft-masked bases.
+        chrs : list, optional
+            Chromosomes to sample from. Defaults to all in the manifest.
+        seed : int, optional
+            Random seed.
+        """
+
+        if bin_size % 8 != 0:
+            raise ValueError("bin_size must be a multiple of 8")
+
+        self.__dna = dna
+        self.__bin_size = bin_size
+        self.__strata = strata
+        self.__avoid_masked = avoid_masked
+        self.__chrs = chrs if chrs is not None else dna.manifest.chrs
+        self.__random = random.Random(seed)
+        # chr -> GCSummary
+        self.__summaries = {}
+        # window bins -> (gc stratum, mask stratum) -> list of (chr, bin)
+        self.__windows = {}
+
+    @property
+    def bin_size(self) -> int:
+        return self.__bin_size
+
+    def summary(self, chr: str) -> GCSummary:
+        """
+        Returns the summary of a chromosome, building it on first use.
+        """
+
+        if chr not in self.__summaries:
+            bins = self.__dna.chr_length(chr) // self.__bin_size
+
+            if isinstance(self.__dna, DNA2Bit):
+                counts = _summary_2bit(self.__dna, chr, self.__bin_size, bins)
+            else:
+                counts = _summary_bytes(self.__dna, chr, self.__bin_size, bins)
+
+            self.__summaries[chr] = GCSummary(chr, self.__bin_size, *counts)
+
+        return self.__summaries[chr]
+
+    def _stratum(self, count: int, length: int) -> int:
+        if length <= 0:
+            return 0
+
+        return min(count * self.__strata // length, self.__strata - 1)
+
+    def strata(self, loc: gal.genomic.Location) -> tuple:
+        """
+        GC and soft-mask strata of a location. GC is measured over the
+        non-N bases. The mask stratum is always 0 when masked bases are
+        avoided.
+
+        Returns
+        -------
+        tuple
+            (gc stratum, mask stratum).
+        """
+
+        gc, n, masked = _count_bytes(self.__dna._dna_bytes(loc, mask="lower"))
+
+        return (
+            self._stratum(gc, loc.length - n),
+            0 if self.__avoid_masked else self._stratum(masked, loc.length),
+        )
+
+    def _window_strata(self, k: int) -> dict:
+        """
+        Candidate windows of k bins without N (or masked bases) grouped
+        by GC and mask stratum.
+        """
+
+        if k not in self.__windows:
+            strata = {}
+
+            length = k * self.__bin_size
+
+            for chr in self.__chrs:
+                s = self.summary(chr)
+
+                for b in range(s.bins - k + 1):
+                    if s.n(b, b + k) > 0:
+                        continue
+
+                    masked = s.masked(b, b + k)
+
+                    if self.__avoid_masked:
+                        if masked > 0:
+                            continue
+
+                        key = (self._stratum(s.gc(b, b + k), length), 0)
+                    else:
+                        key = (
+                            self._stratum(s.gc(b, b + k), length),
+                            self._stratum(masked, length),
+                        )
+
+                    strata.setdefault(key, []).append((chr, b))
+
+            self.__windows[k] = strata
+
+        return self.__windows[k]
+
+    def gc_content(self, loc: gal.genomic.Location) -> float:
+        """
+        Fraction of the non-N bases of a location that are G or C.
+        """
+
+        codes = self.__dna._read_codes(loc)
+        acgt = len(codes) - codes.count(4)
+
+        if acgt == 0:
+            return 0
+
+        return (codes.count(1) + codes.count(2)) / acgt
+
+    def _draw(self, windows: dict, keys: list, k: int, length: int):
+        """
+        Draw a region from the windows of the first stratum in keys that
+        yields one in the same stratum.
+        """
+
+        for key in keys:
+            candidates = windows[key]
+
+            for i in range(BACKGROUND_MAX_TRIES):
+                chr, b = self.__random.choice(candidates)
+                # place the region anywhere in its window
+                start = (
+                    b * self.__bin_size
+                    + 1
+                    + self.__random.randint(0, k * self.__bin_size - length)
+                )
+                loc = gal.genomic.Location(chr, start, start + length - 1)
+
+                # a region covers only part of its window so its own GC
+                # and mask content can fall in another stratum
+                if self.strata(loc) == key:
+                    return loc
+
+        return None
+
+    def sample(self, foreground, n: int = 1) -> list:
+        """
+        Draw background regions matched to foreground regions.
+
+        Parameters
+        ----------
+        foreground : list
+            gal.genomic.Location foreground regions.
+        n : int, optional
+            Number of background regions per foreground region.
+
+        Returns
+        -------
+        list
+            Background locations, n per foreground region in the same
+            order, each in the GC and mask strata of its foreground
+            region. A foreground region whose strata have no candidate
+            region is matched from the nearest strata.
+        """
+
+        ret = []
+
+        for loc in foreground:
+            length = loc.length
+            k = -(-length // self.__bin_size)
+            gs, ms = self.strata(loc)
+
+            windows = self._window_strata(k)
+
+            # strata with candidate windows, nearest first
+            keys = sorted(windows, key=lambda key: abs(key[0] - gs) + abs(key[1] - ms))
+
+            for i in range(n):
+                region = self._draw(windows, keys, k, length)
+
+                if region is None:
+                    raise ValueError(f"no background windows for {loc}")
+
+                ret.append(region)
+
+        return ret
@@ -0,0 +1,248 @@
+from bisect import bisect_right, insort
+from collections import OrderedDict
+import gal
+
+from .decode import DNA
+
+# Default upper bound on the number of decoded bases held by a cache
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class DNACache(DNA):
+    """
+    LRU cache of decoded sequences that sits in front of a DNA reader
+    such as DNA2Bit or DNA4Bit. Entries are keyed by
+    (chr, start, end, mask, rev_comp, lowercase) and the cache is bounded
+    by the total number of bytes held. Queries that lie fully inside a
+    cached interval with the same options are answered by slicing the
+    cached sequence rather than decoding again.
+    """
+
+    def __init__(self, dna: DNA, max_bytes: int = DEFAULT_CACHE_BYTES):
+        """
+        Parameters
+        ----------
+        dna : DNA
+            Reader to fetch sequences from on a cache miss.
+        max_bytes : int, optional
+            Maximum number of bytes of sequence to keep.
+        """
+
+        self.__dna = dna
+        self.__max_bytes = max_bytes
+        self.__bytes = 0
+        # (chr, start, end, mask, rev_comp, lowercase) -> str
+        self.__cache = OrderedDict()
+        # (chr, mask, rev_comp, lowercase) -> sorted list of (start, end)
+        self.__intervals = {}
+        # (chr, mask, rev_comp, lowercase) -> longest interval cached
+        self.__max_length = {}
+        self.__hits = 0
+        self.__contained_hits = 0
+        self.__misses = 0
+
+    @property
+    def reader(self) -> DNA:
+        return self.__dna
+
+    @property
+    def dir(self):
+        return self.__dna.dir
+
+    @property
+    def max_bytes(self) -> int:
+        return self.__max_bytes
+
+    @property
+    def size(self) -> int:
+        """
+        Number of bytes of sequence currently cached.
+        """
+        return self.__bytes
+
+    @property
+    def hits(self) -> int:
+        """
+        Number of queries answered from the cache, including
+        containment hits.
+        """
+        return self.__hits + self.__contained_hits
+
+    @property
+    def contained_hits(self) -> int:
+        return self.__contained_hits
+
+    @property
+    def misses(self) -> int:
+        return self.__misses
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.__misses
+
+        if total == 0:
+            return 0.0
+
+        return self.hits / total
+
+    def stats(self) -> dict:
+        """
+        Returns
+        -------
+        dict
+            Summary of cache usage.
+        """
+
+        return {
+            "hits": self.__hits,
+            "contained_hits": self.__contained_hits,
+            "misses": self.__misses,
+            "hit_rate": self.hit_rate,
+            "entries": len(self.__cache),
+            "bytes": self.__bytes,
+            "max_bytes": self.__max_bytes,
+        }
+
+    def clear(self):
+        """
+        Remove all entries from the cache. Statistics are kept.
+        """
+
+        self.__cache.clear()
+        self.__intervals.clear()
+        self.__max_length.clear()
+        self.__bytes = 0
+
+    def _find_containing(self, group, start: int, end: int):
+        """
+        Find a cached interval in a group that contains start-end.
+
+        Returns
+        -------
+        tuple
+            (start, end) of the containing interval or None.
+        """
+
+        intervals = self.__intervals.get(group)
+
+        if intervals is None:
+            return None
+
+        max_length = self.__max_length[group]
+
+        # intervals are sorted by start so only those starting at or
+        # before the query can contain it. Stop once they are too far
+        # away to reach the query end.
+        i = bisect_right(intervals, (start, float("inf"))) - 1
+
+        while i >= 0:
+            s, e = intervals[i]
+
+            if s + max_length - 1 < end:
+                break
+
+            if e >= end:
+                return (s, e)
+
+            i -= 1
+
+        return None
+
+    def _add(self, key, group, seq: str):
+        n = len(seq)
+
+        if n > self.__max_bytes:
+            return
+
+        self.__cache[key] = seq
+        self.__bytes += n
+
+        chr, start, end, mask, rev_comp, lowercase = key
+
+        if group not in self.__intervals:
+            self.__intervals[group] = []
+            self.__max_length[group] = 0
+
+        insort(self.__intervals[group], (start, end))
+
+        if n > self.__max_length[group]:
+            self.__max_length[group] = n
+
+        while self.__bytes > self.__max_bytes:
+            self._evict()
+
+    def _evict(self):
+        key, seq = self.__cache.popitem(last=False)
+
+        self.__bytes -= len(seq)
+
+        chr, start, end, mask, rev_comp, lowercase = key
+        group = (chr, mask, rev_comp, lowercase)
+
+        intervals = self.__intervals[group]
+        i = bisect_right(intervals, (start, end)) - 1
+        del intervals[i]
+
+        if len(intervals) == 0:
+            del self.__intervals[group]
+            del self.__max_length[group]
+
+    def dna(
+        self, loc: gal.genomic.Location, mask="lower", rev_comp=False, lowercase=False
+    ):
+        """
+        Returns the DNA for a location, using the cache where possible.
+
+        Parameters
+        ----------
+        loc : gal.genomic.Location
+            Genomic Location
+        mask : str, optional
+            Indicate whether masked bases should be represented as is
+            ('upper'), lowercase ('lower'), or as N ('n')
+        rev_comp : bool, optional
+            Whether to reverse complement the sequence.
+        lowercase : bool, optional
+            Indicates whether sequence should be displayed as upper or
+            lowercase.
+
+        Returns
+        -------
+        str
+            DNA sequence.
+        """
+
+        key = (loc.chr, loc.start, loc.end, mask, rev_comp, lowercase)
+
+        seq = self.__cache.get(key)
+
+        if seq is not None:
+            self.__cache.move_to_end(key)
+            self.__hits += 1
+            return seq
+
+        group = (loc.chr, mask, rev_comp, lowercase)
+
+        container = self._find_containing(group, loc.start, loc.end)
+
+        if container is not None:
+            s, e = container
+            ckey = (loc.chr, s, e, mask, rev_comp, lowercase)
+            self.__cache.move_to_end(ckey)
+            self.__contained_hits += 1
+
+            seq = self.__cache[ckey]
+
+            if rev_comp:
+                # cached sequence runs from e back to s
+                return seq[e - loc.end : e - loc.start + 1]
+            else:
+                return seq[loc.start - s : loc.end - s + 1]
+
+        self.__misses += 1
+
+        seq = self.__dna.dna(loc, mask=mask, rev_comp=rev_comp, lowercase=lowercase)
+
+        self._add(key, group, seq)
+
+        return seq
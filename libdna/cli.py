@@ -0,0 +1,496 @@
+"""
+Command line interface.
+
+    libdna encode genome.fa.gz --dir hg19 --jobs 8
+    libdna extract --dir hg19 --bed regions.bed --workers 4 > regions.fa
+    cat locs.txt | libdna extract --dir hg19 --output tsv
+    libdna manifest --dir hg19
+    libdna diff hg19 hg19.patched > changed.bed
+    libdna transcripts --dir hg19 --gtf genes.gtf > transcripts.fa
+    libdna repeats --dir hg19 > repeats.bed
+    libdna dataset --dir hg19 --bed windows.bed --out windows --workers 8
+    libdna kmer-index --dir hg19 --k 23 --out hg19.k23 --canonical
+    libdna kmer-search --index hg19.k23 --mismatches 2 < guides.txt > hits.bed
+    libdna serve --dir hg19 --socket /tmp/libdna.sock
+    libdna query --socket /tmp/libdna.sock chr1:100-200
+"""
+
+import argparse
+import itertools
+import multiprocessing
+import sys
+import gal
+
+from .dataset import DATASET_ENCODINGS, DEFAULT_SHARD_ROWS, write_dataset
+from .decode import DNA2Bit, DNA4Bit
+from .diff import diff_genomes
+from .encode import encode_genome
+from .kmer import DEFAULT_KMER_SHARD_SIZE, KmerIndex, build_kmer_index
+from .libdna import format_dna, parse_locations
+from .manifest import build_manifest
+from .repeats import DEFAULT_REPEAT_MIN_LENGTH, find_repeats
+from . import server
+from .transcript import read_transcripts, transcript_batch
+
+DEFAULT_BATCH_SIZE = 10000
+
+# reader used by extract worker processes
+_reader = None
+
+
+def _create_reader(dir: str, format: str):
+    if format == "4bit":
+        return DNA4Bit(dir)
+    else:
+        return DNA2Bit(dir)
+
+
+def _init_worker(dir: str, format: str):
+    global _reader
+
+    _reader = _create_reader(dir, format)
+
+
+def _parse_region(line: str, strand: str):
+    """
+    Parse a BED line or a location string such as chr1:100-200.
+
+    Returns
+    -------
+    tuple
+        (name, chr, start, end, rev_comp) with 1-based coordinates or
+        None if the line is blank or a header.
+    """
+
+    line = line.rstrip("\n")
+
+    if line == "" or line.startswith(("#", "track", "browser")):
+        return None
+
+    if "\t" in line:
+        tokens = line.split("\t")
+        chr = tokens[0]
+        # BED is 0-based
+        start = int(tokens[1]) + 1
+        end = int(tokens[2])
+
+        if start < 1 or end < start:
+            raise ValueError(f"{line.strip()} is not a valid BED interval")
+
+        name = tokens[3] if len(tokens) > 3 else f"{chr}:{start}-{end}"
+        s = tokens[5] if len(tokens) > 5 else "+"
+    else:
+        # same syntax as the server: any chromosome name, and reversed
+        # coordinates are swapped
+        parsed = parse_locations([line.strip()])
+
+        if len(parsed.bad) > 0:
+            raise ValueError(f"{line.strip()} is not a valid location")
+
+        chr = parsed.chrs[0]
+        start = parsed.starts[0]
+        end = parsed.ends[0]
+        name = f"{chr}:{start}-{end}"
+        s = "+"
+
+    if strand != "auto":
+        s = strand
+
+    return (name, chr, start, end, s == "-")
+
+
+def _extract_batch(args):
+    batch, mask = args
+
+    seqs = _reader.dna_batch(
+        [gal.genomic.Location(chr, start, end) for name, chr, start, end, rc in batch],
+        mask=mask,
+        rev_comp=[rc for name, chr, start, end, rc in batch],
+    )
+
+    return [(batch[i][0], seq) for i, seq in enumerate(seqs)]
+
+
+def _batches(f, strand: str, batch_size: int):
+    batch = []
+
+    for line in f:
+        region = _parse_region(line, strand)
+
+        if region is None:
+            continue
+
+        batch.append(region)
+
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+
+    if len(batch) > 0:
+        yield batch
+
+
+def _write(results, output: str, out):
+    for name, seq in results:
+        if output == "tsv":
+            print(f"{name}\t{seq}", file=out)
+        else:
+            print(f">{name}", file=out)
+            print(format_dna(seq), end="", file=out)
+
+
+def extract(
+    dir: str,
+    f,
+    out=None,
+    format: str = "2bit",
+    output: str = "fasta",
+    mask: str = "lower",
+    strand: str = "auto",
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    workers: int = 1,
+):
+    """
+    Stream regions from a BED or location file and write their
+    sequences.
+
+    Parameters
+    ----------
+    dir : str
+        Genome directory.
+    f : file
+        Open file of BED lines or location strings.
+    out : file, optional
+        Where to write sequences. Defaults to stdout.
+    format : str, optional
+        Either '2bit' or '4bit'.
+    output : str, optional
+        Either 'fasta' or 'tsv'.
+    mask : str, optional
+        Either 'upper', 'lower' or 'n'.
+    strand : str, optional
+        '+' or '-' to force a strand, or 'auto' to use the BED strand
+        column.
+    batch_size : int, optional
+        Number of regions extracted together.
+    workers : int, optional
+        Number of worker processes.
+    """
+
+    if out is None:
+        out = sys.stdout
+
+    batches = _batches(f, strand, batch_size)
+
+    if workers < 2:
+        _init_worker(dir, format)
+
+        for batch in batches:
+            _write(_extract_batch((batch, mask)), output, out)
+
+        return
+
+    with multiprocessing.Pool(
+        workers, initializer=_init_worker, initargs=(dir, format)
+    ) as pool:
+        # keep a bounded number of batches in flight so input is streamed
+        while True:
+            window = []
+
+            for batch in batches:
+                window.append((batch, mask))
+
+                if len(window) == 2 * workers:
+                    break
+
+            if len(window) == 0:
+                break
+
+            for results in pool.imap(_extract_batch, window):
+                _write(results, output, out)
+
+
+def write_transcripts(
+    dir: str,
+    gtf: str,
+    out=None,
+    format: str = "2bit",
+    feature: str = "exon",
+    mask: str = "lower",
+    batch_size: int = DEFAULT_BATCH_SIZE,
+):
+    """
+    Write the spliced sequence of every transcript in a GTF or GFF3 file
+    as FASTA.
+
+    Parameters
+    ----------
+    dir : str
+        Genome directory.
+    gtf : str
+        GTF or GFF3 file, optionally gzipped.
+    out : file, optional
+        Where to write sequences. Defaults to stdout.
+    format : str, optional
+        Either '2bit' or '4bit'.
+    feature : str, optional
+        Feature type joined into each transcript.
+    mask : str, optional
+        Either 'upper', 'lower' or 'n'.
+    batch_size : int, optional
+        Number of transcripts extracted together.
+    """
+
+    if out is None:
+        out = sys.stdout
+
+    dna = _create_reader(dir, format)
+
+    transcripts = read_transcripts(gtf, feature=feature)
+
+    for i in range(0, len(transcripts), batch_size):
+        batch = transcripts[i : i + batch_size]
+        seqs = transcript_batch(dna, batch, mask=mask)
+
+        _write([(t.id, seqs[j]) for j, t in enumerate(batch)], "fasta", out)
+
+
+def _dataset_intervals(f, strand: str):
+    for line in f:
+        region = _parse_region(line, strand)
+
+        if region is not None:
+            name, chr, start, end, rc = region
+            yield (gal.genomic.Location(chr, start, end), rc)
+
+
+def search_kmers(
+    index: str, f, out=None, mismatches: int = 0, batch_size: int = 1000
+):
+    """
+    Write every occurrence of the sequences in a file, one per line, as
+    BED with the sequence as the name and the mismatches as the score.
+
+    Parameters
+    ----------
+    index : str
+        k-mer index directory.
+    f : file
+        Open file of sequences.
+    out : file, optional
+        Where to write hits. Defaults to stdout.
+    mismatches : int, optional
+        Number of mismatched bases allowed.
+    batch_size : int, optional
+        Number of sequences looked up together.
+    """
+
+    if out is None:
+        out = sys.stdout
+
+    idx = KmerIndex(index)
+
+    seqs = (line.strip() for line in f)
+    seqs = (seq for seq in seqs if seq != "" and not seq.startswith("#"))
+
+    while True:
+        batch = list(itertools.islice(seqs, batch_size))
+
+        if len(batch) == 0:
+            break
+
+        for seq, hits in zip(batch, idx.lookup_batch(batch, mismatches=mismatches)):
+            for h in hits:
+                # BED is 0-based
+                bed = [h.chr, h.start - 1, h.end, seq, h.mismatches, h.strand]
+                print("\t".join([str(v) for v in bed]), file=out)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog="libdna", description="libdna tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    encode = commands.add_parser("encode", help="encode a genome FASTA file")
+    encode.add_argument("files", nargs="+", help="FASTA files, optionally gzipped")
+    encode.add_argument("--dir", default=".", help="output directory")
+    encode.add_argument("--format", choices=["2bit", "4bit"], default="2bit")
+    encode.add_argument(
+        "--jobs", type=int, default=1, help="chromosomes to encode in parallel"
+    )
+    encode.add_argument(
+        "--force", action="store_true", help="re-encode unchanged chromosomes"
+    )
+
+    man = commands.add_parser(
+        "manifest", help="build the manifest of an encoded genome directory"
+    )
+    man.add_argument("--dir", required=True, help="genome directory")
+
+    ex = commands.add_parser("extract", help="extract sequences for regions")
+    ex.add_argument("--dir", required=True, help="genome directory")
+    ex.add_argument("--format", choices=["2bit", "4bit"], default="2bit")
+    ex.add_argument("--bed", help="BED file of regions, otherwise read stdin")
+    ex.add_argument("--output", choices=["fasta", "tsv"], default="fasta")
+    ex.add_argument("--mask", choices=["upper", "lower", "n"], default="lower")
+    ex.add_argument("--strand", choices=["auto", "+", "-"], default="auto")
+    ex.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    ex.add_argument("--workers", type=int, default=1)
+
+    diff = commands.add_parser(
+        "diff", help="write the intervals that differ between two genomes as BED"
+    )
+    diff.add_argument("dir1", help="first genome directory")
+    diff.add_argument("dir2", help="second genome directory")
+    diff.add_argument("--format", choices=["2bit", "4bit"], default="2bit")
+
+    tx = commands.add_parser(
+        "transcripts", help="write spliced transcript sequences from a GTF or GFF3"
+    )
+    tx.add_argument("--dir", required=True, help="genome directory")
+    tx.add_argument("--gtf", required=True, help="GTF or GFF3 file")
+    tx.add_argument("--feature", default="exon", help="feature type, e.g. CDS")
+    tx.add_argument("--format", choices=["2bit", "4bit"], default="2bit")
+    tx.add_argument("--mask", choices=["upper", "lower", "n"], default="lower")
+
+    rep = commands.add_parser(
+        "repeats", help="write homopolymers and short tandem repeats as BED"
+    )
+    rep.add_argument("--dir", required=True, help="genome directory")
+    rep.add_argument("--format", choices=["2bit", "4bit"], default="2bit")
+    rep.add_argument("--chr", action="append", help="chromosome to scan")
+    rep.add_argument(
+        "--min-length",
+        type=int,
+        help="shortest repeat reported for every period, otherwise per period defaults",
+    )
+
+    ds = commands.add_parser(
+        "dataset", help="write fixed length windows to a sharded array dataset"
+    )
+    ds.add_argument("--dir", required=True, help="genome directory")
+    ds.add_argument("--out", required=True, help="dataset directory")
+    ds.add_argument("--format", choices=["2bit", "4bit"], default="2bit")
+    ds.add_argument("--bed", help="BED file of windows, otherwise read stdin")
+    ds.add_argument("--encoding", choices=DATASET_ENCODINGS, default="codes")
+    ds.add_argument("--strand", choices=["auto", "+", "-"], default="auto")
+    ds.add_argument("--shard-rows", type=int, default=DEFAULT_SHARD_ROWS)
+    ds.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    ds.add_argument("--workers", type=int, default=1)
+    ds.add_argument(
+        "--restart", action="store_true", help="overwrite rather than resume"
+    )
+
+    ki = commands.add_parser("kmer-index", help="build a k-mer position index")
+    ki.add_argument("--dir", required=True, help="genome directory")
+    ki.add_argument("--out", required=True, help="index directory")
+    ki.add_argument("--k", type=int, required=True, help="k-mer size, at most 32")
+    ki.add_argument("--format", choices=["2bit", "4bit"], default="2bit")
+    ki.add_argument("--chr", action="append", help="chromosome to index")
+    ki.add_argument(
+        "--canonical", action="store_true", help="store strand independent k-mers"
+    )
+    ki.add_argument("--shard-size", type=int, default=DEFAULT_KMER_SHARD_SIZE)
+
+    ks = commands.add_parser("kmer-search", help="write k-mer occurrences as BED")
+    ks.add_argument("--index", required=True, help="index directory")
+    ks.add_argument("--seqs", help="file of sequences, otherwise read stdin")
+    ks.add_argument("--mismatches", type=int, default=0)
+
+    server.add_arguments(commands)
+
+    args = parser.parse_args(args)
+
+    if args.command == "encode":
+        for file in args.files:
+            encode_genome(
+                file,
+                format=args.format,
+                dir=args.dir,
+                jobs=args.jobs,
+                force=args.force,
+            )
+    elif args.command == "manifest":
+        build_manifest(args.dir)
+    elif args.command == "transcripts":
+        write_transcripts(
+            args.dir,
+            args.gtf,
+            format=args.format,
+            feature=args.feature,
+            mask=args.mask,
+        )
+    elif args.command == "repeats":
+        min_length = args.min_length
+
+        if min_length is None:
+            min_length = DEFAULT_REPEAT_MIN_LENGTH
+
+        for r in find_repeats(
+            _create_reader(args.dir, args.format), chrs=args.chr, min_length=min_length
+        ):
+            # BED is 0-based, unit as the name and period as the score
+            print(f"{r.chr}\t{r.start - 1}\t{r.end}\t{r.unit}\t{r.period}")
+    elif args.command == "dataset":
+        f = open(args.bed, "r") if args.bed is not None else sys.stdin
+
+        try:
+            write_dataset(
+                _create_reader(args.dir, args.format),
+                _dataset_intervals(f, args.strand),
+                args.out,
+                encoding=args.encoding,
+                shard_rows=args.shard_rows,
+                batch_size=args.batch_size,
+                workers=args.workers,
+                resume=not args.restart,
+            )
+        finally:
+            if f is not sys.stdin:
+                f.close()
+    elif args.command == "kmer-index":
+        build_kmer_index(
+            _create_reader(args.dir, args.format),
+            args.k,
+            args.out,
+            chrs=args.chr,
+            canonical=args.canonical,
+            shard_size=args.shard_size,
+        )
+    elif args.command == "kmer-search":
+        f = open(args.seqs, "r") if args.seqs is not None else sys.stdin
+
+        try:
+            search_kmers(args.index, f, mismatches=args.mismatches)
+        finally:
+            if f is not sys.stdin:
+                f.close()
+    elif args.command in ["serve", "query"]:
+        server.run(args)
+    elif args.command == "diff":
+        for d in diff_genomes(args.dir1, args.dir2, format=args.format):
+            # BED is 0-based
+            print(f"{d.chr}\t{d.start - 1}\t{d.end}\t{d.type}")
+    else:
+        if args.bed is not None:
+            f = open(args.bed, "r")
+        else:
+            f = sys.stdin
+
+        try:
+            extract(
+                args.dir,
+                f,
+                format=args.format,
+                output=args.output,
+                mask=args.mask,
+                strand=args.strand,
+                batch_size=args.batch_size,
+                workers=args.workers,
+            )
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+from .libdna import location_blocks
+from .util import np, require_numpy
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+# Largest span of sequence read in one go when filling a column
+DEFAULT_COLUMNAR_BLOCK_SIZE = 1000000
+
+# Arrow string arrays with 32 bit offsets hold at most this many bytes
+ARROW_MAX_STRING_BYTES = 2147483647
+
+DNA_COMP_BYTES_TABLE = bytes.maketrans(b"ACGTacgtNn", b"TGCAtgcaNn")
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("pyarrow is required for Arrow output")
+
+
+def _int_column(values):
+    """
+    Convert an Arrow array, pandas Series, numpy array or any sequence of
+    integers to an int64 numpy array, straight from the buffers where
+    possible.
+    """
+
+    if hasattr(values, "to_numpy"):
+        values = values.to_numpy()
+
+    return np.asarray(values, dtype=np.int64)
+
+
+def _category_column(values) -> tuple:
+    """
+    Dictionary encode a column such as chromosome names or strands so
+    that only its distinct values become Python objects. Arrow arrays
+    are dictionary encoded, pandas Series factorized and numpy arrays
+    passed to numpy.unique. Other sequences are encoded one value at a
+    time.
+
+    Returns
+    -------
+    tuple
+        (values, codes) where values lists the distinct values and codes
+        is an int array of the index of each row's value.
+    """
+
+    if hasattr(values, "dictionary_encode"):
+        if hasattr(values, "combine_chunks"):
+            values = values.combine_chunks()
+
+        if not pa.types.is_dictionary(values.type):
+            values = values.dictionary_encode()
+
+        return (
+            values.dictionary.to_pylist(),
+            values.indices.to_numpy(zero_copy_only=False),
+        )
+
+    if hasattr(values, "factorize"):
+        codes, uniques = values.factorize()
+        return list(uniques), codes
+
+    if isinstance(values, np.ndarray):
+        uniques, codes = np.unique(values, return_inverse=True)
+        return uniques.tolist(), codes
+
+    index = {}
+    codes = np.fromiter(
+        (index.setdefault(v, len(index)) for v in values), dtype=np.int64
+    )
+
+    return list(index), codes
+
+
+def _rev_comp_column(rev_comp, n: int):
+    if isinstance(rev_comp, bool):
+        return np.full(n, rev_comp)
+
+    values, codes = _category_column(rev_comp)
+
+    if len(codes) != n:
+        raise ValueError("rev_comp must have one entry per row")
+
+    # a strand column can be used directly
+    flags = np.array(
+        [v == "-" if isinstance(v, str) else bool(v) for v in values], dtype=bool
+    )
+
+    return flags[codes] if len(flags) > 0 else np.zeros(n, dtype=bool)
+
+
+def dna_buffers(
+    dna,
+    chrs,
+    starts,
+    ends,
+    mask: str = "lower",
+    rev_comp=False,
+    zero_based: bool = False,
+    block_size: int = DEFAULT_COLUMNAR_BLOCK_SIZE,
+):
+    """
+    Decode the sequences of columns of locations into one contiguous
+    data buffer and an offsets array, the layout of an Arrow string
+    column, without creating a str or gal.genomic.Location per row.
+    Columns are read as numpy arrays, with chromosome names dictionary
+    encoded, and rows are sorted by position with numpy so nearby rows
+    are served from a single read of up to block_size bases.
+
+    Parameters
+    ----------
+    dna : DNA2Bit or DNA4Bit
+        Reader.
+    chrs : sequence
+        Chromosome of each row.
+    starts : sequence
+        Start of each row.
+    ends : sequence
+        End of each row, inclusive for 1-based coordinates.
+    mask : str, optional
+        Either 'upper', 'lower' or 'n'.
+    rev_comp : bool or sequence, optional
+        Reverse complement all rows, or those flagged in a column of
+        bools or strands.
+    zero_based : bool, optional
+        Whether starts are 0-based with exclusive ends as in BED files.
+    block_size : int, optional
+        Maximum span of a single read.
+
+    Returns
+    -------
+    tuple
+        (offsets, data) where row i is data[offsets[i]:offsets[i + 1]].
+        offsets is an int64 numpy array of n + 1 entries and data a
+        bytearray.
+    """
+
+    require_numpy("columnar output")
+
+    names, codes = _category_column(chrs)
+    starts = _int_column(starts)
+    ends = _int_column(ends)
+
+    n = len(codes)
+
+    if len(starts) != n or len(ends) != n:
+        raise ValueError("chrs, starts and ends must have the same length")
+
+    if zero_based:
+        starts = starts + 1
+
+    rev_comp = _rev_comp_column(rev_comp, n)
+
+    lengths = ends - starts + 1
+
+    if n > 0 and lengths.min() < 0:
+        i = int(np.argmax(lengths < 0))
+        raise ValueError(
+            f"{names[codes[i]]}:{starts[i]}-{ends[i]} has a negative length"
+        )
+
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    data = bytearray(int(offsets[n]))
+
+    # rows refer to the distinct names so no str is created per row
+    chrs = np.array(names, dtype=object)[codes] if n > 0 else []
+
+    for loc, members in location_blocks(
+        chrs, starts, ends, block_size, order=np.lexsort((starts, codes)).tolist()
+    ):
+        dna._check_bounds(loc)
+        block = dna._dna_bytes(loc, mask=mask)
+
+        for k in members:
+            seq = block[starts[k] - loc.start : ends[k] - loc.start + 1]
+
+            if rev_comp[k]:
+                seq = seq.translate(DNA_COMP_BYTES_TABLE)
+                seq.reverse()
+
+            data[offsets[k] : offsets[k + 1]] = seq
+
+    return offsets, data
+
+
+def dna_arrow(
+    dna,
+    chrs,
+    starts,
+    ends,
+    mask: str = "lower",
+    rev_comp=False,
+    zero_based: bool = False,
+    binary: bool = False,
+    block_size: int = DEFAULT_COLUMNAR_BLOCK_SIZE,
+):
+    """
+    Returns the sequences of columns of locations as an Arrow string, or
+    binary, array built directly on the decoded buffers. See
+    dna_buffers.
+
+    Parameters
+    ----------
+    dna : DNA2Bit or DNA4Bit
+        Reader.
+    chrs : sequence
+        Chromosome of each row, e.g. an Arrow array or pandas Series.
+    starts : sequence
+        Start of each row.
+    ends : sequence
+        End of each row.
+    mask : str, optional
+        Either 'upper', 'lower' or 'n'.
+    rev_comp : bool or sequence, optional
+        Reverse complement all rows, or those flagged in a column of
+        bools or strands.
+    zero_based : bool, optional
+        Whether starts are 0-based with exclusive ends as in BED files.
+    binary : bool, optional
+        Return a binary array rather than a string array.
+    block_size : int, optional
+        Maximum span of a single read.
+
+    Returns
+    -------
+    pyarrow.Array
+        One sequence per row. Large (64 bit offset) types are used if
+        the sequences exceed 2 GB.
+    """
+
+    _require_pyarrow()
+
+    offsets, data = dna_buffers(
+        dna,
+        chrs,
+        starts,
+        ends,
+        mask=mask,
+        rev_comp=rev_comp,
+        zero_based=zero_based,
+        block_size=block_size,
+    )
+
+    if len(data) > ARROW_MAX_STRING_BYTES:
+        type = pa.large_binary() if binary else pa.large_string()
+    else:
+        type = pa.binary() if binary else pa.string()
+        offsets = offsets.astype(np.int32)
+
+    return pa.Array.from_buffers(
+        type,
+        len(offsets) - 1,
+        [None, pa.py_buffer(offsets), pa.py_buffer(data)],
+    )
+
+
+def dna_pandas(
+    dna,
+    df,
+    chr: str = "chr",
+    start: str = "start",
+    end: str = "end",
+    mask: str = "lower",
+    rev_comp=False,
+    zero_based: bool = False,
+    block_size: int = DEFAULT_COLUMNAR_BLOCK_SIZE,
+):
+    """
+    Returns the sequences of the rows of a DataFrame as a pandas Series
+    backed by an Arrow string array.
+
+    Parameters
+    ----------
+    dna : DNA2Bit or DNA4Bit
+        Reader.
+    df : pandas.DataFrame
+        Table of locations.
+    chr : str, optional
+        Chromosome column.
+    start : str, optional
+        Start column.
+    end : str, optional
+        End column.
+    mask : str, optional
+        Either 'upper', 'lower' or 'n'.
+    rev_comp : bool, str or sequence, optional
+        Reverse complement all rows, those flagged in a sequence, or
+        the name of a strand or boolean column.
+    zero_based : bool, optional
+        Whether starts are 0-based with exclusive ends as in BED files.
+    block_size : int, optional
+        Maximum span of a single read.
+
+    Returns
+    -------
+    pandas.Series
+        Sequences with the index of df.
+    """
+
+    if pd is None:
+        raise ImportError("pandas is required for DataFrame output")
+
+    if isinstance(rev_comp, str):
+        rev_comp = df[rev_comp]
+
+    seqs = dna_arrow(
+        dna,
+        df[chr],
+        df[start],
+        df[end],
+        mask=mask,
+        rev_comp=rev_comp,
+        zero_based=zero_based,
+        block_size=block_size,
+    )
+
+    return pd.Series(seqs, index=df.index, dtype=pd.ArrowDtype(seqs.type))
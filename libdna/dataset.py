@@ -0,0 +1,597 @@
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+
+import gal
+
+from .decode import DNA_CODE_N, DNA4Bit, DNA2Bit
+from .tensor import DEFAULT_TENSOR_BLOCK_SIZE, dna_codes
+from .util import np, require_numpy
+
+DATASET_MANIFEST_FILE = "dataset.json"
+
+DATASET_VERSION = 1
+
+# Ways rows can be stored. 'codes' is one uint8 code (A=0, C=1, G=2,
+# T=3, N=4) per base. '2bit' packs 4 bases per byte, first base in the
+# uppermost bits as in the .dna.2bit files, with N stored as A and
+# flagged in a separate 1 bit file per shard.
+DATASET_ENCODINGS = ("codes", "2bit")
+
+# Rows per shard file
+DEFAULT_SHARD_ROWS = 1048576
+
+# Intervals extracted together, and the unit of progress saved to the
+# manifest
+DEFAULT_DATASET_BATCH_SIZE = 10000
+
+# reader used by dataset worker processes
+_reader = None
+
+
+def pack_2bit(codes) -> tuple:
+    """
+    Pack a (rows, length) array of base codes 4 bases per byte.
+
+    Parameters
+    ----------
+    codes : numpy.ndarray
+        uint8 base codes.
+
+    Returns
+    -------
+    tuple
+        (packed, n) where packed is (rows, ceil(length / 4)) and n is the
+        (rows, ceil(length / 8)) bitmap of N bases.
+    """
+
+    require_numpy("datasets")
+
+    rows, length = codes.shape
+
+    n = np.packbits(codes == DNA_CODE_N, axis=1)
+
+    # N (4) becomes A (0)
+    c = codes & 3
+
+    pad = -length % 4
+
+    if pad > 0:
+        c = np.pad(c, ((0, 0), (0, pad)))
+
+    c = c.reshape(rows, -1, 4)
+
+    packed = (c[:, :, 0] << 6) | (c[:, :, 1] << 4) | (c[:, :, 2] << 2) | c[:, :, 3]
+
+    return packed, n
+
+
+def unpack_2bit(packed, n, length: int):
+    """
+    Expand rows packed by pack_2bit back into base codes.
+
+    Parameters
+    ----------
+    packed : numpy.ndarray
+        (rows, ceil(length / 4)) packed bases.
+    n : numpy.ndarray
+        (rows, ceil(length / 8)) N bitmap.
+    length : int
+        Bases per row.
+
+    Returns
+    -------
+    numpy.ndarray
+        (rows, length) uint8 codes.
+    """
+
+    require_numpy("datasets")
+
+    rows = packed.shape[0]
+
+    codes = np.empty((rows, 4 * packed.shape[1]), dtype=np.uint8)
+
+    for i in range(4):
+        codes[:, i::4] = (packed >> (6 - 2 * i)) & 3
+
+    codes = codes[:, :length]
+
+    codes[np.unpackbits(n, axis=1, count=length).astype(bool)] = DNA_CODE_N
+
+    return codes
+
+
+def _shard_files(dir: str, shard: int, encoding: str) -> list:
+    name = os.path.join(dir, f"shard-{shard:05d}")
+
+    if encoding == "2bit":
+        return [f"{name}.2bit", f"{name}.n.1bit"]
+    else:
+        return [f"{name}.codes"]
+
+
+def _row_bytes(length: int, encoding: str) -> list:
+    """
+    Bytes per row of each file of a shard.
+    """
+
+    if encoding == "2bit":
+        return [-(-length // 4), -(-length // 8)]
+    else:
+        return [length]
+
+
+class Dataset:
+    """
+    Fixed length windows stored as sharded memory-mapped arrays written
+    by write_dataset. Shards are mapped on demand so rows can be read
+    without loading the dataset.
+    """
+
+    def __init__(self, dir: str):
+        """
+        Parameters
+        ----------
+        dir : str
+            Dataset directory.
+        """
+
+        require_numpy("datasets")
+
+        with open(os.path.join(dir, DATASET_MANIFEST_FILE), "r") as f:
+            data = json.load(f)
+
+        if data.get("version") != DATASET_VERSION:
+            raise ValueError(f"{dir} has an unsupported dataset version")
+
+        self.__dir = dir
+        self.__length = data["length"]
+        self.__encoding = data["encoding"]
+        self.__shard_rows = data["shard_rows"]
+        self.__rows = data["rows"]
+        self.__complete = data["complete"]
+        self.__shards = {}
+
+    @property
+    def dir(self) -> str:
+        return self.__dir
+
+    @property
+    def length(self) -> int:
+        """
+        Bases per row.
+        """
+
+        return self.__length
+
+    @property
+    def encoding(self) -> str:
+        return self.__encoding
+
+    @property
+    def shard_rows(self) -> int:
+        return self.__shard_rows
+
+    @property
+    def complete(self) -> bool:
+        """
+        False if the writer stopped before reaching the end of its
+        intervals.
+        """
+
+        return self.__complete
+
+    @property
+    def shards(self) -> int:
+        return -(-self.__rows // self.__shard_rows)
+
+    def __len__(self) -> int:
+        return self.__rows
+
+    def shard(self, shard: int) -> list:
+        """
+        Returns read only memory maps of the files of a shard, trimmed to
+        the rows written: the codes for the 'codes' encoding or the
+        packed bases and N bitmap for '2bit'.
+        """
+
+        if shard not in self.__shards:
+            rows = min(self.__shard_rows, self.__rows - shard * self.__shard_rows)
+
+            if rows <= 0:
+                raise IndexError(f"shard {shard} out of range")
+
+            self.__shards[shard] = [
+                np.memmap(file, dtype=np.uint8, mode="r", shape=(rows, b))
+                for file, b in zip(
+                    _shard_files(self.__dir, shard, self.__encoding),
+                    _row_bytes(self.__length, self.__encoding),
+                )
+            ]
+
+        return self.__shards[shard]
+
+    def codes(self, start: int, end: int):
+        """
+        Returns the base codes of rows [start, end) as a (rows, length)
+        uint8 array, reading only the shards they are in.
+        """
+
+        start = max(start, 0)
+        end = min(end, self.__rows)
+
+        ret = np.empty((max(end - start, 0), self.__length), dtype=np.uint8)
+
+        i = start
+
+        while i < end:
+            shard = i // self.__shard_rows
+            s = i - shard * self.__shard_rows
+            e = min(end - shard * self.__shard_rows, self.__shard_rows)
+
+            files = self.shard(shard)
+
+            if self.__encoding == "2bit":
+                ret[i - start : i - start + e - s] = unpack_2bit(
+                    files[0][s:e], files[1][s:e], self.__length
+                )
+            else:
+                ret[i - start : i - start + e - s] = files[0][s:e]
+
+            i += e - s
+
+        return ret
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            rows = range(*i.indices(self.__rows))
+
+            if len(rows) == 0:
+                return self.codes(0, 0)
+
+            s = min(rows)
+
+            return self.codes(s, max(rows) + 1)[rows.start - s :: rows.step]
+
+        if i < 0:
+            i += self.__rows
+
+        if i < 0 or i >= self.__rows:
+            raise IndexError(f"row {i} out of range")
+
+        return self.codes(i, i + 1)[0]
+
+
+class _ShardWriter:
+    """
+    Writes rows into the memory-mapped shard files, holding at most one
+    shard open.
+    """
+
+    def __init__(self, dir: str, length: int, encoding: str, shard_rows: int):
+        self.__dir = dir
+        self.__length = length
+        self.__encoding = encoding
+        self.__shard_rows = shard_rows
+        self.__shard = -1
+        self.__files = None
+
+    def _open(self, shard: int):
+        self.close()
+
+        self.__files = []
+
+        for file, b in zip(
+            _shard_files(self.__dir, shard, self.__encoding),
+            _row_bytes(self.__length, self.__encoding),
+        ):
+            # files of an interrupted run are reopened so the rows
+            # already written are kept
+            mode = "r+" if os.path.exists(file) else "w+"
+
+            self.__files.append(
+                np.memmap(file, dtype=np.uint8, mode=mode, shape=(self.__shard_rows, b))
+            )
+
+        self.__shard = shard
+
+    def write(self, row: int, codes):
+        """
+        Write a batch of codes starting at a row of the dataset.
+        """
+
+        if self.__encoding == "2bit":
+            data = pack_2bit(codes)
+        else:
+            data = [codes]
+
+        i = 0
+        n = codes.shape[0]
+
+        while i < n:
+            shard = (row + i) // self.__shard_rows
+
+            if shard != self.__shard:
+                self._open(shard)
+
+            s = row + i - shard * self.__shard_rows
+            k = min(n - i, self.__shard_rows - s)
+
+            for f, d in zip(self.__files, data):
+                f[s : s + k] = d[i : i + k]
+
+            i += k
+
+    def flush(self):
+        if self.__files is not None:
+            for f in self.__files:
+                f.flush()
+
+    def close(self):
+        self.flush()
+        self.__files = None
+        self.__shard = -1
+
+    def finish(self, rows: int):
+        """
+        Truncate the last shard to the rows written.
+        """
+
+        self.close()
+
+        if rows == 0:
+            return
+
+        shard = (rows - 1) // self.__shard_rows
+        r = rows - shard * self.__shard_rows
+
+        for file, b in zip(
+            _shard_files(self.__dir, shard, self.__encoding),
+            _row_bytes(self.__length, self.__encoding),
+        ):
+            os.truncate(file, r * b)
+
+
+def _save_progress(dir: str, values: dict):
+    file = os.path.join(dir, DATASET_MANIFEST_FILE)
+    tmp = f"{file}.tmp"
+
+    with open(tmp, "w") as f:
+        json.dump(values, f, indent=1, sort_keys=True)
+
+    os.replace(tmp, file)
+
+
+def _load_progress(dir: str) -> dict:
+    file = os.path.join(dir, DATASET_MANIFEST_FILE)
+
+    if not os.path.exists(file):
+        return None
+
+    with open(file, "r") as f:
+        return json.load(f)
+
+
+def _interval(item) -> tuple:
+    """
+    Returns (chr, start, end, rev_comp) for a location or a
+    (location, strand) tuple, where strand is '+', '-' or a bool.
+    """
+
+    if isinstance(item, tuple):
+        loc, strand = item
+        rev_comp = strand == "-" if isinstance(strand, str) else bool(strand)
+    else:
+        loc = item
+        rev_comp = False
+
+    return (loc.chr, loc.start, loc.end, rev_comp)
+
+
+def _init_dataset_worker(dir: str, format: str):
+    global _reader
+
+    if format == "4bit":
+        _reader = DNA4Bit(dir)
+    else:
+        _reader = DNA2Bit(dir)
+
+
+def _dataset_batch(args):
+    batch, block_size = args
+
+    return _batch_codes(_reader, batch, block_size)
+
+
+def _batch_codes(dna, batch: list, block_size: int):
+    return dna_codes(
+        dna,
+        [gal.genomic.Location(chr, start, end) for chr, start, end, rc in batch],
+        rev_comp=[rc for chr, start, end, rc in batch],
+        block_size=block_size,
+    )
+
+
+def _batches(intervals, length: int, batch_size: int):
+    batch = []
+
+    for item in intervals:
+        interval = _interval(item)
+
+        if interval[2] - interval[1] + 1 != length:
+            raise ValueError(
+                f"{interval[0]}:{interval[1]}-{interval[2]} is not {length} bases long"
+            )
+
+        batch.append(interval)
+
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+
+    if len(batch) > 0:
+        yield batch
+
+
+def write_dataset(
+    dna,
+    intervals,
+    dir: str,
+    length: int = None,
+    encoding: str = "codes",
+    shard_rows: int = DEFAULT_SHARD_ROWS,
+    batch_size: int = DEFAULT_DATASET_BATCH_SIZE,
+    workers: int = 1,
+    resume: bool = True,
+    block_size: int = DEFAULT_TENSOR_BLOCK_SIZE,
+) -> Dataset:
+    """
+    Extract fixed length windows from a stream of intervals into sharded
+    memory-mapped arrays, one row per interval in stream order. Only the
+    batches in flight are held in memory.
+
+    After each batch the shard is flushed and the number of rows written
+    is saved to dataset.json, so if a run is interrupted, calling
+    write_dataset again with the same intervals skips the rows already
+    written and carries on.
+
+    Parameters
+    ----------
+    dna : DNA2Bit or DNA4Bit
+        Reader.
+    intervals : iterable
+        gal.genomic.Location, or (location, strand) tuples where strand
+        is '+', '-' or a bool for reverse complement. Must be the same
+        sequence of intervals when resuming.
+    dir : str
+        Dataset directory, created if it does not exist.
+    length : int, optional
+        Bases per window. Defaults to the length of the first interval.
+    encoding : str, optional
+        'codes' for one uint8 code per base or '2bit' for 4 bases per
+        byte plus an N bitmap.
+    shard_rows : int, optional
+        Rows per shard file.
+    batch_size : int, optional
+        Intervals extracted together.
+    workers : int, optional
+        Number of worker processes extracting batches, each with its own
+        reader of the same genome.
+    resume : bool, optional
+        Continue an interrupted run in dir. If False, any existing
+        dataset is overwritten.
+    block_size : int, optional
+        Maximum span of a single read.
+
+    Returns
+    -------
+    Dataset
+        The dataset written.
+    """
+
+    require_numpy("datasets")
+
+    if encoding not in DATASET_ENCODINGS:
+        raise ValueError(f"encoding must be one of {DATASET_ENCODINGS}")
+
+    os.makedirs(dir, exist_ok=True)
+
+    intervals = iter(intervals)
+
+    progress = _load_progress(dir) if resume else None
+
+    if progress is not None:
+        for key, value in [
+            ("encoding", encoding),
+            ("shard_rows", shard_rows),
+            ("length", length),
+        ]:
+            if value is not None and progress[key] != value:
+                raise ValueError(
+                    f"{dir} was started with {key} {progress[key]}, not {value}"
+                )
+
+        if progress["complete"]:
+            return Dataset(dir)
+
+        length = progress["length"]
+        rows = progress["rows"]
+
+        print(f"Resuming {dir} after {rows} rows...", file=sys.stderr)
+
+        # skip the intervals already written
+        next(itertools.islice(intervals, rows, rows), None)
+    else:
+        if length is None:
+            first = next(intervals, None)
+
+            if first is None:
+                raise ValueError("no intervals to set the window length from")
+
+            length = first[0].length if isinstance(first, tuple) else first.length
+            intervals = itertools.chain([first], intervals)
+
+        rows = 0
+
+    progress = {
+        "version": DATASET_VERSION,
+        "genome": dna.dir,
+        "length": length,
+        "encoding": encoding,
+        "shard_rows": shard_rows,
+        "rows": rows,
+        "complete": False,
+    }
+
+    _save_progress(dir, progress)
+
+    writer = _ShardWriter(dir, length, encoding, shard_rows)
+
+    def _write(codes):
+        nonlocal rows
+
+        writer.write(rows, codes)
+        writer.flush()
+
+        if (rows + len(codes)) // shard_rows > rows // shard_rows:
+            print(f"Wrote {rows + len(codes)} rows to {dir}...", file=sys.stderr)
+
+        rows += len(codes)
+        progress["rows"] = rows
+        _save_progress(dir, progress)
+
+    batches = _batches(intervals, length, batch_size)
+
+    if workers < 2:
+        for batch in batches:
+            _write(_batch_codes(dna, batch, block_size))
+    else:
+        format = "4bit" if isinstance(dna, DNA4Bit) else "2bit"
+
+        with multiprocessing.Pool(
+            workers, initializer=_init_dataset_worker, initargs=(dna.dir, format)
+        ) as pool:
+            # keep a bounded number of batches in flight so intervals
+            # are streamed and rows are written in order
+            while True:
+                window = [
+                    (batch, block_size)
+                    for batch in itertools.islice(batches, 2 * workers)
+                ]
+
+                if len(window) == 0:
+                    break
+
+                for codes in pool.imap(_dataset_batch, window):
+                    _write(codes)
+
+    writer.finish(rows)
+
+    progress["complete"] = True
+    _save_progress(dir, progress)
+
+    print(f"Finished {dir}, {rows} rows.", file=sys.stderr)
+
+    return Dataset(dir)
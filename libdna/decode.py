@@ -4,11 +4,27 @@ from typing import Union
 import gal
 
 import sys
+import threading
+
+from .columnar import dna_arrow
+from .libdna import location_blocks
+from .manifest import GenomeManifest
+from .motif import DEFAULT_SEARCH_CHUNK_SIZE, search
+from .packed import (
+    DNA_1BIT_TABLES,
+    DNA_2BIT_CODE_TABLES,
+    PackedSeq,
+    _unpack_tables,
+    unpack_bits,
+)
+from .rank import BitRank
+from .storage import Storage, open_storage
+from .tensor import dna_codes, one_hot
+from .transcript import transcript_batch, transcript_dna
+from .translate import translate_batch, translate_dna, translate_frames
 
 # from .libdna import parse_loc
 
-# import s3fs
-
 # Use ord('A') etc to get ascii values
 DNA_UC_DECODE_DICT = {0: 65, 1: 67, 2: 71, 3: 84}
 
@@ -28,6 +44,34 @@ DNA_4BIT_DECODE_DICT = {
     10: 110,
 }
 
+# 4 bit decoding with soft-masked bases shown as uppercase
+DNA_4BIT_UC_DECODE_DICT = {
+    1: 65,
+    2: 67,
+    3: 71,
+    4: 84,
+    5: 65,
+    6: 67,
+    7: 71,
+    8: 84,
+    9: 78,
+    10: 78,
+}
+
+# 4 bit decoding with soft-masked bases shown as N
+DNA_4BIT_N_DECODE_DICT = {
+    1: 65,
+    2: 67,
+    3: 71,
+    4: 84,
+    5: 78,
+    6: 78,
+    7: 78,
+    8: 78,
+    9: 78,
+    10: 78,
+}
+
 DNA_4BIT_COMP_DICT = {
     0: 0,
     65: 84,
@@ -39,7 +83,7 @@ DNA_4BIT_COMP_DICT = {
     103: 99,
     116: 97,
     78: 78,
-    110: 10,
+    110: 110,
 }
 
 
@@ -59,16 +103,160 @@ DNA_COMP_DICT = {
 }
 EMPTY_BYTEARRAY = bytearray(0)
 
+DNA_COMP_TABLE = str.maketrans("ACGTacgtNn", "TGCAtgcaNn")
+
+# Largest span of sequence read in one go by dna_batch
+DEFAULT_BATCH_BLOCK_SIZE = 1000000
+
+# Number of read pairs merged together in merge_read_pair_seqs
+DEFAULT_MERGE_BATCH_SIZE = 100000
+# Largest span of sequence read in one go by merge_read_pair_seqs
+DEFAULT_MERGE_BLOCK_SIZE = 1000000
+
 SHIFT_4BIT_MAP = {0: 4, 1: 0}
 SHIFT_2BIT_MAP = {0: 6, 1: 4, 2: 2, 3: 0}
 SHIFT_1BIT_MAP = {0: 7, 1: 6, 2: 5, 3: 4, 4: 3, 5: 2, 6: 1, 7: 0}
 
+# Numeric base codes. N, or any other invalid base, has its own code.
+DNA_CODE_N = 4
+
+# (suffix, bases per byte, header bytes) of the files of each format
+DNA_2BIT_FILES = [(".dna.2bit", 4, 0), (".n.1bit", 8, 0), (".mask.1bit", 8, 0)]
+DNA_4BIT_FILES = [(".dna.4bit", 2, 1)]
+
+# Map 4 bit encoded bases to numeric base codes, ignoring case
+DNA_4BIT_CODE_MAP = {0: 4, 1: 0, 2: 1, 3: 2, 4: 3, 5: 0, 6: 1, 7: 2, 8: 3, 9: 4, 10: 4}
+
+DNA_4BIT_CODE_TABLES = _unpack_tables(4, lambda v: DNA_4BIT_CODE_MAP.get(v, 4))
+
+# 1 for the soft-masked (lowercase) 4 bit codes
+DNA_4BIT_MASK_TABLES = _unpack_tables(4, lambda v: 1 if v in (5, 6, 7, 8, 10) else 0)
+
+# Decode 4 bit codes to chars for each mask mode. Soft-masked bases are
+# stored as lowercase codes, so 'lower' decodes them as stored, 'upper'
+# decodes them as uppercase and 'n' as N. Code 0 is padding.
+DNA_4BIT_DECODE_TABLES = {
+    "l": _unpack_tables(4, lambda v: DNA_4BIT_DECODE_DICT.get(v, DNA_N_UC)),
+    "u": _unpack_tables(4, lambda v: DNA_4BIT_UC_DECODE_DICT.get(v, DNA_N_UC)),
+    "n": _unpack_tables(4, lambda v: DNA_4BIT_N_DECODE_DICT.get(v, DNA_N_UC)),
+}
+
+DNA_4BIT_COMP_TABLE = bytes([DNA_4BIT_COMP_DICT.get(b, b) for b in range(256)])
+
+
+def _set_n_codes(codes: bytearray, flags: bytes) -> bytearray:
+    """
+    Set the code of bases flagged in an unpacked 1 bit N mask to
+    DNA_CODE_N. N bases are stored as code 0 in the 2 bit files so
+    OR-ing each flag shifted into bit 2 gives 4.
+    """
+
+    if len(flags) != len(codes) or 1 not in flags:
+        return codes
+
+    n = len(codes)
+
+    return bytearray(
+        (int.from_bytes(codes, "big") | (int.from_bytes(flags, "big") << 2)).to_bytes(
+            n, "big"
+        )
+    )
+
 
 class DNA(ABC):
     @abstractmethod
     def dna(self, *args):
         raise NotImplementedError
 
+    def dna_batch(
+        self,
+        locs,
+        mask="lower",
+        rev_comp=False,
+        lowercase=False,
+        block_size=DEFAULT_BATCH_BLOCK_SIZE,
+    ):
+        """
+        Returns the DNA for many locations. Locations are sorted by
+        position so that nearby locations are served from a single call
+        to dna() spanning up to block_size bases.
+
+        Parameters
+        ----------
+        locs : list
+            List of gal.genomic.Location.
+        mask : str, optional
+            Indicate whether masked bases should be represented as is
+            ('upper'), lowercase ('lower'), or as N ('n')
+        rev_comp : bool or list, optional
+            Whether to reverse complement the sequences, either for all
+            locations or as a list with one entry per location.
+        lowercase : bool, optional
+            Indicates whether sequences should be displayed as upper or
+            lowercase.
+        block_size : int, optional
+            Maximum span of a single read.
+
+        Returns
+        -------
+        list
+            DNA sequences in the same order as locs.
+        """
+
+        locs = list(locs)
+
+        if isinstance(rev_comp, bool):
+            rev_comp = [rev_comp] * len(locs)
+
+        ret = [None] * len(locs)
+
+        # validate before the prefetch hint so that bad locations are
+        # reported here rather than by the storage
+        for loc in locs:
+            self._check_bounds(loc)
+
+        # (block location, indices of the locations it serves)
+        blocks = list(
+            location_blocks(
+                [loc.chr for loc in locs],
+                [loc.start for loc in locs],
+                [loc.end for loc in locs],
+                block_size,
+            )
+        )
+
+        self._prefetch([block for block, indices in blocks])
+
+        for block, indices in blocks:
+            seq = self.dna(block, mask=mask, lowercase=lowercase)
+
+            for k in indices:
+                loc = locs[k]
+                s = seq[loc.start - block.start : loc.end - block.start + 1]
+
+                if rev_comp[k]:
+                    s = s.translate(DNA_COMP_TABLE)[::-1]
+
+                ret[k] = s
+
+        return ret
+
+    def _prefetch(self, locs: list):
+        """
+        Hint that the locations are about to be read so that a reader
+        backed by remote storage can fetch them together.
+        """
+
+        pass
+
+    def _check_bounds(self, loc: gal.genomic.Location):
+        """
+        Raise a ValueError if a location lies outside its chromosome.
+        Readers that know their chromosome lengths override this.
+        """
+
+        pass
+
     def fasta(self, loc: gal.genomic.Location, mask="upper"):
         """
         Prints a fasta representation of a sequence.
@@ -149,6 +337,228 @@ class DNAStr(DNA):
 
 
 class DNABin(DNA):
+    _manifest = None
+    _storage = None
+
+    # (suffix, bases per byte, header bytes) of the encoded files
+    _files = []
+
+    @property
+    def storage(self) -> Storage:
+        """
+        Where files are read from. Defaults to the local directory, or
+        HTTP range requests if the directory is a URL.
+        """
+
+        if self._storage is None:
+            self._storage = open_storage(self.dir)
+
+        return self._storage
+
+    @property
+    def manifest(self) -> GenomeManifest:
+        """
+        Manifest of the genome directory, loaded on first use so that
+        files can be resolved without filesystem checks on each query.
+        """
+
+        if self._manifest is None:
+            self._manifest = self.storage.manifest()
+
+        return self._manifest
+
+    def _prefetch(self, locs: list):
+        # byte ranges of each file covering the locations
+        ranges = {}
+
+        for loc in locs:
+            s = loc.start - 1
+            e = s + loc.length
+
+            for suffix, bpb, header in self._files:
+                path = self.manifest.path(f"{loc.chr}{suffix}")
+
+                if path is not None:
+                    bs = s // bpb
+                    ranges.setdefault(path, []).append(
+                        (header + bs, -(-e // bpb) - bs)
+                    )
+
+        for path, r in ranges.items():
+            self.storage.prefetch(path, r)
+
+    def codes(self, locs, out=None, rev_comp=False):
+        """
+        Returns a (batch, length) uint8 array of base codes (A=0, C=1,
+        G=2, T=3, N=4) for a list of equal length locations. See
+        libdna.tensor.dna_codes.
+
+        Parameters
+        ----------
+        locs : list
+            List of gal.genomic.Location of equal length.
+        out : numpy.ndarray, optional
+            Preallocated array to write into.
+        rev_comp : bool or list, optional
+            Reverse complement all locations or those flagged in a list.
+
+        Returns
+        -------
+        numpy.ndarray
+            Array of codes.
+        """
+
+        return dna_codes(self, locs, out=out, rev_comp=rev_comp)
+
+    def one_hot(self, locs, out=None, rev_comp=False, dtype=None):
+        """
+        Returns a (batch, length, 4) one-hot array, channels A, C, G, T,
+        for a list of equal length locations with N as all zeros. See
+        libdna.tensor.one_hot.
+
+        Parameters
+        ----------
+        locs : list
+            List of gal.genomic.Location of equal length.
+        out : numpy.ndarray, optional
+            Preallocated array to write into.
+        rev_comp : bool or list, optional
+            Reverse complement all locations or those flagged in a list.
+        dtype : numpy.dtype, optional
+            Type of a newly allocated array. Default is float32.
+
+        Returns
+        -------
+        numpy.ndarray
+            One-hot array.
+        """
+
+        return one_hot(self, locs, out=out, rev_comp=rev_comp, dtype=dtype)
+
+    def dna_arrow(
+        self, chrs, starts, ends, mask="lower", rev_comp=False, zero_based=False
+    ):
+        """
+        Returns the sequences of columns of locations, e.g. from a
+        DataFrame or Arrow table, as an Arrow string array decoded into
+        a single buffer. See libdna.columnar.dna_arrow.
+
+        Parameters
+        ----------
+        chrs : sequence
+            Chromosome of each row.
+        starts : sequence
+            Start of each row.
+        ends : sequence
+            End of each row.
+        mask : str, optional
+            Either 'upper', 'lower' or 'n'.
+        rev_comp : bool or sequence, optional
+            Reverse complement all rows or those flagged.
+        zero_based : bool, optional
+            Whether starts are 0-based with exclusive ends.
+
+        Returns
+        -------
+        pyarrow.Array
+            One sequence per row.
+        """
+
+        return dna_arrow(
+            self,
+            chrs,
+            starts,
+            ends,
+            mask=mask,
+            rev_comp=rev_comp,
+            zero_based=zero_based,
+        )
+
+    def transcript(self, exons, strand: str = "+", mask: str = "lower") -> str:
+        """
+        Returns the spliced sequence of a transcript from one read over
+        its span. See libdna.transcript.transcript_dna.
+
+        Parameters
+        ----------
+        exons : gal.genomic.Location or list
+            Exon locations on one chromosome, in any order.
+        strand : str, optional
+            '+' or '-'. Minus strand transcripts are reverse complemented.
+        mask : str, optional
+            Either 'upper', 'lower' or 'n'.
+
+        Returns
+        -------
+        str
+            Transcript sequence 5' to 3'.
+        """
+
+        return transcript_dna(self, exons, strand=strand, mask=mask)
+
+    def transcript_batch(self, records, strand="+", mask: str = "lower") -> list:
+        """
+        Returns the spliced sequences of many transcripts, e.g. from
+        read_transcripts. See libdna.transcript.transcript_batch.
+        """
+
+        return transcript_batch(self, records, strand=strand, mask=mask)
+
+    def translate(self, exons, frame: int = 0, strand: str = "+", table=1) -> str:
+        """
+        Translate a location, or the joined exons of a CDS, into protein
+        from the packed base codes. See libdna.translate.translate_dna.
+
+        Parameters
+        ----------
+        exons : gal.genomic.Location or list
+            A location or a list of exon locations on one chromosome.
+        frame : int, optional
+            Offset of the first codon from the 5' end on the strand.
+        strand : str, optional
+            '+' or '-'.
+        table : int or str, optional
+            NCBI genetic code id or a 64 character codon string.
+
+        Returns
+        -------
+        str
+            Protein sequence with X for codons containing N.
+        """
+
+        return translate_dna(self, exons, frame=frame, strand=strand, table=table)
+
+    def translate_batch(self, records, frame=0, strand="+", table=1) -> list:
+        """
+        Translate many CDS records, each a location or list of exons,
+        with one read per group of nearby records. See
+        libdna.translate.translate_batch.
+        """
+
+        return translate_batch(self, records, frame=frame, strand=strand, table=table)
+
+    def translate_frames(self, loc: gal.genomic.Location, table=1) -> dict:
+        """
+        Six frame translation of a location, as a map of (strand, frame)
+        to protein.
+        """
+
+        return translate_frames(self, loc, table=table)
+
+    def _check_bounds(self, loc: gal.genomic.Location):
+        """
+        Raise a ValueError if a location lies outside its chromosome.
+        Chromosomes missing from the manifest are not checked.
+        """
+
+        length = self.chr_length(loc.chr)
+
+        if length == 0:
+            return
+
+        if loc.start < 1 or loc.end < loc.start or loc.end > length:
+            raise ValueError(f"{loc} is outside {loc.chr}:1-{length}")
+
     def read_data(self, file: str, seek: int, n: int) -> bytes:
         """
         Reads data from a file source
@@ -167,24 +577,20 @@ class DNABin(DNA):
         bytearray
             Data from file
         """
-        file = os.path.join(self.dir, file).lower()
+        path = self.manifest.path(file)
 
-        if not os.path.exists(file):
+        if path is None:
             return None
 
-        #print(seek)
-
-        with open(file, "rb") as f:
-            # first byte is 42
-            f.seek(seek)
-            data = f.read(n)  # l.length // 8 + 2)
-
-        return data
+        return self.storage.read(path, seek, n)
 
 
 class DNA2Bit(DNABin):
-    def __init__(self, dir):
+    _files = DNA_2BIT_FILES
+
+    def __init__(self, dir, storage: Storage = None):
         self.__dir = dir
+        self._storage = storage
 
     @property
     def dir(self):
@@ -209,263 +615,299 @@ class DNA2Bit(DNABin):
             dna[i2] = b
             i2 -= 1
 
-    def _read1bit(self, d: bytes, loc: gal.genomic.Location, offset=False) -> bytearray:
+        # middle base of an odd length sequence is complemented in place
+        if len(dna) % 2 == 1:
+            dna[l] = DNA_COMP_DICT[dna[l]]
+
+    def chr_length(self, chr: str) -> int:
         """
-        Read data from a 1 bit file where each byte encodes 8 bases.
+        Returns the number of bases in a chromosome. If the manifest
+        does not record the exact length, it is inferred from the 2 bit
+        file, which is padded to a whole byte, so it may include up to 4
+        padding bases after the true end of the sequence.
 
         Parameters
         ----------
-        d : array
-            byte array
-        l : tuple
-            chr, start, end
+        chr : str
+            Chromosome name, e.g. 'chr1'.
 
         Returns
         -------
-        list
-            list of 1s and 0s of length equal to the number of bases in
-            the location.
+        int
+            Number of bases, or 0 if the chromosome does not exist.
         """
 
-        if d is None:
-            return []
+        length = self.manifest.length(chr)
+
+        if length is not None:
+            return length
+
+        size = self.manifest.file_size(f"{chr}.dna.2bit")
+
+        if size is None:
+            return 0
+
+        return size * 4
+
+    def _read_codes(self, loc: gal.genomic.Location) -> bytearray:
+        """
+        Read numeric base codes (A=0, C=1, G=2, T=3, N=4) for a location
+        directly from the 2 bit and N files without decoding to chars.
+
+        Parameters
+        ----------
+        loc : gal.genomic.Location
+            Genomic location.
+
+        Returns
+        -------
+        bytearray
+            One code per base.
+        """
 
         s = loc.start - 1
+        e = s + loc.length - 1
 
-        length = loc.end - loc.start + 1
+        bs = s // 4
+        data = self.read_data(f"{loc.chr}.dna.2bit", bs, e // 4 - bs + 1)
 
-        ret = bytearray([0] * loc.length)
+        if data is None:
+            return bytearray()
 
-        if offset:
-            bi = int(s / 8)
-        else:
-            bi = 0
-
-        for i in range(0, length):
-            block = s % 8
-
-            v = d[bi] >> SHIFT_1BIT_MAP[block]
-
-            if block == 7:
-                bi += 1
-
-            # if block == 0:
-            #     v = (d[bi] >> 7)
-            # elif block == 1:
-            #     v = (d[bi] >> 6)
-            # elif block == 2:
-            #     v = (d[bi] >> 5)
-            # elif block == 3:
-            #     v = (d[bi] >> 4)
-            # elif block == 4:
-            #     v = (d[bi] >> 3)
-            # elif block == 5:
-            #     v = (d[bi] >> 2)
-            # elif block == 6:
-            #     v = (d[bi] >> 1)
-            # else:
-            #     v = d[bi]
-            #     bi += 1
-
-            # Only care about the lowest bit
-            ret[i] = v & 1
-
-            s += 1
+        o = s - bs * 4
+        codes = unpack_bits(data, DNA_2BIT_CODE_TABLES)[o : o + loc.length]
 
-        return ret
+        if self.manifest.has_n(loc.chr) is False:
+            return codes
+
+        bs = s // 8
+        data = self.read_data(f"{loc.chr}.n.1bit", bs, e // 8 - bs + 1)
+
+        if data is not None:
+            o = s - bs * 8
+            flags = unpack_bits(data, DNA_1BIT_TABLES)[o : o + len(codes)]
+            codes = _set_n_codes(codes, flags)
+
+        return codes
 
-    def _read2bit(self, d: bytes, loc: gal.genomic.Location, offset=False) -> bytearray:
+    def _read_packed(self, loc: gal.genomic.Location, mask="lower") -> PackedSeq:
         """
-        Read DNA from a 2bit file where each base is encoded in 2bit
-        (4 bases per byte).
+        Read the packed bases of a location straight from the 2 bit, N
+        and mask files without decoding.
 
         Parameters
         ----------
-        d: bytes array
-             Encoded dna.
-        loc : tuple
-            Location (chr, start, end)
+        loc : gal.genomic.Location
+            Genomic location.
+        mask : str, optional
+            Mask mode the sequence will be decoded with. The mask file is
+            not read for 'upper'.
 
         Returns
         -------
-        list
-            Array of base chars
+        PackedSeq
+            Packed sequence.
         """
 
-        if d is None:
-            return EMPTY_BYTEARRAY
+        s = loc.start - 1
+        e = s + loc.length
 
-        # print(d, loc)
+        codes = self.read_data(f"{loc.chr}.dna.2bit", s // 4, -(-e // 4) - s // 4)
 
-        s = loc.start - 1
+        if codes is None:
+            return PackedSeq(b"", length=0)
 
-        ret = bytearray([0] * loc.length)  # []
+        # the file may end before the location
+        length = min(loc.length, 4 * len(codes) - s % 4)
 
-        if offset:
-            bi = int(s / 4)
-        else:
-            bi = 0
+        bitmaps = []
 
-        for i in range(loc.length):
-            block = s % 4
+        for suffix, read in [
+            ("n", self.manifest.has_n(loc.chr) is not False),
+            ("mask", self.manifest.has_mask(loc.chr) is not False and mask[0] != "u"),
+        ]:
+            bitmaps.append(
+                self.read_data(f"{loc.chr}.{suffix}.1bit", s // 8, -(-e // 8) - s // 8)
+                if read
+                else None
+            )
 
-            v = d[bi] >> SHIFT_2BIT_MAP[block]
+        return PackedSeq(codes, bitmaps[0], bitmaps[1], length, s % 8)
 
-            if block == 3:
-                bi += 1
+    _ranks = None
 
-            # if block == 0:
-            #     v = (d[bi] >> 6)
-            # elif block == 1:
-            #     v = (d[bi] >> 4)
-            # elif block == 2:
-            #     v = (d[bi] >> 2)
-            # else:
-            #     v = d[bi]
+    def _rank(self, file: str) -> BitRank:
+        """
+        Rank/select index of a 1 bit file, or None if it does not exist.
+        """
 
-            #     # Reached end of byte so we are moving into the next byte
-            #     bi += 1
+        if self._ranks is None:
+            self._ranks = {}
 
-            # Only care about the lowest 2 bits (3)
-            ret[i] = DNA_UC_DECODE_DICT[v & 3]
+        file = file.lower()
 
-            s += 1
+        if file not in self._ranks:
+            path = self.manifest.path(file)
 
-        return ret
+            if path is None:
+                self._ranks[file] = None
+            else:
+                self._ranks[file] = BitRank.open(
+                    path,
+                    read=lambda seek, n: self.read_data(file, seek, n),
+                    storage=self.storage,
+                    size=self.manifest.file_size(file),
+                )
+
+        return self._ranks[file]
 
-    def _read_dna(self, loc: gal.genomic.Location, lowercase=False) -> bytearray:
+    def count_n(self, loc: gal.genomic.Location) -> int:
         """
-        Read DNA from a 2bit file where each base is encoded in 2bit
-        (4 bases per byte).
+        Returns the number of N bases in a location using the rank index
+        of the N file, without decoding any bases.
 
         Parameters
         ----------
-        l : tuple
-            Location tuple
+        loc : gal.genomic.Location
+            Genomic location.
 
         Returns
         -------
-        list
-            Array of base chars
+        int
+            Number of N bases.
         """
 
-        file = f"{loc.chr}.dna.2bit"
+        if self.manifest.has_n(loc.chr) is False:
+            return 0
 
-        # print(loc.length, file=sys.stderr)
+        rank = self._rank(f"{loc.chr}.n.1bit")
 
-        s = loc.start - 1
-        e = s + loc.length
-        bs = int(s / 4)
-        be = int(e / 4)
-        l = be - bs + 1
+        if rank is None:
+            return 0
 
-        data = self.read_data(file, bs, l)
+        return rank.count(loc.start, loc.end)
+
+    def count_masked(self, loc: gal.genomic.Location) -> int:
+        """
+        Returns the number of soft-masked bases in a location using the
+        rank index of the mask file.
+        """
 
-        # print(loc, data, file=sys.stderr)
+        if self.manifest.has_mask(loc.chr) is False:
+            return 0
+
+        rank = self._rank(f"{loc.chr}.mask.1bit")
+
+        if rank is None:
+            return 0
+
+        return rank.count(loc.start, loc.end)
+
+    def masked_fraction(self, loc: gal.genomic.Location) -> float:
+        """
+        Returns the fraction of bases in a location that are soft-masked.
+        """
 
-        return self._read2bit(data, loc)
+        return self.count_masked(loc) / loc.length
 
-    def _read_1bit_file(self, file: str, loc: gal.genomic.Location):
+    def next_non_n(self, chr: str, pos: int) -> int:
         """
-        Load data from 1 bit file into array
+        Returns the first position at or after pos that is not N.
 
         Parameters
         ----------
-        file : str
-            1bit filename
-        loc : libdna.Loc
-            dna location
+        chr : str
+            Chromosome name.
+        pos : int
+            1-based position.
 
         Returns
         -------
-        bytes
-            byte array from file where each byte represents 8 bases.
+        int
+            1-based position or None if the rest of the chromosome is N.
         """
 
-        s = loc.start - 1
-        e = s + loc.length
-        bs = int(s / 8)
-        be = int(e / 8)
-        n = be - bs + 1
-
-        data = self.read_data(file, bs, n)
-
-        #        f = open(file, 'rb')
-        #        f.seek(bs)  #(l.start - 1) // 8)
-        #        # read length + 2 because we need the extra byte in case the start
-        #        # position lies mid way through a byte. Imagine a sequence 10 bp long
-        #        # starting at position 4. 10 // 8 + 1 = 2 bytes of data required to
-        #        # store this. Since we pick the closest byte as the start, this will
-        #        # be position 0 (3 // 8 = 0). The length is 2 bytes spanning bytes 0
-        #        # and 1, but because of the start at 3, our sequence spans byte 3 so
-        #        # we need to buffer an extra byte for cases where the start does not
-        #        # match the start of a byte
-        #        data = f.read(l) #l.length // 8 + 2)
-        #        f.close()
-        return data
+        rank = self._rank(f"{chr}.n.1bit")
+
+        if rank is not None:
+            i = rank.next_clear(pos - 1)
 
-    def _read_n(self, loc: gal.genomic.Location, ret: bytearray):
+            if i is None:
+                return None
+
+            pos = i + 1
+
+        return pos if pos <= self.chr_length(chr) else None
+
+    def next_masked(self, chr: str, pos: int) -> int:
         """
-        Reads 'N' mask from 1 bit file to convert bases to 'N'. In the
-        2 bit file, 'N' or any other invalid base is written as 'A'.
-        Therefore the 'N' mask file is required to correctly identify where
-        invalid bases are.
+        Returns the first soft-masked position at or after pos.
 
         Parameters
         ----------
-        l : tuple
-            location
-        ret : list
-            List of bases which will be modified in place.
+        chr : str
+            Chromosome name.
+        pos : int
+            1-based position.
+
+        Returns
+        -------
+        int
+            1-based position or None if there are no more masked bases.
         """
 
-        file = f"{loc.chr}.n.1bit"
+        rank = self._rank(f"{chr}.mask.1bit")
 
-        data = self._read_1bit_file(file, loc)
+        if rank is None:
+            return None
+
+        i = rank.next_set(pos - 1)
 
-        d = self._read1bit(data, loc)
+        if i is None or i + 1 > self.chr_length(chr):
+            return None
 
-        for i in range(0, len(ret)):
-            if d[i] == 1:
-                ret[i] = DNA_N_UC  # 'N'
+        return i + 1
 
-    def _read_mask(self, loc: gal.genomic.Location, ret, mask="upper"):
+    def search(
+        self,
+        pattern: str,
+        loc,
+        both_strands=True,
+        chunk_size=DEFAULT_SEARCH_CHUNK_SIZE,
+    ):
         """
-        Reads mask from 1 bit file to convert bases to identify poor quality
-        bases that will either be converted to lowercase or 'N'. In the
-        2 bit file, 'N' or any other invalid base is written as 'A'.
-        Therefore the 'N' mask file is required to correctly identify where
-        invalid bases are.
+        Find exact or IUPAC degenerate matches of a pattern in a
+        chromosome or location. See libdna.motif.search.
 
         Parameters
         ----------
-        l : tuple
-            location
-        ret : list
-            list of bases which will be modified in place
-        mask : str, optional
-            Either 'upper', 'lower', or 'n'. If 'lower', poor quality bases
-            will be converted to lowercase.
-        """
-
-        if mask.startswith("u"):
-            return
+        pattern : str
+            IUPAC pattern.
+        loc : str or gal.genomic.Location
+            Chromosome name or location to search.
+        both_strands : bool, optional
+            Whether to also search the reverse strand.
 
-        file = "{}.mask.1bit".format(loc.chr)
+        Returns
+        -------
+        generator
+            Tuples of (chr, start, end, strand) for each match.
+        """
 
-        data = self._read_1bit_file(file, loc)
+        return search(
+            self, pattern, loc, both_strands=both_strands, chunk_size=chunk_size
+        )
 
-        d = self._read1bit(data, loc)
+    def _dna_bytes(
+        self, loc: gal.genomic.Location, mask="lower", lowercase=False
+    ) -> bytearray:
+        """
+        Decode the bases of a location into a bytearray of chars without
+        bounds checking.
+        """
 
-        if mask.startswith("l"):
-            for i in range(0, len(ret)):
-                if d[i] == 1:
-                    ret[i] = DNA_UC_TO_LC_MAP[ret[i]]  # ret[i].lower()
-        else:
-            # Use N as mask
-            for i in range(0, len(ret)):
-                if d[i] == 1:
-                    ret[i] = DNA_N_UC  # 'N'
+        # the reference is decoded uppercase, dna() applies lowercase
+        return self._read_packed(loc, mask=mask).decode_bytes(mask=mask)
 
     def dna(
         self, loc: gal.genomic.Location, mask="lower", rev_comp=False, lowercase=False
@@ -492,14 +934,12 @@ class DNA2Bit(DNABin):
             List of base chars.
         """
 
-        ret = self._read_dna(loc, lowercase=lowercase)
-
-        self._read_n(loc, ret)
+        self._check_bounds(loc)
 
-        self._read_mask(loc, ret, mask=mask)
+        ret = self._dna_bytes(loc, mask=mask, lowercase=lowercase)
 
         if rev_comp:
-            DNA2Bit._rev_comp(ret)
+            DNA2Bit.rev_comp(ret)
 
         ret = ret.decode("utf-8")
 
@@ -544,10 +984,100 @@ class DNA2Bit(DNABin):
 
         return seq
 
+    def merge_read_pair_seqs(
+        self,
+        pairs,
+        batch_size=DEFAULT_MERGE_BATCH_SIZE,
+        block_size=DEFAULT_MERGE_BLOCK_SIZE,
+    ):
+        """
+        Merge the sequences of many read pairs, see merge_read_pair_seq.
+        Pairs are processed in batches. Within a batch, overlapping pairs
+        are joined without accessing the genome, and the inserts of
+        non-overlapping pairs are sorted by position so that nearby pairs
+        are served from a single read of up to block_size bases. The
+        block is kept packed and, when the pairs total fewer bases than
+        the block, only the bases of each pair are decoded.
+
+        Parameters
+        ----------
+        pairs : iterable
+            Tuples of (r1, r2) libsam.Read.
+        batch_size : int, optional
+            Number of pairs to process at a time.
+        block_size : int, optional
+            Maximum span of a single read of the genome.
+
+        Returns
+        -------
+        generator
+            Merged sequences in the same order as pairs.
+        """
+
+        batch = []
+
+        for pair in pairs:
+            batch.append(pair)
+
+            if len(batch) == batch_size:
+                yield from self._merge_read_pair_batch(batch, block_size)
+                batch = []
+
+        if len(batch) > 0:
+            yield from self._merge_read_pair_batch(batch, block_size)
+
+    def _merge_read_pair_batch(self, batch, block_size):
+        ret = [None] * len(batch)
+
+        # (chr, start, end, index) of pairs needing genomic sequence
+        spans = []
+
+        for i, (r1, r2) in enumerate(batch):
+            s1 = r1.pos
+            e1 = s1 + r1.length - 1
+            s2 = r2.pos
+            e2 = s2 + r2.length - 1
+
+            inner = s2 - e1 - 1
+
+            if inner >= 0:
+                spans.append((r1.chr, s1, e2, i))
+            else:
+                ret[i] = r1.seq + r2.seq[-inner:]
+
+        spans.sort()
+
+        for loc, members in location_blocks(
+            [c for c, s, e, k in spans],
+            [s for c, s, e, k in spans],
+            [e for c, s, e, k in spans],
+            block_size,
+            order=range(len(spans)),
+        ):
+            self._check_bounds(loc)
+            block = self._read_packed(loc)
+
+            spanned = [spans[m] for m in members]
+
+            if sum([e - s + 1 for c, s, e, k in spanned]) < len(block):
+                # sparse pairs: only the bases of each pair are decoded
+                for c, s, e, k in spanned:
+                    ret[k] = block[s - loc.start : e - loc.start + 1].decode()
+            else:
+                seq = block.decode()
+
+                for c, s, e, k in spanned:
+                    ret[k] = seq[s - loc.start : e - loc.start + 1]
+
+        return ret
+
 
 class DNA4Bit(DNABin):
-    def __init__(self, dir):
+    _files = DNA_4BIT_FILES
+
+    def __init__(self, dir, storage: Storage = None):
         self._dir = dir
+        self._storage = storage
 
     @property
     def dir(self):
@@ -559,23 +1089,20 @@ class DNA4Bit(DNABin):
         Parameters
         ----------
         dna : bytearray
-            dna sequence to be reverse complemented
+            dna sequence to be reverse complemented in place
         """
 
-        i2 = len(dna) - 1
-
-        l = int(len(dna) / 2)
+        dna.reverse()
+        dna[:] = dna.translate(DNA_4BIT_COMP_TABLE)
 
-        for i in range(0, l):
-            b = DNA_4BIT_COMP_DICT[dna[i]]
-            dna[i] = DNA_4BIT_COMP_DICT[dna[i2]]
-            dna[i2] = b
-            i2 -= 1
-
-    def _read4bit(self, d: bytes, loc: gal.genomic.Location, offset=False) -> bytearray:
+    def _read4bit(
+        self, d: bytes, loc: gal.genomic.Location, offset=False, mask="lower"
+    ) -> bytearray:
         """
-        Read DNA from a 2bit file where each base is encoded in 2bit
-        (4 bases per byte).
+        Read DNA from a 4bit file where each base is encoded in 4bit
+        (2 bases per byte). Each byte is expanded into two bases with a
+        pair of 256 entry lookup tables, one per nibble, so there is no
+        Python level loop over bases.
 
         Parameters
         ----------
@@ -583,88 +1110,219 @@ class DNA4Bit(DNABin):
              Encoded dna.
         loc : tuple
             Location (chr, start, end)
+        offset : bool, optional
+            True if d is the whole file contents (without the header
+            byte) rather than starting at the location.
+        mask : str, optional
+            Indicate whether masked bases should be represented as is
+            ('upper'), lowercase ('lower'), or as N ('n')
 
         Returns
         -------
-        list
+        bytearray
             Array of base chars
         """
 
         if d is None:
             return EMPTY_BYTEARRAY
 
-        # print(d, loc)
+        s = loc.start - 1
+
+        if offset:
+            bi = s // 2
+            d = d[bi : (s + loc.length - 1) // 2 + 1]
+
+        # case and N are stored in the codes so the mask is applied by
+        # choosing the tables
+        tables = DNA_4BIT_DECODE_TABLES[mask[0]]
+
+        o = s % 2
+
+        return unpack_bits(d, tables)[o : o + loc.length]
+
+    def _read_dna(
+        self, loc: gal.genomic.Location, lowercase=False, mask="lower"
+    ) -> bytearray:
+        """
+        Read DNA from a 4bit file where each base is encoded in 4bit
+        (2 bases per byte).
+
+        Parameters
+        ----------
+        l : tuple
+            Location tuple
+        mask : str, optional
+            Indicate whether masked bases should be represented as is
+            ('upper'), lowercase ('lower'), or as N ('n')
+
+        Returns
+        -------
+        bytearray
+            Array of base chars
+        """
+
+        file = f"{loc.chr}.dna.4bit"
 
         s = loc.start - 1
+        e = s + loc.length - 1
+        bs = s // 2
+        be = e // 2
+        l = be - bs + 1
 
-        ret = bytearray([0] * loc.length)  # []
+        # skip first byte as this is 42
+        data = self.read_data(file, bs + 1, l)
 
-        if offset:
-            bi = int(s / 2)
-        else:
-            bi = 0
+        return self._read4bit(data, loc, mask=mask)
 
-        #print([d[bi] for bi in range(len(d))])
+    def chr_length(self, chr: str) -> int:
+        """
+        Returns the number of bases in a chromosome.
 
-        for i in range(loc.length):
-            block = s % 2
+        Parameters
+        ----------
+        chr : str
+            Chromosome name, e.g. 'chr1'.
 
-            v = d[bi] >> SHIFT_4BIT_MAP[block]
+        Returns
+        -------
+        int
+            Number of bases, or 0 if the chromosome does not exist.
+        """
 
-            #print(i, bi, d[bi], v)
+        length = self.manifest.length(chr)
 
-            # if block == 0:
-            #     v = (d[bi] >> 6)
-            # elif block == 1:
-            #     v = (d[bi] >> 4)
-            # elif block == 2:
-            #     v = (d[bi] >> 2)
-            # else:
-            #     v = d[bi]
+        if length is not None:
+            return length
 
-            #     # Reached end of byte so we are moving into the next byte
-            #     bi += 1
+        size = self.manifest.file_size(f"{chr}.dna.4bit")
 
-            # Only care about the lowest 4 bits (3)
-            ret[i] = DNA_4BIT_DECODE_DICT[v & 15]
+        if size is None:
+            return 0
 
-            if block == 1:
-                bi += 1
+        if size < 2:
+            return 0
 
-            s += 1
+        # The last byte holds either one base and an empty lower nibble or
+        # is entirely padding
+        last = self.read_data(f"{chr}.dna.4bit", size - 1, 1)[0]
 
-        return ret
+        if last == 0:
+            return (size - 2) * 2
+        elif last & 15 == 0:
+            return (size - 1) * 2 - 1
+        else:
+            return (size - 1) * 2
 
-    def _read_dna(self, loc: gal.genomic.Location, lowercase=False) -> bytearray:
+    def _read_codes(self, loc: gal.genomic.Location) -> bytearray:
         """
-        Read DNA from a 2bit file where each base is encoded in 2bit
-        (4 bases per byte).
+        Read numeric base codes (A=0, C=1, G=2, T=3, N=4) for a location
+        directly from the 4 bit file without decoding to chars.
 
         Parameters
         ----------
-        l : tuple
-            Location tuple
+        loc : gal.genomic.Location
+            Genomic location.
 
         Returns
         -------
-        list
-            Array of base chars
+        bytearray
+            One code per base.
         """
 
-        file = f"{loc.chr}.dna.4bit"
+        s = loc.start - 1
+        e = s + loc.length - 1
+
+        bs = s // 2
+
+        # skip first byte as this is 42
+        data = self.read_data(f"{loc.chr}.dna.4bit", bs + 1, e // 2 - bs + 1)
+
+        if data is None:
+            return bytearray()
+
+        o = s - bs * 2
+
+        return unpack_bits(data, DNA_4BIT_CODE_TABLES)[o : o + loc.length]
+
+    def _read_packed(self, loc: gal.genomic.Location, mask="lower") -> PackedSeq:
+        """
+        Read the bases of a location as a packed sequence, with N and
+        soft-masked bases taken from the 4 bit codes.
 
-        # print(loc.length, file=sys.stderr)
+        Parameters
+        ----------
+        loc : gal.genomic.Location
+            Genomic location.
+        mask : str, optional
+            Mask mode the sequence will be decoded with.
+
+        Returns
+        -------
+        PackedSeq
+            Packed sequence.
+        """
 
         s = loc.start - 1
-        e = s + loc.length
-        bs = int(s / 2)
-        be = int(e / 2)
-        l = be - bs + 1
+        e = s + loc.length - 1
+
+        bs = s // 2
 
         # skip first byte as this is 42
-        data = self.read_data(file, bs + 1, l)
-     
-        return self._read4bit(data, loc)
+        data = self.read_data(f"{loc.chr}.dna.4bit", bs + 1, e // 2 - bs + 1)
+
+        if data is None:
+            return PackedSeq(b"", length=0)
+
+        o = s - bs * 2
+
+        codes = unpack_bits(data, DNA_4BIT_CODE_TABLES)[o : o + loc.length]
+
+        flags = None
+
+        if mask[0] != "u":
+            flags = unpack_bits(data, DNA_4BIT_MASK_TABLES)[o : o + loc.length]
+
+        return PackedSeq.from_codes(codes, flags)
+
+    def search(
+        self,
+        pattern: str,
+        loc,
+        both_strands=True,
+        chunk_size=DEFAULT_SEARCH_CHUNK_SIZE,
+    ):
+        """
+        Find exact or IUPAC degenerate matches of a pattern in a
+        chromosome or location. See libdna.motif.search.
+
+        Parameters
+        ----------
+        pattern : str
+            IUPAC pattern.
+        loc : str or gal.genomic.Location
+            Chromosome name or location to search.
+        both_strands : bool, optional
+            Whether to also search the reverse strand.
+
+        Returns
+        -------
+        generator
+            Tuples of (chr, start, end, strand) for each match.
+        """
+
+        return search(
+            self, pattern, loc, both_strands=both_strands, chunk_size=chunk_size
+        )
+
+    def _dna_bytes(
+        self, loc: gal.genomic.Location, mask="lower", lowercase=False
+    ) -> bytearray:
+        """
+        Decode the bases of a location into a bytearray of chars without
+        bounds checking.
+        """
+
+        return self._read_dna(loc, lowercase=lowercase, mask=mask)
 
     def dna(
         self, loc: gal.genomic.Location, mask="lower", rev_comp=False, lowercase=False
@@ -691,10 +1349,12 @@ class DNA4Bit(DNABin):
             List of base chars.
         """
 
-        ret = self._read_dna(loc, lowercase=lowercase)
+        self._check_bounds(loc)
+
+        ret = self._dna_bytes(loc, mask=mask, lowercase=lowercase)
 
         if rev_comp:
-            DNA4Bit._rev_comp(ret)
+            DNA4Bit.rev_comp(ret)
 
         ret = ret.decode("utf-8")
 
@@ -704,143 +1364,157 @@ class DNA4Bit(DNABin):
         return ret
 
 
-# class S3DNA2Bit(DNA2Bit):
-#     def __init__(self, bucket, dir):
-#         super().__init__(dir)
-#         self.__bucket = bucket
-#         self.__fs = s3fs.S3FileSystem(anon=True)
-
-#     @property
-#     def bucket(self):
-#         return self.__bucket
+def _file_suffix(file: str) -> str:
+    """
+    Returns the type of a 2 bit genome file, e.g. '.n.1bit'.
+    """
 
-#     def read_data(self, file, seek, n):
-#         file = os.path.join(self.__bucket, self.dir, file).lower()
+    for suffix, bases_per_byte, header in DNA_2BIT_FILES:
+        if file.endswith(suffix):
+            return suffix
 
-#         f = self.__fs.open(file, 'rb')
-#         f.seek(seek)
-#         data = f.read(n)
-#         return data
+    return file
 
 
 class CachedDNA2Bit(DNA2Bit):
-    def __init__(self, dir):
-        super().__init__(dir)
-
-        self.__data = []
-        self.__file = ""
-        self.__n_data = []
-        self.__n_file = ""
-        self.__mask_data = []
-        self.__mask_file = ""
-
-    def _read_dna(self, loc, lowercase=False):
+    """
+    DNA2Bit reader that loads each file it reads into memory once and
+    decodes from memory afterwards.
+
+    By default only the most recently loaded file of each type (2 bit,
+    N and mask) is kept, i.e. one chromosome, so a scan of the whole
+    genome does not hold all of it in memory. Set max_bytes to keep
+    several chromosomes instead.
+
+    A single instance can be shared by many threads. Reads of a file
+    that is already loaded take no lock. Each file has its own lock so
+    concurrent misses on the same file load it exactly once while other
+    files load in parallel.
+    """
+
+    def __init__(self, dir, storage: Storage = None, max_bytes: int = None):
         """
-        Read DNA from a 2bit file where each base is encoded in 2bit
-        (4 bases per byte).
-
         Parameters
         ----------
-        l : tuple
-            Location tuple
-
-        Returns
-        -------
-        list
-            Array of base chars
+        dir : str
+            Genome directory.
+        storage : Storage, optional
+            Where files are read from.
+        max_bytes : int, optional
+            Maximum bytes held in memory. The least recently loaded files
+            are dropped beyond this. By default one file of each type is
+            kept.
         """
 
-        file = os.path.join(self.dir, loc.chr + ".dna.2bit")
+        super().__init__(dir, storage=storage)
 
-        if not os.path.exists(file):
-            print(file, "does not exist.")
-            return EMPTY_BYTEARRAY
+        self.__max_bytes = max_bytes
+        # lowercase file name -> contents, oldest first
+        self.__data = {}
+        self.__bytes = 0
+        # lowercase file name -> lock held while loading it
+        self.__locks = {}
+        self.__lock = threading.Lock()
+        self.__loads = 0
 
-        if file != self.__file:
-            print("Caching {}...".format(file))
-            self.__file = file
-            # Load file into memory
-            f = open(file, "rb")
-            self.__data = f.read()
-            f.close()
+    @property
+    def loads(self) -> int:
+        """
+        Number of files loaded into memory.
+        """
 
-        return self._read2bit(self.__data, loc, offset=True)
+        return self.__loads
 
-    def _read_n(self, l, ret):
+    @property
+    def size(self) -> int:
+        """
+        Bytes held in memory.
         """
-        Reads 'N' mask from 1 bit file to convert bases to 'N'. In the
-        2 bit file, 'N' or any other invalid base is written as 'A'.
-        Therefore the 'N' mask file is required to correctly identify where
-        invalid bases are.
 
-        Parameters
-        ----------
-        l : tuple
-            location
-        ret : list
-            List of bases which will be modified in place.
+        return self.__bytes
+
+    def _load(self, file: str) -> bytes:
+        """
+        Returns the contents of a file, loading it on first use, or None
+        if it does not exist.
         """
 
-        file = os.path.join(self.dir, l.chr + ".n.1bit")
+        # dict lookups are atomic so hits need no lock
+        data = self.__data.get(file)
 
-        if not os.path.exists(file):
-            return
+        if data is not None:
+            return data
 
-        if file != self.__n_file:
-            print("Caching {}...".format(file))
-            f = open(file, "rb")
-            self.__n_data = f.read()
-            f.close()
-            self.__n_file = file
+        with self.__lock:
+            lock = self.__locks.setdefault(file, threading.Lock())
 
-        d = self._read1bit(self.__n_data, l, offset=True)
+        with lock:
+            # another thread may have loaded it while this one waited
+            data = self.__data.get(file)
 
-        for i in range(0, len(ret)):
-            if d[i] == 1:
-                ret[i] = DNA_N_UC  # 'N'
+            if data is not None:
+                return data
 
-    def _read_mask(self, l, ret, mask="upper"):
-        """
-        Reads mask from 1 bit file to convert bases to identify poor quality
-        bases that will either be converted to lowercase or 'N'. In the
-        2 bit file, 'N' or any other invalid base is written as 'A'.
-        Therefore the 'N' mask file is required to correctly identify where
-        invalid bases are.
+            path = self.manifest.path(file)
 
-        Parameters
-        ----------
-        l : tuple
-            location
-        ret : list
-            list of bases which will be modified in place
-        mask : str, optional
-            Either 'upper', 'lower', or 'n'. If 'lower', poor quality bases
-            will be converted to lowercase.
+            if path is None:
+                return None
+
+            print(f"Caching {path}...", file=sys.stderr)
+
+            data = self.storage.read(path, 0, self.manifest.file_size(file))
+
+            with self.__lock:
+                self.__data[file] = data
+                self.__bytes += len(data)
+                self.__loads += 1
+
+                if self.__max_bytes is None:
+                    suffix = _file_suffix(file)
+
+                    for old in list(self.__data):
+                        if old != file and _file_suffix(old) == suffix:
+                            self.__bytes -= len(self.__data.pop(old))
+                else:
+                    for old in list(self.__data):
+                        if self.__bytes <= self.__max_bytes or old == file:
+                            break
+
+                        self.__bytes -= len(self.__data.pop(old))
+
+        return data
+
+    def read_data(self, file: str, seek: int, n: int) -> bytes:
         """
+        Reads data from the in memory copy of a file.
 
-        if mask.startswith("u"):
-            return
+        Parameter
+        ---------
+        file : str
+            Relative path to file
+        seek : int
+            Start offset in bytes
+        n : int
+            Amount of data to read in bytes
 
-        file = os.path.join(self.dir, l.chr + ".mask.1bit")
+        Returns
+        -------
+        bytes
+            Data from file
+        """
 
-        if not os.path.exists(file):
-            return
+        data = self._load(file.lower())
 
-        if file != self.__mask_file:
-            print("Caching {}...".format(file))
-            f = open(file, "rb")
-            self.__mask_data = f.read()
-            f.close()
-            self.__mask_file = file
+        if data is None:
+            return None
 
-        d = self._read1bit(self.__mask_data, l, offset=True)
+        return data[seek : seek + n]
 
-        if mask.startswith("l"):
-            for i in range(0, len(ret)):
-                if d[i] == 1:
-                    ret[i] = DNA_UC_TO_LC_MAP[ret[i]]  # ret[i].lower()
-        else:
-            # Use N as mask
-            for i in range(0, len(ret)):
-                if d[i] == 1:
-                    ret[i] = DNA_N_UC  # 'N'
+    def clear(self):
+        """
+        Drop all files from memory.
+        """
+
+        with self.__lock:
+            self.__data = {}
+            self.__bytes = 0
@@ -0,0 +1,166 @@
+import collections
+import gal
+
+from .decode import DNA_2BIT_FILES, DNA_4BIT_FILES, DNA2Bit, DNA4Bit
+
+# Bases compared per read. A multiple of 8 so that blocks are byte
+# aligned in every file.
+DEFAULT_DIFF_BLOCK_SIZE = 4194304
+
+# Bases per sub-block located within a differing block before decoding
+DIFF_SUB_BLOCK_SIZE = 4096
+
+DIFF_FILES = {"2bit": DNA_2BIT_FILES, "4bit": DNA_4BIT_FILES}
+
+DiffInterval = collections.namedtuple("DiffInterval", ["chr", "start", "end", "type"])
+
+
+def _create_reader(dir: str, format: str):
+    if format == "4bit":
+        return DNA4Bit(dir)
+    else:
+        return DNA2Bit(dir)
+
+
+def _read_block(dna, chr: str, files: list, s: int, e: int) -> list:
+    """
+    Read the packed bytes covering 0-based bases [s, e) from each file
+    of a chromosome.
+    """
+
+    ret = []
+
+    for suffix, bpb, header in files:
+        bs = s // bpb
+        data = dna.read_data(f"{chr}{suffix}", header + bs, -(-e // bpb) - bs)
+        ret.append(data if data is not None else b"")
+
+    return ret
+
+
+def _diff_runs(chr: str, seq1: str, seq2: str, start: int):
+    """
+    Yield the runs of positions at which two equal length sequences
+    differ, with start the 1-based position of the first base.
+    """
+
+    i = 0
+    n = len(seq1)
+
+    while i < n:
+        if seq1[i] == seq2[i]:
+            i += 1
+            continue
+
+        j = i + 1
+
+        while j < n and seq1[j] != seq2[j]:
+            j += 1
+
+        yield DiffInterval(chr, start + i, start + j - 1, "changed")
+
+        i = j
+
+
+def _diff_chr(dna1, dna2, chr: str, files: list, block_size: int):
+    n = min(dna1.chr_length(chr), dna2.chr_length(chr))
+
+    for s in range(0, n, block_size):
+        e = min(s + block_size, n)
+
+        block1 = _read_block(dna1, chr, files, s, e)
+        block2 = _read_block(dna2, chr, files, s, e)
+
+        # identical packed bytes mean identical bases
+        if block1 == block2:
+            continue
+
+        for ss in range(s, e, DIFF_SUB_BLOCK_SIZE):
+            se = min(ss + DIFF_SUB_BLOCK_SIZE, e)
+
+            same = True
+
+            for i, (suffix, bpb, header) in enumerate(files):
+                bs = (ss - s) // bpb
+                be = -(-(se - s) // bpb)
+
+                if block1[i][bs:be] != block2[i][bs:be]:
+                    same = False
+                    break
+
+            if same:
+                continue
+
+            loc = gal.genomic.Location(chr, ss + 1, se)
+
+            yield from _diff_runs(
+                chr, dna1.dna(loc, mask="lower"), dna2.dna(loc, mask="lower"), ss + 1
+            )
+
+
+def diff_genomes(
+    dir1: str,
+    dir2: str,
+    format: str = "2bit",
+    block_size: int = DEFAULT_DIFF_BLOCK_SIZE,
+):
+    """
+    Find the intervals that differ between two encoded genome builds.
+    The packed files are compared in large aligned blocks so identical
+    regions are skipped without decoding; only sub-blocks whose bytes
+    differ are decoded, with case and N, to give exact intervals.
+
+    Parameters
+    ----------
+    dir1 : str
+        Genome directory of the first build.
+    dir2 : str
+        Genome directory of the second build.
+    format : str, optional
+        Either '2bit' or '4bit'.
+    block_size : int, optional
+        Number of bases compared per read. Rounded down to a multiple of
+        8.
+
+    Returns
+    -------
+    generator
+        DiffInterval(chr, start, end, type) with 1-based coordinates in
+        chromosome order. type is 'changed' for bases that differ,
+        'removed' for sequence only in the first build and 'added' for
+        sequence only in the second.
+    """
+
+    files = DIFF_FILES[format]
+
+    block_size = max(block_size // 8 * 8, 8)
+
+    dna1 = _create_reader(dir1, format)
+    dna2 = _create_reader(dir2, format)
+
+    chrs = sorted(set(dna1.manifest.chrs) | set(dna2.manifest.chrs))
+
+    for chr in chrs:
+        l1 = dna1.chr_length(chr)
+        l2 = dna2.chr_length(chr)
+
+        if l1 > 0 and l2 > 0:
+            # merge runs that meet at sub-block boundaries
+            last = None
+
+            for d in _diff_chr(dna1, dna2, chr, files, block_size):
+                if last is not None and d.start == last.end + 1:
+                    last = last._replace(end=d.end)
+                else:
+                    if last is not None:
+                        yield last
+
+                    last = d
+
+            if last is not None:
+                yield last
+
+        if l1 > l2:
+            yield DiffInterval(chr, l2 + 1, l1, "removed")
+        elif l2 > l1:
+            yield DiffInterval(chr, l1 + 1, l2, "added")
@@ -1,7 +1,15 @@
+import os
 import sys
 import math
 import re
 import gzip
+import hashlib
+import multiprocessing
+
+from .manifest import GenomeManifest
+
+# Outputs are written to temporary files and renamed when complete
+TMP_SUFFIX = ".tmp"
 
 TWO_BIT_CHAR_MAP = {
     "A": 0,
@@ -29,43 +37,131 @@ FOUR_BIT_CHAR_MAP = {
     "n": 10,
 }
 
-def encode_dna2bit(file):
-    print(file, file=sys.stderr)
-    matcher = re.match(r"(chr(\d+|[XYM]))", file)
+def _chr_from_file(file: str) -> str:
+    matcher = re.match(r"(chr(\d+|[XYM]))", os.path.basename(file))
+
+    return matcher.group(1)
 
-    chr = matcher.group(1)
 
-    dna_out = chr + ".dna.2bit"
-    mask_out = chr + ".n.1bit"
-    repeat_out = chr + ".mask.1bit"
+def read_fasta(file: str):
+    """
+    Read the records of a FASTA file, which may be gzipped and may wrap
+    sequences over multiple lines.
 
-    print("Creating dna files", dna_out, mask_out, repeat_out, "...")
+    Parameters
+    ----------
+    file : str
+        FASTA file.
 
-    print("Reading from", file, "...")
+    Returns
+    -------
+    generator
+        Tuples of (name, sequence) where name is the first word of the
+        header.
+    """
 
-    # Extract the sequence as a single line of bases
     if "gz" in file:
         f = gzip.open(file, "rt")
     else:
         f = open(file, "r")
 
-    # skip fasta header
-    f.readline()
+    with f:
+        name = None
+        lines = []
+
+        for line in f:
+            if line.startswith(">"):
+                if name is not None:
+                    yield (name, "".join(lines))
+
+                tokens = line[1:].split()
+                name = tokens[0] if len(tokens) > 0 else ""
+                lines = []
+            else:
+                lines.append(line.strip())
+
+        if name is not None:
+            yield (name, "".join(lines))
+
+
+def _read_first_record(file: str) -> str:
+    print("Reading from", file, "...", file=sys.stderr)
+
+    for name, sequence in read_fasta(file):
+        print("Finished.", file=sys.stderr)
+        return sequence
+
+    return ""
+
+
+def sequence_info(sequence: str) -> dict:
+    """
+    Summarize a chromosome sequence for the genome manifest.
 
-    sequence = f.readline().strip()
-    f.close()
+    Returns
+    -------
+    dict
+        The length of the sequence and whether it contains N bases
+        (has_n) or soft-masked, lowercase, bases (has_mask).
+    """
 
-    print("Finished.")
+    return {
+        "length": len(sequence),
+        "has_n": "N" in sequence or "n" in sequence,
+        "has_mask": any([b in sequence for b in "acgtn"]),
+    }
 
-    print("Writing", dna_out, "...")
-    fout = open(dna_out, "wb")
+
+def encode_dna2bit(file, dir: str = ".", force=False):
+    """
+    Encode the first record of a FASTA file as the 2 bit dna, 1 bit N
+    and 1 bit mask files of a chromosome. The manifest.json of the
+    output directory is updated alongside them.
+
+    Parameters
+    ----------
+    file : str
+        FASTA file, optionally gzipped, named after the chromosome,
+        e.g. 'chr1.fa'.
+    dir : str, optional
+        Output directory.
+    force : bool, optional
+        Encode the chromosome even if it is unchanged.
+    """
+
+    _encode_file(file, "2bit", dir, force)
+
+
+def write_dna2bit(chr: str, sequence: str, dir: str = "."):
+    """
+    Write the 2 bit dna, 1 bit N and 1 bit mask files for a chromosome.
+
+    Parameters
+    ----------
+    chr : str
+        Chromosome name, e.g. 'chr1'.
+    sequence : str
+        Chromosome sequence.
+    dir : str, optional
+        Output directory.
+    """
+
+    # readers look for lowercase file names
+    dna_out = os.path.join(dir, chr.lower() + ".dna.2bit")
+    mask_out = os.path.join(dir, chr.lower() + ".n.1bit")
+    repeat_out = os.path.join(dir, chr.lower() + ".mask.1bit")
+
+    print("Creating dna files", dna_out, mask_out, repeat_out, "...", file=sys.stderr)
+
+    print("Writing", dna_out, "...", file=sys.stderr)
+    fout = open(dna_out + TMP_SUFFIX, "wb")
     # fout.write(42)
 
     # How many bytes we need to encode the sequence. We can store
     # 4 bases per byte
     byte_count = int(len(sequence) / 4) + 1
 
-    print("bytes " + str(len(sequence)) + " " + str(byte_count))
+    print("bytes " + str(len(sequence)) + " " + str(byte_count), file=sys.stderr)
 
     bytes = bytearray(byte_count)
 
@@ -92,8 +188,8 @@ def encode_dna2bit(file):
     fout.write(bytes)
     fout.close()
 
-    print("Writing", mask_out, "...")
-    fout = open(mask_out, "wb")
+    print("Writing", mask_out, "...", file=sys.stderr)
+    fout = open(mask_out + TMP_SUFFIX, "wb")
     # fout.write(42)
 
     # How many bytes we need to encode the mask. We can store
@@ -125,8 +221,8 @@ def encode_dna2bit(file):
     fout.write(bytes)
     fout.close()
 
-    print("Writing " + repeat_out + "...\n")
-    fout = open(repeat_out, "wb")
+    print("Writing " + repeat_out + "...\n", file=sys.stderr)
+    fout = open(repeat_out + TMP_SUFFIX, "wb")
     # fout.write(42)
 
     # How many bytes we need to encode the sequence either upper or lowercase. We can store
@@ -158,47 +254,64 @@ def encode_dna2bit(file):
     fout.write(bytes)
     fout.close()
 
-
-def encode_dna4bit(file):
-    print(file, file=sys.stderr)
-    matcher = re.match(r"(chr(\d+|[XYM]))", file)
-
-    chr = matcher.group(1)
-
-    dna_out = chr.lower() + ".dna.4bit"
+    # only replace the outputs once they have all been written so a
+    # crash never leaves a partial file in place
+    for out in [dna_out, mask_out, repeat_out]:
+        os.replace(out + TMP_SUFFIX, out)
+
+
+def encode_dna4bit(file, dir: str = ".", force=False):
+    """
+    Encode the first record of a FASTA file as the 4 bit dna file
+    of a chromosome. The manifest.json of the output directory is
+    updated alongside them.
+
+    Parameters
+    ----------
+    file : str
+        FASTA file, optionally gzipped, named after the chromosome,
+        e.g. 'chr1.fa'.
+    dir : str, optional
+        Output directory.
+    force : bool, optional
+        Encode the chromosome even if it is unchanged.
+    """
+
+    _encode_file(file, "4bit", dir, force)
+
+
+def write_dna4bit(chr: str, sequence: str, dir: str = "."):
+    """
+    Write the 4 bit dna file for a chromosome.
+
+    Parameters
+    ----------
+    chr : str
+        Chromosome name, e.g. 'chr1'.
+    sequence : str
+        Chromosome sequence.
+    dir : str, optional
+        Output directory.
+    """
+
+    dna_out = os.path.join(dir, chr.lower() + ".dna.4bit")
     # mask_out = chr + ".n.1bit"
     # repeat_out = chr + ".mask.1bit"
 
-    print("Creating dna files", dna_out, "...")
+    print("Creating dna files", dna_out, "...", file=sys.stderr)
 
-    print("Reading from", file, "...")
-
-    # Extract the sequence as a single line of bases
-    if "gz" in file:
-        f = gzip.open(file, "rt")
-    else:
-        f = open(file, "r")
-
-    # skip fasta header
-    f.readline()
-
-    sequence = f.readline().strip()
-    f.close()
-
-    print("Finished.")
-
-    print("Writing", dna_out, "...")
-    fout = open(dna_out, "wb")
+    print("Writing", dna_out, "...", file=sys.stderr)
+    fout = open(dna_out + TMP_SUFFIX, "wb")
     # first by is 42 for testing endian
     fout.write(bytearray([42]))
 
-    print(f"Sequence is {len(sequence)} bases.")
+    print(f"Sequence is {len(sequence)} bases.", file=sys.stderr)
 
     # How many bytes we need to encode the sequence. We can store
     # 4 bases per byte
     byte_count = int(len(sequence) / 2) + 1
 
-    print("bytes " + str(len(sequence)) + " " + str(byte_count))
+    print("bytes " + str(len(sequence)) + " " + str(byte_count), file=sys.stderr)
 
     bytes = bytearray(byte_count)
 
@@ -217,7 +330,7 @@ def encode_dna4bit(file):
         if base in FOUR_BIT_CHAR_MAP:
             encoded_base = FOUR_BIT_CHAR_MAP[base]
         else:
-            print("not found", base)
+            print("not found", base, file=sys.stderr)
             encoded_base = 0
 
 
@@ -229,3 +342,317 @@ def encode_dna4bit(file):
 
     fout.write(bytes)
     fout.close()
+
+    os.replace(dna_out + TMP_SUFFIX, dna_out)
+
+
+def _write_record(format: str, chr: str, sequence: str, dir: str):
+    if format == "4bit":
+        write_dna4bit(chr, sequence, dir=dir)
+    else:
+        write_dna2bit(chr, sequence, dir=dir)
+
+    return (chr, sequence_info(sequence))
+
+
+def checksum(sequence: str) -> str:
+    """
+    Content checksum of a chromosome sequence.
+    """
+
+    return hashlib.sha256(sequence.encode("utf-8")).hexdigest()
+
+
+def _output_sizes(chr: str, format: str, length: int) -> dict:
+    """
+    Returns the expected size of each output file for a chromosome.
+    """
+
+    chr = chr.lower()
+
+    if format == "4bit":
+        # header byte plus 2 bases per byte
+        return {f"{chr}.dna.4bit": int(length / 2) + 2}
+    else:
+        return {
+            f"{chr}.dna.2bit": int(length / 4) + 1,
+            f"{chr}.n.1bit": int(length / 8) + 1,
+            f"{chr}.mask.1bit": int(length / 8) + 1,
+        }
+
+
+def is_encoded(manifest: GenomeManifest, chr: str, format: str, cs: str = None) -> bool:
+    """
+    Tests whether a chromosome has complete outputs in a format,
+    optionally from a sequence with a given checksum.
+
+    Parameters
+    ----------
+    manifest : GenomeManifest
+        Manifest of the output directory.
+    chr : str
+        Chromosome name.
+    format : str
+        Either '2bit' or '4bit'.
+    cs : str, optional
+        Checksum of the source sequence.
+
+    Returns
+    -------
+    bool
+        True if every output exists with the expected size, is the file
+        recorded when the chromosome was encoded, and was encoded from
+        the same sequence.
+    """
+
+    entry = manifest.entry(chr)
+
+    if entry is None or "length" not in entry:
+        return False
+
+    encoded = entry.get("encoded", {}).get(format)
+
+    if encoded is None or (cs is not None and encoded.get("checksum") != cs):
+        return False
+
+    files = encoded.get("files", {})
+
+    for name, size in _output_sizes(chr, format, entry["length"]).items():
+        stat = _output_stat(manifest, name)
+
+        # a file replaced since, e.g. by an interrupted encode, no longer
+        # matches what was recorded
+        if stat is None or stat[0] != size or files.get(name) != stat:
+            return False
+
+    return True
+
+
+def _output_stat(manifest: GenomeManifest, name: str) -> list:
+    """
+    Returns the size and modification time in ns of an output file, or
+    None if it does not exist.
+    """
+
+    path = manifest.path(name)
+
+    if path is None:
+        return None
+
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _invalidate(manifest: GenomeManifest, format: str, chr: str):
+    """
+    Remove the record of a chromosome's outputs in a format before they
+    are rewritten, so an interrupted encode is never taken as complete.
+    """
+
+    entry = manifest.entry(chr)
+
+    if entry is None or format not in entry.get("encoded", {}):
+        return
+
+    encoded = dict(entry["encoded"])
+    del encoded[format]
+
+    manifest.update(chr, encoded=encoded)
+    manifest.save()
+
+
+def _record(manifest: GenomeManifest, format: str, chr: str, info: dict, cs: str, source: str):
+    """
+    Record a newly encoded chromosome in the manifest once all of its
+    outputs are in place.
+    """
+
+    manifest.refresh()
+
+    entry = manifest.entry(chr)
+
+    encoded = dict(entry.get("encoded", {})) if entry is not None else {}
+    encoded[format] = {
+        "checksum": cs,
+        "source": source,
+        "files": {
+            name: _output_stat(manifest, name)
+            for name in _output_sizes(chr, format, info["length"])
+        },
+    }
+
+    manifest.update(chr, encoded=encoded, **info)
+    manifest.save()
+
+
+def _encode_record(
+    manifest: GenomeManifest,
+    format: str,
+    chr: str,
+    sequence: str,
+    dir: str,
+    source: str,
+    force: bool,
+) -> bool:
+    """
+    Encode a chromosome unless it is already encoded from the same
+    sequence.
+
+    Returns
+    -------
+    bool
+        True if the chromosome was encoded.
+    """
+
+    cs = checksum(sequence)
+
+    if not force and is_encoded(manifest, chr, format, cs):
+        print(f"{chr} is unchanged, skipping.", file=sys.stderr)
+        return False
+
+    _invalidate(manifest, format, chr)
+
+    chr, info = _write_record(format, chr, sequence, dir)
+
+    _record(manifest, format, chr, info, cs, source)
+
+    return True
+
+
+def _encode_file(file: str, format: str, dir: str, force: bool):
+    print(file, file=sys.stderr)
+
+    chr = _chr_from_file(file)
+
+    sequence = _read_first_record(file)
+
+    os.makedirs(dir, exist_ok=True)
+
+    # the manifest lives with the files it describes
+    _encode_record(
+        GenomeManifest.open(dir),
+        format,
+        chr,
+        sequence,
+        dir,
+        os.path.abspath(file),
+        force,
+    )
+
+
+def _source_info(file: str) -> dict:
+    st = os.stat(file)
+
+    return {"size": st.st_size, "mtime": st.st_mtime}
+
+
+def encode_genome(
+    file: str, format: str = "2bit", dir: str = ".", jobs: int = 1, force=False
+):
+    """
+    Encode every record of a whole genome FASTA file.
+
+    Encoding is incremental: the manifest records a checksum of each
+    chromosome's sequence and chromosomes whose sequence is unchanged
+    and whose outputs are complete are skipped. If the whole file is
+    unchanged since it was last fully encoded, it is not read at all.
+    An interrupted run can therefore be resumed by running it again.
+
+    Parameters
+    ----------
+    file : str
+        FASTA file, optionally gzipped, with one record per chromosome.
+    format : str, optional
+        Either '2bit' or '4bit'.
+    dir : str, optional
+        Output directory.
+    jobs : int, optional
+        Number of chromosomes to encode in parallel. At most jobs
+        records are held in memory at once.
+    force : bool, optional
+        Encode every chromosome even if it is unchanged.
+
+    Returns
+    -------
+    list
+        Names of the chromosomes encoded.
+    """
+
+    os.makedirs(dir, exist_ok=True)
+
+    # only this process writes the manifest
+    manifest = GenomeManifest.open(dir)
+
+    source = os.path.abspath(file)
+    info = _source_info(file)
+
+    sources = manifest.source(source) or {}
+    previous = sources.get(format)
+
+    if (
+        not force
+        and previous is not None
+        and previous["size"] == info["size"]
+        and previous["mtime"] == info["mtime"]
+        and all([is_encoded(manifest, chr, format) for chr in previous["chrs"]])
+    ):
+        print(f"{file} is unchanged, skipping.", file=sys.stderr)
+        return []
+
+    chrs = []
+    ret = []
+
+    if jobs < 2:
+        for chr, sequence in read_fasta(file):
+            chrs.append(chr)
+
+            if _encode_record(manifest, format, chr, sequence, dir, source, force):
+                ret.append(chr)
+    else:
+        with multiprocessing.Pool(jobs) as pool:
+            pending = []
+
+            def _wait():
+                p, cs = pending.pop(0)
+                chr, seq_info = p.get()
+                _record(manifest, format, chr, seq_info, cs, source)
+                ret.append(chr)
+
+            for chr, sequence in read_fasta(file):
+                chrs.append(chr)
+
+                cs = checksum(sequence)
+
+                if not force and is_encoded(manifest, chr, format, cs):
+                    print(f"{chr} is unchanged, skipping.", file=sys.stderr)
+                    continue
+
+                _invalidate(manifest, format, chr)
+
+                pending.append(
+                    (
+                        pool.apply_async(
+                            _write_record, (format, chr, sequence, dir)
+                        ),
+                        cs,
+                    )
+                )
+
+                # wait for the oldest job so records are not read faster
+                # than they can be encoded
+                if len(pending) >= jobs:
+                    _wait()
+
+            while len(pending) > 0:
+                _wait()
+
+    # the file is only marked as done once every record is encoded
+    sources[format] = dict(info, chrs=chrs)
+    manifest.set_source(source, sources)
+    manifest.save()
+
+    return ret
@@ -0,0 +1,477 @@
+import collections
+import itertools
+import json
+import os
+import sys
+
+import gal
+
+from .util import np, require_numpy
+
+KMER_INDEX_FILE = "kmers.json"
+
+KMER_INDEX_VERSION = 1
+
+# Bases of a chromosome indexed into one sorted shard, which bounds the
+# memory used while building
+DEFAULT_KMER_SHARD_SIZE = 33554432
+
+# k-mer codes are stored in 64 bits, 2 bits per base
+MAX_KMER_SIZE = 32
+
+# Set in the position of a canonical index entry whose k-mer on the
+# forward strand is the reverse complement of the stored k-mer
+KMER_REV_FLAG = 0x80000000
+
+KMER_BASES = "ACGT"
+
+KmerHit = collections.namedtuple(
+    "KmerHit", ["chr", "start", "end", "strand", "mismatches"]
+)
+
+if np is not None:
+    # k-mer code and 0-based start of each entry of an index shard
+    KMER_RECORD_DTYPE = np.dtype([("kmer", "<u8"), ("pos", "<u4")])
+
+    # code of each base char, ignoring case, and 255 for anything else
+    KMER_CODE_TABLE = np.array(
+        [KMER_BASES.find(chr(c).upper()) % 256 for c in range(256)], dtype=np.uint8
+    )
+
+
+def _check_k(k: int):
+    if k < 1 or k > MAX_KMER_SIZE:
+        raise ValueError(f"k must be between 1 and {MAX_KMER_SIZE}")
+
+
+def kmer_rev_comp(codes, k: int):
+    """
+    Reverse complement an array of k-mer codes.
+
+    Parameters
+    ----------
+    codes : numpy.ndarray
+        uint64 k-mer codes, 2 bits per base with the first base in the
+        uppermost bits.
+    k : int
+        k-mer size.
+
+    Returns
+    -------
+    numpy.ndarray
+        uint64 codes of the reverse complements.
+    """
+
+    # complement is 3 - code, i.e. flip both bits
+    x = np.asarray(codes, dtype=np.uint64) ^ np.uint64((1 << (2 * k)) - 1)
+
+    ret = np.zeros(x.shape, dtype=np.uint64)
+
+    two = np.uint64(2)
+    three = np.uint64(3)
+
+    for i in range(k):
+        ret = (ret << two) | (x & three)
+        x = x >> two
+
+    return ret
+
+
+def _mismatches(a, b, k: int):
+    """
+    Number of bases that differ between arrays of k-mer codes.
+    """
+
+    x = np.asarray(a, dtype=np.uint64) ^ np.asarray(b, dtype=np.uint64)
+
+    # one bit per differing base
+    x = (x | (x >> np.uint64(1))) & np.uint64(int("01" * k, 2))
+
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x)
+
+    return np.array([bin(v).count("1") for v in x.ravel().tolist()]).reshape(x.shape)
+
+
+_masks = {}
+
+
+def _mismatch_masks(k: int, mismatches: int):
+    """
+    XOR masks turning a k-mer code into every code within a number of
+    mismatches of it, including itself. The masks do not depend on the
+    k-mer so they are built once per k and number of mismatches.
+    """
+
+    key = (k, mismatches)
+
+    if key not in _masks:
+        masks = [0]
+
+        for m in range(1, mismatches + 1):
+            for positions in itertools.combinations(range(k), m):
+                shifts = [2 * (k - 1 - p) for p in positions]
+
+                # XOR with 1, 2 or 3 changes a base to each other base
+                for ds in itertools.product((1, 2, 3), repeat=m):
+                    mask = 0
+
+                    for d, s in zip(ds, shifts):
+                        mask |= d << s
+
+                    masks.append(mask)
+
+        _masks[key] = np.array(masks, dtype=np.uint64)
+
+    return _masks[key]
+
+
+def kmer_code(seq: str) -> int:
+    """
+    Returns the 2 bit code of a sequence of A, C, G and T.
+    """
+
+    codes = KMER_CODE_TABLE[np.frombuffer(seq.encode("ascii"), dtype=np.uint8)]
+
+    if len(codes) > MAX_KMER_SIZE or (codes == 255).any():
+        raise ValueError(f"{seq} is not a k-mer of A, C, G and T")
+
+    ret = 0
+
+    for c in codes.tolist():
+        ret = (ret << 2) | c
+
+    return ret
+
+
+def _kmer_codes(codes, k: int) -> tuple:
+    """
+    Enumerate the k-mers of a buffer of base codes.
+
+    Returns
+    -------
+    tuple
+        (kmers, valid) where kmers[i] is the code of the k-mer starting
+        at i and valid[i] is False if it contains an N.
+    """
+
+    c = np.frombuffer(codes, dtype=np.uint8)
+    m = len(c) - k + 1
+
+    # running count of Ns so windows containing one can be dropped
+    n = np.concatenate(([0], np.cumsum(c == 4)))
+    valid = n[k:] == n[:m]
+
+    c = (c & 3).astype(np.uint64)
+    kmers = np.zeros(m, dtype=np.uint64)
+    two = np.uint64(2)
+
+    for j in range(k):
+        kmers = (kmers << two) | c[j : j + m]
+
+    return kmers, valid
+
+
+def _save_json(file: str, values: dict):
+    tmp = f"{file}.tmp"
+
+    with open(tmp, "w") as f:
+        json.dump(values, f, indent=1, sort_keys=True)
+
+    os.replace(tmp, file)
+
+
+def build_kmer_index(
+    dna,
+    k: int,
+    dir: str,
+    chrs: list = None,
+    canonical: bool = False,
+    shard_size: int = DEFAULT_KMER_SHARD_SIZE,
+) -> "KmerIndex":
+    """
+    Build an index of every k-mer position in a genome. Each chromosome
+    is split into shards of shard_size bases whose k-mers are enumerated
+    from the packed base codes, with windows containing N skipped, then
+    sorted by code and written as a table of (kmer, pos) that lookups
+    memory-map and binary search.
+
+    Parameters
+    ----------
+    dna : DNA2Bit or DNA4Bit
+        Reader.
+    k : int
+        k-mer size, at most 32.
+    dir : str
+        Index directory, created if it does not exist.
+    chrs : list, optional
+        Chromosomes to index. Defaults to all in the manifest.
+    canonical : bool, optional
+        Store each k-mer as the lesser of itself and its reverse
+        complement, so both strands are found with one probe and the
+        index is searched for half as many codes.
+    shard_size : int, optional
+        Bases indexed per shard.
+
+    Returns
+    -------
+    KmerIndex
+        The index.
+    """
+
+    require_numpy("k-mer indexes")
+    _check_k(k)
+
+    if chrs is None:
+        chrs = dna.manifest.chrs
+
+    os.makedirs(dir, exist_ok=True)
+
+    shards = []
+
+    for chr in chrs:
+        length = dna.chr_length(chr)
+
+        if length >= KMER_REV_FLAG:
+            raise ValueError(f"{chr} is too long to index")
+
+        print(f"Indexing {chr}...", file=sys.stderr)
+
+        for i, s in enumerate(range(0, length - k + 1, shard_size)):
+            # k - 1 extra bases so k-mers spanning shards are included
+            e = min(s + shard_size + k - 1, length)
+
+            kmers, valid = _kmer_codes(
+                dna._read_codes(gal.genomic.Location(chr, s + 1, e)), k
+            )
+
+            pos = np.arange(s, s + len(kmers), dtype=np.uint32)
+
+            if canonical:
+                rc = kmer_rev_comp(kmers, k)
+                rev = rc < kmers
+                kmers = np.where(rev, rc, kmers)
+                pos[rev] |= np.uint32(KMER_REV_FLAG)
+
+            kmers = kmers[valid]
+            pos = pos[valid]
+
+            order = np.argsort(kmers, kind="stable")
+
+            table = np.empty(len(kmers), dtype=KMER_RECORD_DTYPE)
+            table["kmer"] = kmers[order]
+            table["pos"] = pos[order]
+
+            file = f"{chr}.{i:04d}.k{k}.idx"
+            table.tofile(os.path.join(dir, file))
+
+            shards.append({"file": file, "chr": chr, "entries": len(table)})
+
+    _save_json(
+        os.path.join(dir, KMER_INDEX_FILE),
+        {
+            "version": KMER_INDEX_VERSION,
+            "genome": dna.dir,
+            "k": k,
+            "canonical": canonical,
+            "shards": shards,
+        },
+    )
+
+    return KmerIndex(dir)
+
+
+class KmerIndex:
+    """
+    Memory-mapped k-mer position index written by build_kmer_index.
+    Lookups binary search the sorted shards, so finding every occurrence
+    of many short sequences, e.g. guide RNAs or primers, costs a few
+    page reads per probe rather than a scan of the genome.
+    """
+
+    def __init__(self, dir: str):
+        """
+        Parameters
+        ----------
+        dir : str
+            Index directory.
+        """
+
+        require_numpy("k-mer indexes")
+
+        with open(os.path.join(dir, KMER_INDEX_FILE), "r") as f:
+            data = json.load(f)
+
+        if data.get("version") != KMER_INDEX_VERSION:
+            raise ValueError(f"{dir} has an unsupported k-mer index version")
+
+        self.__dir = dir
+        self.__k = data["k"]
+        self.__canonical = data["canonical"]
+        self.__shards = data["shards"]
+        self.__tables = {}
+
+    @property
+    def dir(self) -> str:
+        return self.__dir
+
+    @property
+    def k(self) -> int:
+        return self.__k
+
+    @property
+    def canonical(self) -> bool:
+        return self.__canonical
+
+    def __len__(self) -> int:
+        return sum([s["entries"] for s in self.__shards])
+
+    def _table(self, i: int):
+        if i not in self.__tables:
+            shard = self.__shards[i]
+
+            if shard["entries"] == 0:
+                table = np.empty(0, dtype=KMER_RECORD_DTYPE)
+            else:
+                table = np.memmap(
+                    os.path.join(self.__dir, shard["file"]),
+                    dtype=KMER_RECORD_DTYPE,
+                    mode="r",
+                    shape=(shard["entries"],),
+                )
+
+            # the codes are searched many times so keep the view
+            self.__tables[i] = (table, table["kmer"])
+
+        return self.__tables[i]
+
+    def lookup(self, seq: str, mismatches: int = 0) -> list:
+        """
+        Find every occurrence of a k-mer on either strand.
+
+        Parameters
+        ----------
+        seq : str
+            Sequence of k bases.
+        mismatches : int, optional
+            Number of mismatched bases allowed.
+
+        Returns
+        -------
+        list
+            KmerHit(chr, start, end, strand, mismatches) with 1-based
+            coordinates, sorted by chromosome and start. strand is '-'
+            if the reverse complement of seq occurs.
+        """
+
+        return self.lookup_batch([seq], mismatches=mismatches)[0]
+
+    def lookup_batch(self, seqs, mismatches: int = 0) -> list:
+        """
+        Find every occurrence of many k-mers on either strand. The codes
+        within the allowed mismatches of every query are enumerated
+        with precomputed XOR masks and all of them are probed together,
+        with one vectorised binary search per shard.
+
+        Parameters
+        ----------
+        seqs : list
+            Sequences of k bases.
+        mismatches : int, optional
+            Number of mismatched bases allowed.
+
+        Returns
+        -------
+        list
+            A list of KmerHit per sequence, in the same order.
+        """
+
+        k = self.__k
+
+        seqs = list(seqs)
+
+        for seq in seqs:
+            if len(seq) != k:
+                raise ValueError(f"{seq} is not {k} bases long")
+
+        queries = np.array([kmer_code(seq) for seq in seqs], dtype=np.uint64)
+
+        ret = [[] for seq in seqs]
+
+        if len(seqs) == 0:
+            return ret
+
+        neighbours = queries[:, None] ^ _mismatch_masks(k, mismatches)[None, :]
+
+        # the forward and reverse complement codes the index may store
+        if self.__canonical:
+            keys = np.minimum(neighbours, kmer_rev_comp(neighbours, k))
+        else:
+            keys = np.concatenate([neighbours, kmer_rev_comp(neighbours, k)], axis=1)
+
+        query_ids = np.repeat(np.arange(len(seqs)), keys.shape[1])
+        keys = keys.ravel()
+
+        # probe each distinct code once and keep the queries wanting it
+        keys, inverse = np.unique(keys, return_inverse=True)
+        order = np.argsort(inverse, kind="stable")
+        bounds = np.searchsorted(inverse[order], np.arange(len(keys) + 1))
+        query_ids = query_ids[order]
+
+        # (shard, first entry, end entry) matched by each query. Distinct
+        # codes match disjoint entries so none is found twice.
+        ranges = [[] for seq in seqs]
+
+        for i in range(len(self.__shards)):
+            table, codes = self._table(i)
+
+            starts = np.searchsorted(codes, keys, side="left")
+            ends = np.searchsorted(codes, keys, side="right")
+
+            for j in np.nonzero(ends > starts)[0].tolist():
+                for q in np.unique(query_ids[bounds[j] : bounds[j + 1]]).tolist():
+                    ranges[q].append((i, int(starts[j]), int(ends[j])))
+
+        # chromosomes in index order
+        chrs = {}
+
+        for shard in self.__shards:
+            chrs.setdefault(shard["chr"], len(chrs))
+
+        for q, matches in enumerate(ranges):
+            hits = []
+
+            for i, s, e in matches:
+                table, codes = self._table(i)
+                chr = self.__shards[i]["chr"]
+
+                kmers = np.array(codes[s:e])
+                pos = np.array(table["pos"][s:e])
+
+                if self.__canonical:
+                    rev = (pos & np.uint32(KMER_REV_FLAG)) > 0
+                    kmers = np.where(rev, kmer_rev_comp(kmers, k), kmers)
+                    pos &= np.uint32(KMER_REV_FLAG - 1)
+
+                # kmers is now the k-mer on the forward strand
+                rc = kmer_rev_comp(kmers, k)
+                forward = _mismatches(kmers, queries[q], k)
+                reverse = _mismatches(rc, queries[q], k)
+
+                for p, f, r, palindrome in zip(
+                    pos.tolist(),
+                    forward.tolist(),
+                    reverse.tolist(),
+                    (rc == kmers).tolist(),
+                ):
+                    if f <= mismatches:
+                        hits.append(KmerHit(chr, p + 1, p + k, "+", f))
+
+                    # a palindrome is reported once
+                    if r <= mismatches and not palindrome:
+                        hits.append(KmerHit(chr, p + 1, p + k, "-", r))
+
+            hits.sort(key=lambda h: (chrs[h.chr], h.start, h.strand))
+            ret[q] = hits
+
+        return ret
@@ -6,11 +6,29 @@ Created on Thu Aug 23 16:09:37 2018
 @author: antony
 """
 
+import collections
 import re
+from array import array
+import gal
 
 LOC_REGEX = re.compile(r"(chr(?:[1-9][0-9]?|[XYM])):(\d+)-(\d+)")
 SHORT_LOC_REGEX = re.compile(r"(chr(?:[1-9][0-9]?|[XYM])):(\d+)")
 
+# One location per line, chr:start-end or chr:start, allowing any
+# chromosome name. A non-empty last group means trailing junk. Digits
+# are ASCII only since int() would also accept other scripts.
+BULK_LOC_REGEX = re.compile(
+    r"^[ \t]*(?:([^\s:]+):([0-9]+)(?:-([0-9]+))?)?[ \t]*(.*)$", re.MULTILINE
+)
+
+# Largest coordinate that fits in the int64 columns
+MAX_LOC_POS = 2**63 - 1
+MAX_LOC_DIGITS = len(str(MAX_LOC_POS))
+
+ParsedLocations = collections.namedtuple(
+    "ParsedLocations", ["chrs", "starts", "ends", "bad"]
+)
+
 
 # class Loc(object):
 #     def __init__(self, chr, start, end):
@@ -113,6 +131,147 @@ SHORT_LOC_REGEX = re.compile(r"(chr(?:[1-9][0-9]?|[XYM])):(\d+)")
 #                 return None
 
 
+def parse_locations(locs) -> ParsedLocations:
+    """
+    Parse many location strings such as 'chr1:1,000-2,000' or the single
+    point form 'chr1:1000' into parallel columns. The strings are joined
+    and scanned with one regular expression pass over the whole text.
+    Each match is discarded once its row is appended, so only the
+    compact columns are kept, and each chromosome name is stored once.
+
+    Parameters
+    ----------
+    locs : iterable
+        Location strings, e.g. a list, numpy array, pandas Series or
+        Arrow array.
+
+    Returns
+    -------
+    ParsedLocations
+        (chrs, starts, ends, bad) where chrs is a list and starts and
+        ends are int64 arrays of the valid rows in input order, with
+        1-based coordinates and start <= end, ready for
+        libdna.columnar.dna_buffers. bad lists the indices of rows that
+        could not be parsed or whose coordinates do not fit in int64,
+        which are left out of the columns.
+    """
+
+    if hasattr(locs, "to_pylist"):
+        locs = locs.to_pylist()
+    elif hasattr(locs, "tolist"):
+        locs = locs.tolist()
+    else:
+        locs = list(locs)
+
+    chrs = []
+    starts = array("q")
+    ends = array("q")
+    bad = []
+
+    n = len(locs)
+
+    if n == 0:
+        return ParsedLocations(chrs, starts, ends, bad)
+
+    # missing values and strings with embedded newlines would misalign
+    # the lines so they are blanked and reported as bad
+    text = "\n".join(
+        [loc if isinstance(loc, str) and "\n" not in loc else "" for loc in locs]
+    ).replace(",", "")
+
+    # share one str per chromosome name
+    names = {}
+
+    for i, match in enumerate(BULK_LOC_REGEX.finditer(text)):
+        if i == n:
+            # the empty string after the last line also matches
+            break
+
+        chr, start, end, rest = match.groups(default="")
+
+        # very long numbers are out of range and int() would refuse
+        # those over its digit limit
+        if chr == "" or rest != "" or max(len(start), len(end)) > MAX_LOC_DIGITS:
+            bad.append(i)
+            continue
+
+        s = int(start)
+        e = int(end) if end != "" else s
+
+        if s > e:
+            s, e = e, s
+
+        # check before appending so the columns stay aligned
+        if s < 1 or e > MAX_LOC_POS:
+            bad.append(i)
+            continue
+
+        chrs.append(names.setdefault(chr, chr))
+        starts.append(s)
+        ends.append(e)
+
+    return ParsedLocations(chrs, starts, ends, bad)
+
+
+def location_blocks(chrs, starts, ends, block_size: int, order=None):
+    """
+    Group locations into blocks of nearby locations on the same
+    chromosome so that each block can be served by a single read.
+    Locations are taken in order of position and a block grows while it
+    spans at most block_size bases, so a location longer than block_size
+    is a block of its own.
+
+    Parameters
+    ----------
+    chrs : sequence
+        Chromosome of each location.
+    starts : sequence
+        Start of each location.
+    ends : sequence
+        Inclusive end of each location.
+    block_size : int
+        Maximum span of a block unless a single location is longer.
+    order : list, optional
+        Indices of the locations sorted by chromosome and start, if
+        already known.
+
+    Returns
+    -------
+    generator
+        (loc, members) for each block, where loc is the
+        gal.genomic.Location spanning the block and members lists the
+        indices of its locations in order of position.
+    """
+
+    if order is None:
+        order = sorted(range(len(chrs)), key=lambda i: (chrs[i], starts[i]))
+
+    n = len(order)
+
+    i = 0
+
+    while i < n:
+        chr = chrs[order[i]]
+        start = int(starts[order[i]])
+        end = int(ends[order[i]])
+
+        # grow the block while locations stay within block_size
+        j = i + 1
+
+        while j < n:
+            k = order[j]
+
+            if chrs[k] != chr or max(end, ends[k]) - start + 1 > block_size:
+                break
+
+            end = max(end, int(ends[k]))
+            j += 1
+
+        yield gal.genomic.Location(chr, start, end), order[i:j]
+
+        i = j
+
+
 def format_dna(dna, width=80):
     """
     Format dna so each line is a fixed width.
@@ -0,0 +1,343 @@
+import json
+import os
+
+MANIFEST_FILE = "manifest.json"
+
+MANIFEST_VERSION = 1
+
+# Suffixes of the files making up an encoded chromosome
+DNA_FILE_SUFFIXES = (".dna.2bit", ".dna.4bit", ".n.1bit", ".mask.1bit")
+
+
+def chr_from_file(file: str) -> str:
+    """
+    Returns the chromosome an encoded file belongs to, e.g. 'chr1' for
+    'chr1.dna.2bit', or None if it is not an encoded file.
+    """
+
+    name = file.lower()
+
+    for suffix in DNA_FILE_SUFFIXES:
+        if name.endswith(suffix):
+            return name[: -len(suffix)]
+
+    return None
+
+
+def _any_bits(file: str) -> bool:
+    """
+    Returns True if any bit is set in a 1 bit file.
+    """
+
+    with open(file, "rb") as f:
+        while True:
+            data = f.read(1048576)
+
+            if not data:
+                return False
+
+            if data.count(0) != len(data):
+                return True
+
+
+class GenomeManifest:
+    """
+    In memory description of an encoded genome directory: the files
+    present for each chromosome, their sizes and, when known, each
+    chromosome's exact length and whether it contains any N or
+    soft-masked bases. Readers use it to resolve files and validate
+    locations without touching the filesystem on every query.
+
+    A manifest is written to manifest.json by the encoders. If it does
+    not exist one is built from a single listing of the directory, in
+    which case lengths are inferred from file sizes and the N and mask
+    flags are unknown (None).
+
+    Remote genome directories cannot be listed so their files are taken
+    from the manifest itself.
+    """
+
+    def __init__(
+        self, dir: str, chrs: dict = None, sources: dict = None, scan: bool = True
+    ):
+        """
+        Parameters
+        ----------
+        dir : str
+            Genome directory.
+        chrs : dict, optional
+            Map of chromosome to its entry.
+        sources : dict, optional
+            Map of source file to metadata recorded when it was fully
+            encoded.
+        scan : bool, optional
+            List the directory for files. If False, the files recorded in
+            the entries are used and paths are dir/file, e.g. for a URL.
+        """
+
+        self.__dir = dir
+        self.__chrs = chrs if chrs is not None else {}
+        self.__sources = sources if sources is not None else {}
+        self.__scan = scan
+        # lowercase file name -> path
+        self.__paths = {}
+
+        self._scan_files()
+
+    @staticmethod
+    def open(dir: str) -> "GenomeManifest":
+        """
+        Load the manifest of a genome directory, or build one from a
+        listing of the directory if it has none.
+        """
+
+        file = os.path.join(dir, MANIFEST_FILE)
+
+        data = {}
+
+        if os.path.exists(file):
+            with open(file, "r") as f:
+                data = json.load(f)
+
+        return GenomeManifest(dir, data.get("chrs"), data.get("sources"))
+
+    @property
+    def dir(self) -> str:
+        return self.__dir
+
+    @property
+    def chrs(self) -> list:
+        return sorted(self.__chrs)
+
+    def _scan_files(self):
+        """
+        List the directory once to record the files of each chromosome
+        and their sizes.
+        """
+
+        self.__paths = {}
+
+        if not self.__scan:
+            for entry in self.__chrs.values():
+                for name in entry.get("files", {}):
+                    self.__paths[name] = f"{self.__dir.rstrip('/')}/{name}"
+
+            return
+
+        for entry in self.__chrs.values():
+            entry["files"] = {}
+
+        if not os.path.isdir(self.__dir):
+            return
+
+        for entry in os.scandir(self.__dir):
+            chr = chr_from_file(entry.name)
+
+            if chr is None:
+                continue
+
+            name = entry.name.lower()
+
+            self.__paths[name] = entry.path
+
+            if chr not in self.__chrs:
+                self.__chrs[chr] = {"files": {}}
+
+            self.__chrs[chr]["files"][name] = entry.stat().st_size
+
+    def refresh(self):
+        """
+        Re-list the directory, e.g. after new chromosomes are encoded.
+        """
+
+        self._scan_files()
+
+    def path(self, file: str) -> str:
+        """
+        Returns the path of a file in the genome directory or None if
+        the file does not exist.
+        """
+
+        return self.__paths.get(file.lower())
+
+    def entry(self, chr: str) -> dict:
+        return self.__chrs.get(chr.lower())
+
+    def file_size(self, file: str) -> int:
+        """
+        Returns the size of a file, or None if it does not exist.
+        """
+
+        chr = chr_from_file(file)
+
+        if chr is None or chr not in self.__chrs:
+            return None
+
+        return self.__chrs[chr].get("files", {}).get(file.lower())
+
+    def length(self, chr: str) -> int:
+        """
+        Returns the exact length of a chromosome if it was recorded at
+        encode time, otherwise None.
+        """
+
+        entry = self.entry(chr)
+
+        if entry is None:
+            return None
+
+        return entry.get("length")
+
+    def has_n(self, chr: str) -> bool:
+        """
+        Returns whether a chromosome contains N bases, or None if unknown.
+        """
+
+        entry = self.entry(chr)
+
+        if entry is None:
+            return None
+
+        return entry.get("has_n")
+
+    def has_mask(self, chr: str) -> bool:
+        """
+        Returns whether a chromosome contains soft-masked bases, or None
+        if unknown.
+        """
+
+        entry = self.entry(chr)
+
+        if entry is None:
+            return None
+
+        return entry.get("has_mask")
+
+    def update(self, chr: str, **values):
+        """
+        Set values, such as length, has_n or has_mask, for a chromosome.
+        """
+
+        chr = chr.lower()
+
+        if chr not in self.__chrs:
+            self.__chrs[chr] = {}
+
+        self.__chrs[chr].update(values)
+
+    def source(self, file: str) -> dict:
+        """
+        Returns the metadata recorded for a fully encoded source file,
+        or None.
+        """
+
+        return self.__sources.get(file)
+
+    def set_source(self, file: str, values: dict):
+        self.__sources[file] = values
+
+    def save(self):
+        """
+        Write the manifest to manifest.json in the genome directory.
+        """
+
+        self._scan_files()
+
+        file = os.path.join(self.__dir, MANIFEST_FILE)
+        tmp = f"{file}.tmp"
+
+        with open(tmp, "w") as f:
+            json.dump(
+                {
+                    "version": MANIFEST_VERSION,
+                    "chrs": self.__chrs,
+                    "sources": self.__sources,
+                },
+                f,
+                indent=1,
+                sort_keys=True,
+            )
+
+        os.replace(tmp, file)
+
+
+def update_manifest(dir: str, chr: str, **values):
+    """
+    Record values for a chromosome in the manifest of a genome
+    directory, creating it if necessary.
+    """
+
+    manifest = GenomeManifest.open(dir)
+    manifest.update(chr, **values)
+    manifest.save()
+
+
+def build_manifest(dir: str) -> GenomeManifest:
+    """
+    Build and save a complete manifest for an existing genome directory
+    by reading its N and mask files. Lengths are only recorded when a
+    4 bit file is present, as the padding of a 2 bit file makes its
+    length ambiguous; readers then infer them from the file sizes.
+
+    Parameters
+    ----------
+    dir : str
+        Genome directory.
+
+    Returns
+    -------
+    GenomeManifest
+        The manifest.
+    """
+
+    manifest = GenomeManifest.open(dir)
+
+    for chr in manifest.chrs:
+        values = {}
+
+        path = manifest.path(f"{chr}.n.1bit")
+
+        if path is not None:
+            values["has_n"] = _any_bits(path)
+
+        path = manifest.path(f"{chr}.mask.1bit")
+
+        if path is not None:
+            values["has_mask"] = _any_bits(path)
+
+        path = manifest.path(f"{chr}.dna.4bit")
+
+        if path is not None:
+            size = os.path.getsize(path)
+
+            with open(path, "rb") as f:
+                f.seek(max(size - 1, 0))
+                last = f.read(1)
+
+            # the last byte holds one base and an empty lower nibble or is
+            # entirely padding
+            if size < 2 or last[0] == 0:
+                values["length"] = max(size - 2, 0) * 2
+            elif last[0] & 15 == 0:
+                values["length"] = (size - 1) * 2 - 1
+            else:
+                values["length"] = (size - 1) * 2
+
+            if "has_n" not in values or "has_mask" not in values:
+                # the 4 bit codes record both N and case
+                with open(path, "rb") as f:
+                    f.seek(1)
+                    codes = set()
+
+                    for b in set(f.read()):
+                        codes.add(b >> 4)
+                        codes.add(b & 15)
+
+                values.setdefault("has_n", 9 in codes or 10 in codes)
+                values.setdefault("has_mask", len(codes & {5, 6, 7, 8, 10}) > 0)
+
+        manifest.update(chr, **values)
+
+    manifest.save()
+
+    return manifest
@@ -0,0 +1,160 @@
+import gal
+
+# Number of bases decoded at a time when scanning a chromosome
+DEFAULT_SEARCH_CHUNK_SIZE = 1048576
+
+# IUPAC degenerate bases and the base codes (A=0, C=1, G=2, T=3) they
+# match
+IUPAC_CODES = {
+    "A": (0,),
+    "C": (1,),
+    "G": (2,),
+    "T": (3,),
+    "U": (3,),
+    "R": (0, 2),
+    "Y": (1, 3),
+    "S": (1, 2),
+    "W": (0, 3),
+    "K": (2, 3),
+    "M": (0, 1),
+    "B": (1, 2, 3),
+    "D": (0, 2, 3),
+    "H": (0, 1, 3),
+    "V": (0, 1, 2),
+    "N": (0, 1, 2, 3),
+}
+
+IUPAC_COMP_TABLE = str.maketrans("ACGTURYSWKMBDHVN", "TGCAAYRSWMKVHDBN")
+
+
+def rev_comp_pattern(pattern: str) -> str:
+    """
+    Reverse complement an IUPAC pattern.
+    """
+
+    return pattern.upper().translate(IUPAC_COMP_TABLE)[::-1]
+
+
+def shift_and_masks(pattern: str) -> list:
+    """
+    Create the Shift-And bit masks for a pattern. Bit i of mask c is set
+    if position i of the pattern accepts base code c. Code 4 (N) is
+    never accepted so N bases in the genome reset any partial match.
+
+    Parameters
+    ----------
+    pattern : str
+        IUPAC pattern.
+
+    Returns
+    -------
+    list
+        Five masks indexed by base code.
+    """
+
+    if len(pattern) == 0:
+        raise ValueError("pattern cannot be empty")
+
+    masks = [0] * 5
+
+    for i, b in enumerate(pattern.upper()):
+        if b not in IUPAC_CODES:
+            raise ValueError(f"{b} is not an IUPAC base")
+
+        for c in IUPAC_CODES[b]:
+            masks[c] |= 1 << i
+
+    return masks
+
+
+def search(
+    dna,
+    pattern: str,
+    loc,
+    both_strands=True,
+    chunk_size=DEFAULT_SEARCH_CHUNK_SIZE,
+):
+    """
+    Find exact or IUPAC degenerate matches of a pattern using the
+    bit-parallel Shift-And algorithm over numeric base codes. The region
+    is streamed in chunks so memory use does not depend on its size.
+    Bases in the N mask never match.
+
+    Parameters
+    ----------
+    dna : DNA2Bit or DNA4Bit
+        Reader to search.
+    pattern : str
+        IUPAC pattern, e.g. 'TGASTCA'.
+    loc : str or gal.genomic.Location
+        Either a chromosome name to search the whole chromosome or a
+        location, which must lie within its chromosome.
+    both_strands : bool, optional
+        If True, also report matches of the reverse complement of the
+        pattern. These are reported once only for palindromic patterns.
+    chunk_size : int, optional
+        Number of bases decoded at a time.
+
+    Returns
+    -------
+    generator
+        Tuples of (chr, start, end, strand) for each match, 1-based and
+        inclusive, in order of end position.
+    """
+
+    if isinstance(loc, str):
+        chr = loc
+        start = 1
+        end = dna.chr_length(chr)
+    else:
+        # the padding past the end of a chromosome decodes as A and
+        # would give false hits
+        dna._check_bounds(loc)
+        chr = loc.chr
+        start = loc.start
+        end = loc.end
+
+    n = len(pattern)
+    hit = 1 << (n - 1)
+
+    masks1 = shift_and_masks(pattern)
+
+    rev_pattern = rev_comp_pattern(pattern)
+
+    if both_strands and rev_pattern != pattern.upper():
+        masks2 = shift_and_masks(rev_pattern)
+    else:
+        masks2 = None
+
+    d1 = 0
+    d2 = 0
+
+    p = start
+
+    while p <= end:
+        e = min(end, p + chunk_size - 1)
+
+        codes = dna._read_codes(gal.genomic.Location(chr, p, e))
+
+        # position of the current base
+        pos = p
+
+        for c in codes:
+            d1 = ((d1 << 1) | 1) & masks1[c]
+
+            if d1 & hit:
+                yield (chr, pos - n + 1, pos, "+")
+
+            if masks2 is not None:
+                d2 = ((d2 << 1) | 1) & masks2[c]
+
+                if d2 & hit:
+                    yield (chr, pos - n + 1, pos, "-")
+
+            pos += 1
+
+        if len(codes) < e - p + 1:
+            # ran off the end of the data
+            break
+
+        p = e + 1
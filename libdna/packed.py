@@ -0,0 +1,410 @@
+def _unpack_tables(bits: int, f) -> list:
+    """
+    Create bytes.translate tables to expand packed bytes into one byte
+    per field. Table i extracts field i of each byte, with the first
+    field stored in the uppermost bits.
+
+    Parameters
+    ----------
+    bits : int
+        Size of each field in bits (1, 2 or 4).
+    f : function
+        Maps the raw value of a field to its output byte.
+
+    Returns
+    -------
+    list
+        8 / bits translation tables.
+    """
+
+    n = 8 // bits
+    m = (1 << bits) - 1
+
+    return [
+        bytes([f((b >> (8 - bits * (i + 1))) & m) for b in range(256)])
+        for i in range(n)
+    ]
+
+
+def _pack_tables(bits: int) -> list:
+    """
+    Create bytes.translate tables moving the low bits of a byte into
+    field i of a packed byte, the inverse of _unpack_tables.
+    """
+
+    n = 8 // bits
+    m = (1 << bits) - 1
+
+    return [
+        bytes([(v & m) << (8 - bits * (i + 1)) for v in range(256)]) for i in range(n)
+    ]
+
+
+DNA_1BIT_TABLES = _unpack_tables(1, lambda v: v)
+DNA_2BIT_CODE_TABLES = _unpack_tables(2, lambda v: v)
+
+PACK_TABLES = {1: _pack_tables(1), 2: _pack_tables(2)}
+
+# Reverse the order of the fields of a byte, complementing 2 bit codes
+# (3 - code flips both bits) so a reversed buffer is the reverse
+# complement
+PACKED_REV_COMP_TABLES = {
+    1: bytes([int(f"{b:08b}"[::-1], 2) for b in range(256)]),
+    2: bytes(
+        [
+            sum([(3 - ((b >> (2 * i)) & 3)) << (6 - 2 * i) for i in range(4)])
+            for b in range(256)
+        ]
+    ),
+}
+
+# 1 for the N code (4), 0 otherwise
+N_CODE_FLAG_TABLE = bytes([1 if v == 4 else 0 for v in range(256)])
+
+# Decode code | N << 2 | mask << 3 into chars for each mask mode
+PACKED_DECODE_TABLES = {
+    "l": (b"ACGT" + b"N" * 4 + b"acgt" + b"n" * 4).ljust(256, b"N"),
+    "u": (b"ACGT" + b"N" * 4 + b"ACGT" + b"N" * 4).ljust(256, b"N"),
+    "n": (b"ACGT").ljust(256, b"N"),
+}
+
+
+def unpack_bits(data: bytes, tables: list) -> bytearray:
+    """
+    Expand packed data into one byte per field using a set of
+    translation tables from _unpack_tables. Each table is applied to the
+    whole buffer at once and the results are interleaved, so no Python
+    level loop over bases is required.
+
+    Parameters
+    ----------
+    data : bytes
+        Packed data.
+    tables : list
+        Translation tables, one per field in a byte.
+
+    Returns
+    -------
+    bytearray
+        Unpacked data, len(tables) bytes per input byte.
+    """
+
+    n = len(tables)
+
+    ret = bytearray(n * len(data))
+
+    for i, table in enumerate(tables):
+        ret[i::n] = data.translate(table)
+
+    return ret
+
+
+def pack_bits(data: bytes, bits: int) -> bytes:
+    """
+    Pack one field per byte, 1 or 2 bits each, into bytes with the first
+    field in the uppermost bits, the inverse of unpack_bits. The fields
+    for each position in a byte are moved into place with a translation
+    table and OR-ed together as big integers.
+
+    Parameters
+    ----------
+    data : bytes
+        One field per byte in the low bits.
+    bits : int
+        Size of each field in bits.
+
+    Returns
+    -------
+    bytes
+        Packed data padded with zero fields to a whole byte.
+    """
+
+    n = 8 // bits
+    size = -(-len(data) // n)
+
+    data = bytes(data) + bytes(size * n - len(data))
+
+    x = 0
+
+    for i, table in enumerate(PACK_TABLES[bits]):
+        x |= int.from_bytes(data[i::n].translate(table), "big")
+
+    return x.to_bytes(size, "big")
+
+
+def _field_int(data: bytes, bits: int, offset: int, length: int) -> int:
+    """
+    Returns fields [offset, offset + length) of packed data as an
+    integer, first field uppermost.
+    """
+
+    if data is None:
+        return 0
+
+    total = 8 * len(data) // bits
+
+    return (int.from_bytes(data, "big") >> (bits * (total - offset - length))) & (
+        (1 << (bits * length)) - 1
+    )
+
+
+def _join_ints(values: list, lengths: list, bits: int) -> int:
+    """
+    Concatenate integers of packed fields. Pairs are joined level by
+    level so each field is shifted log(n) times rather than once per
+    later value.
+    """
+
+    items = list(zip(values, lengths))
+
+    while len(items) > 1:
+        merged = [
+            ((a << (bits * lb)) | b, la + lb)
+            for (a, la), (b, lb) in zip(items[0::2], items[1::2])
+        ]
+
+        if len(items) % 2 == 1:
+            merged.append(items[-1])
+
+        items = merged
+
+    return items[0][0]
+
+
+class PackedSeq:
+    """
+    The bases of an interval kept packed: 2 bit codes, 4 bases per byte,
+    plus 1 bit N and soft-mask bitmaps, 8 bases per byte, laid out as in
+    the .dna.2bit, .n.1bit and .mask.1bit files. Slicing copies only the
+    bytes covering the slice and reverse complementing is a byte
+    translation and reversal, so sequences can be cut, joined and
+    flipped while a quarter of the size of chars, then decoded once.
+
+    The buffers start at a whole byte so the first base is at bit offset
+    offset of the bitmaps and offset % 4 of the codes, with offset in
+    [0, 8).
+    """
+
+    def __init__(
+        self,
+        codes: bytes,
+        n: bytes = None,
+        mask: bytes = None,
+        length: int = None,
+        offset: int = 0,
+    ):
+        """
+        Parameters
+        ----------
+        codes : bytes
+            2 bit codes (A=0, C=1, G=2, T=3).
+        n : bytes, optional
+            N bitmap, or None if there are no N bases.
+        mask : bytes, optional
+            Soft-mask bitmap, or None if there are no masked bases.
+        length : int, optional
+            Number of bases. Defaults to all the bases in codes.
+        offset : int, optional
+            Position of the first base in the first byte of the bitmaps.
+        """
+
+        if length is None:
+            length = 4 * len(codes) - offset % 4
+
+        # keep the buffers to the bytes covering the bases, which
+        # reverse complementing relies on
+        c = -(-(offset % 4 + length) // 4)
+        b = -(-(offset + length) // 8)
+
+        self.__codes = codes[:c] if len(codes) > c else codes
+        self.__n = n[:b] if n is not None and len(n) > b else n
+        self.__mask = mask[:b] if mask is not None and len(mask) > b else mask
+        self.__length = length
+        self.__offset = offset
+
+    @staticmethod
+    def from_codes(codes: bytes, mask: bytes = None) -> "PackedSeq":
+        """
+        Pack one byte per base codes (A=0, C=1, G=2, T=3, N=4).
+
+        Parameters
+        ----------
+        codes : bytes
+            Base codes.
+        mask : bytes, optional
+            One byte per base, 1 if soft-masked.
+        """
+
+        n = pack_bits(codes.translate(N_CODE_FLAG_TABLE), 1) if 4 in codes else None
+
+        if mask is not None and 1 not in mask:
+            mask = None
+
+        return PackedSeq(
+            pack_bits(codes, 2),
+            n,
+            pack_bits(mask, 1) if mask is not None else None,
+            len(codes),
+        )
+
+    @staticmethod
+    def join(seqs) -> "PackedSeq":
+        """
+        Concatenate packed sequences.
+        """
+
+        seqs = list(seqs)
+
+        if len(seqs) == 0:
+            return PackedSeq(b"", length=0)
+
+        if len(seqs) == 1:
+            return seqs[0]
+
+        lengths = [len(s) for s in seqs]
+        length = sum(lengths)
+
+        # pad to whole bytes with the first base at offset 0
+        p2 = -length % 4
+        p1 = -length % 8
+
+        codes = _join_ints([s._field_int(0) for s in seqs], lengths, 2)
+
+        bitmaps = []
+
+        for i in [1, 2]:
+            if all([s._bitmap(i) is None for s in seqs]):
+                bitmaps.append(None)
+            else:
+                x = _join_ints([s._field_int(i) for s in seqs], lengths, 1)
+                bitmaps.append((x << p1).to_bytes((length + p1) // 8, "big"))
+
+        return PackedSeq(
+            (codes << (2 * p2)).to_bytes((length + p2) // 4, "big"),
+            bitmaps[0],
+            bitmaps[1],
+            length,
+        )
+
+    def _bitmap(self, i: int) -> bytes:
+        return self.__n if i == 1 else self.__mask
+
+    def _field_int(self, i: int) -> int:
+        """
+        Returns the codes (i = 0), N bitmap (1) or mask bitmap (2) of the
+        bases as an integer.
+        """
+
+        if i == 0:
+            return _field_int(self.__codes, 2, self.__offset % 4, self.__length)
+
+        return _field_int(self._bitmap(i), 1, self.__offset, self.__length)
+
+    def __len__(self) -> int:
+        return self.__length
+
+    def __add__(self, other: "PackedSeq") -> "PackedSeq":
+        return PackedSeq.join([self, other])
+
+    def __getitem__(self, s: slice) -> "PackedSeq":
+        if not isinstance(s, slice):
+            raise TypeError("a packed sequence can only be sliced")
+
+        start, end, step = s.indices(self.__length)
+
+        if step != 1:
+            raise ValueError("a packed sequence slice must have step 1")
+
+        end = max(start, end)
+
+        o = self.__offset
+        c = o % 4
+
+        # bytes covering the slice in each buffer
+        cs = (c + start) // 4
+        ce = -(-(c + end) // 4)
+        bs = (o + start) // 8
+        be = -(-(o + end) // 8)
+
+        return PackedSeq(
+            self.__codes[cs:ce],
+            self.__n[bs:be] if self.__n is not None else None,
+            self.__mask[bs:be] if self.__mask is not None else None,
+            end - start,
+            (o + start) % 8,
+        )
+
+    def rev_comp(self) -> "PackedSeq":
+        """
+        Returns the reverse complement. The bytes of each buffer are
+        translated to reverse, and complement, their fields and then
+        reversed, so the first base is at the padding left after the
+        last base.
+        """
+
+        # bitmap bytes covering the bases
+        b = -(-(self.__offset + self.__length) // 8)
+
+        offset = 8 * b - self.__offset - self.__length
+
+        ret = []
+
+        for data, bits in [(self.__codes, 2), (self.__n, 1), (self.__mask, 1)]:
+            if data is not None:
+                data = data.translate(PACKED_REV_COMP_TABLES[bits])[::-1]
+
+            ret.append(data)
+
+        return PackedSeq(ret[0], ret[1], ret[2], self.__length, offset)
+
+    def decode_bytes(self, mask: str = "lower") -> bytearray:
+        """
+        Decode to chars.
+
+        Parameters
+        ----------
+        mask : str, optional
+            Indicate whether masked bases should be represented as is
+            ('upper'), lowercase ('lower'), or as N ('n')
+
+        Returns
+        -------
+        bytearray
+            One char per base.
+        """
+
+        o = self.__offset
+        length = self.__length
+
+        codes = unpack_bits(self.__codes, DNA_2BIT_CODE_TABLES)[o % 4 : o % 4 + length]
+
+        bitmaps = [(self.__n, 2)]
+
+        if not mask.startswith("u"):
+            bitmaps.append((self.__mask, 3))
+
+        x = None
+
+        for data, shift in bitmaps:
+            # 1 bit files are mostly empty
+            if data is None or data.count(0) == len(data):
+                continue
+
+            flags = unpack_bits(data, DNA_1BIT_TABLES)[o : o + length]
+
+            if x is None:
+                x = int.from_bytes(codes, "big")
+
+            x |= int.from_bytes(flags, "big") << shift
+
+        if x is not None:
+            codes = bytearray(x.to_bytes(length, "big"))
+
+        return codes.translate(PACKED_DECODE_TABLES[mask[0]])
+
+    def decode(self, mask: str = "lower") -> str:
+        """
+        Decode to a str. See decode_bytes.
+        """
+
+        return self.decode_bytes(mask=mask).decode("ascii")
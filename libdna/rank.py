@@ -0,0 +1,318 @@
+from array import array
+import os
+import struct
+
+# Bytes of a 1 bit file covered by each cumulative count (4096 bases)
+RANK_SUPERBLOCK_BYTES = 512
+
+RANK_SUFFIX = ".rank"
+
+# magic, superblock bytes, size and mtime of the 1 bit file indexed
+RANK_HEADER = struct.Struct("<4sIQq")
+RANK_MAGIC = b"RNK1"
+
+
+def popcount(data: bytes) -> int:
+    """
+    Number of set bits in a byte buffer.
+    """
+
+    return bin(int.from_bytes(data, "big")).count("1")
+
+
+def _read_local(path: str, seek: int, n: int) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(seek)
+        return f.read(n)
+
+
+class BitRank:
+    """
+    Rank/select index over a 1 bit file such as the .n.1bit or
+    .mask.1bit file of a chromosome. The index stores the cumulative
+    number of set bits at the start of each superblock so that the
+    number of set bits in any range is found by reading at most two
+    superblocks, and runs of empty or full superblocks can be skipped
+    when searching for the next set or clear bit.
+
+    The counts are saved to a small sidecar file next to the 1 bit file
+    and rebuilt if the 1 bit file changes.
+    """
+
+    def __init__(self, read, counts: array, size: int):
+        """
+        Parameters
+        ----------
+        read : function
+            read(seek, n) returning bytes of the 1 bit file.
+        counts : array
+            Cumulative set bits before each superblock, with a final
+            entry for the total.
+        size : int
+            Size of the 1 bit file in bytes.
+        """
+
+        self.__read = read
+        self.__counts = counts
+        self.__size = size
+
+    @staticmethod
+    def open(path: str, read=None, storage=None, size: int = None) -> "BitRank":
+        """
+        Load the index of a 1 bit file, building it if the sidecar is
+        missing or out of date. Indexes of local files are saved next to
+        them; for remote files, or a read only directory, the index is
+        kept in memory.
+
+        Parameters
+        ----------
+        path : str
+            Path or URL of the 1 bit file.
+        read : function, optional
+            read(seek, n) used to read the 1 bit file, e.g. to go through
+            a reader's own cache. Defaults to reading it from storage.
+        storage : Storage, optional
+            Storage the 1 bit file and its sidecar are read from.
+            Defaults to reading local files directly.
+        size : int, optional
+            Size of the 1 bit file in bytes, e.g. from the manifest, used
+            if path is not a local file.
+
+        Returns
+        -------
+        BitRank
+            The index.
+        """
+
+        read_file = storage.read if storage is not None else _read_local
+
+        try:
+            st = os.stat(path)
+        except OSError:
+            # remote file so it cannot be checked for changes or indexed
+            # in place
+            st = None
+
+        if st is not None:
+            size = st.st_size
+        elif size is None:
+            raise FileNotFoundError(path)
+
+        if read is None:
+
+            def read(seek, n):
+                return read_file(path, seek, n)
+
+        mtime = st.st_mtime_ns if st is not None else None
+
+        counts = BitRank._load(read_file, path + RANK_SUFFIX, size, mtime)
+
+        if counts is None:
+            counts = BitRank._build(read, size)
+
+            if st is not None:
+                try:
+                    BitRank._save(path + RANK_SUFFIX, size, mtime, counts)
+                except OSError:
+                    # read only genome directory so keep the index in memory
+                    pass
+
+        return BitRank(read, counts, size)
+
+    @staticmethod
+    def _build(read, size: int) -> array:
+        counts = array("Q", [0])
+
+        total = 0
+
+        # read many superblocks at a time since each read may be a
+        # request to remote storage
+        step = RANK_SUPERBLOCK_BYTES * 256
+
+        for seek in range(0, size, step):
+            data = read(seek, min(step, size - seek))
+
+            for s in range(0, len(data), RANK_SUPERBLOCK_BYTES):
+                total += popcount(data[s : s + RANK_SUPERBLOCK_BYTES])
+                counts.append(total)
+
+        return counts
+
+    @staticmethod
+    def _load(read_file, file: str, size: int, mtime: int) -> array:
+        """
+        Read a sidecar, returning None if it is missing or was built for
+        a different version of the 1 bit file. Without an mtime, i.e. for
+        remote files, only the size is checked.
+        """
+
+        try:
+            header = read_file(file, 0, RANK_HEADER.size)
+        except OSError:
+            return None
+
+        if header is None or len(header) != RANK_HEADER.size:
+            return None
+
+        magic, sb, s, t = RANK_HEADER.unpack(header)
+
+        if (
+            magic != RANK_MAGIC
+            or sb != RANK_SUPERBLOCK_BYTES
+            or s != size
+            or (mtime is not None and t != mtime)
+        ):
+            return None
+
+        n = 8 * (-(-size // RANK_SUPERBLOCK_BYTES) + 1)
+
+        data = read_file(file, RANK_HEADER.size, n)
+
+        if data is None or len(data) != n:
+            return None
+
+        counts = array("Q")
+        counts.frombytes(data)
+
+        return counts
+
+    @staticmethod
+    def _save(file: str, size: int, mtime: int, counts: array):
+        tmp = file + ".tmp"
+
+        with open(tmp, "wb") as f:
+            f.write(RANK_HEADER.pack(RANK_MAGIC, RANK_SUPERBLOCK_BYTES, size, mtime))
+            f.write(counts.tobytes())
+
+        os.replace(tmp, file)
+
+    @property
+    def size(self) -> int:
+        """
+        Number of bits in the file.
+        """
+
+        return self.__size * 8
+
+    @property
+    def total(self) -> int:
+        """
+        Number of set bits in the file.
+        """
+
+        return self.__counts[-1]
+
+    def rank(self, i: int) -> int:
+        """
+        Number of set bits in positions [0, i).
+
+        Parameters
+        ----------
+        i : int
+            0-based bit position.
+
+        Returns
+        -------
+        int
+            Number of set bits before i.
+        """
+
+        if i <= 0:
+            return 0
+
+        if i >= self.size:
+            return self.total
+
+        bi = i // 8
+        sb = bi // RANK_SUPERBLOCK_BYTES
+
+        ret = self.__counts[sb]
+
+        s = sb * RANK_SUPERBLOCK_BYTES
+
+        # whole bytes then the leading bits of the partial byte
+        data = self.__read(s, bi - s + 1)
+
+        ret += popcount(data[: bi - s])
+
+        r = i % 8
+
+        if r > 0:
+            ret += popcount(bytes([data[bi - s] >> (8 - r)]))
+
+        return ret
+
+    def count(self, start: int, end: int) -> int:
+        """
+        Number of set bits in a 1-based inclusive range of bases.
+        """
+
+        return self.rank(end) - self.rank(start - 1)
+
+    def _superblock_count(self, sb: int) -> int:
+        return self.__counts[sb + 1] - self.__counts[sb]
+
+    def _find(self, i: int, value: int) -> int:
+        """
+        Find the first bit at or after i equal to value.
+
+        Returns
+        -------
+        int
+            0-based bit position or None.
+        """
+
+        sb_bits = RANK_SUPERBLOCK_BYTES * 8
+        n = len(self.__counts) - 1
+
+        sb = i // sb_bits
+
+        while sb < n:
+            s = sb * RANK_SUPERBLOCK_BYTES
+            data = self.__read(s, RANK_SUPERBLOCK_BYTES)
+            bits = len(data) * 8
+
+            c = self._superblock_count(sb)
+
+            # skip superblocks that cannot contain the value
+            if (value == 1 and c > 0) or (value == 0 and c < bits):
+                x = int.from_bytes(data, "big")
+
+                if value == 0:
+                    x ^= (1 << bits) - 1
+
+                # clear bits before i
+                o = max(i - sb * sb_bits, 0)
+                x &= (1 << (bits - o)) - 1
+
+                if x != 0:
+                    return sb * sb_bits + bits - x.bit_length()
+
+            sb += 1
+
+            # jump over runs of empty or full superblocks without reading
+            while sb < n:
+                c = self._superblock_count(sb)
+
+                if value == 1 and c == 0:
+                    sb += 1
+                elif value == 0 and c == sb_bits:
+                    sb += 1
+                else:
+                    break
+
+        return None
+
+    def next_set(self, i: int) -> int:
+        """
+        First set bit at or after 0-based position i, or None.
+        """
+
+        return self._find(i, 1)
+
+    def next_clear(self, i: int) -> int:
+        """
+        First clear bit at or after 0-based position i, or None.
+        """
+
+        return self._find(i, 0)
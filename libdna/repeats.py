@@ -0,0 +1,251 @@
+import collections
+import heapq
+import re
+
+import gal
+
+# Bases read per chunk when scanning a chromosome
+DEFAULT_REPEAT_CHUNK_SIZE = 4194304
+
+DEFAULT_REPEAT_PERIODS = (1, 2, 3, 4, 5, 6)
+
+# Shortest repeat reported for each period
+DEFAULT_REPEAT_MIN_LENGTH = {1: 10, 2: 12, 3: 12, 4: 16, 5: 20, 6: 24}
+
+REPEAT_BASES = "ACGTN"
+
+# N never equals another base, including another N, once the codes it
+# is compared with have N mapped to a different value
+N_SHIFT_TABLE = bytes([0, 1, 2, 3, 5] + list(range(5, 256)))
+
+Repeat = collections.namedtuple(
+    "Repeat", ["chr", "start", "end", "period", "unit", "copies"]
+)
+
+
+def _min_length(min_length, period: int) -> int:
+    if isinstance(min_length, dict):
+        length = min_length.get(period, max(min_length.values()))
+    else:
+        length = min_length
+
+    # at least two copies of the unit
+    return max(length, 2 * period)
+
+
+def _primitive(unit: bytes) -> bool:
+    """
+    Returns True if a repeat unit is not itself a repeat of a shorter
+    unit, e.g. False for AA or ATAT.
+    """
+
+    p = len(unit)
+
+    for d in range(1, p):
+        if p % d == 0 and unit[d:] == unit[:-d]:
+            return False
+
+    return True
+
+
+class _PeriodScan:
+    """
+    Scan state for one period: the start and unit of a run of matching
+    bases that reached the end of the previous chunk.
+    """
+
+    def __init__(self, period: int, min_length: int):
+        self.period = period
+        self.min_length = min_length
+        # zero runs of the diff at least this long are repeats
+        self.pattern = re.compile(b"\\x00{%d,}" % max(min_length - period, 1))
+        self.open = None
+
+    def repeat(self, chr: str, start: int, end: int, unit: bytes) -> Repeat:
+        """
+        Returns the repeat for a run of matching comparisons [start, end)
+        in 0-based coordinates, or None if it does not qualify.
+        """
+
+        length = end - start + self.period
+
+        if length < self.min_length or not _primitive(unit):
+            return None
+
+        return Repeat(
+            chr,
+            start + 1,
+            start + length,
+            self.period,
+            "".join([REPEAT_BASES[c] for c in unit]),
+            length / self.period,
+        )
+
+    def scan(self, chr: str, codes: bytes, offset: int, first: int) -> list:
+        """
+        Find repeats in a buffer of codes starting at 0-based offset.
+        Comparisons before buffer index first were made with the
+        previous chunk.
+        """
+
+        p = self.period
+        n = len(codes) - p - first
+
+        if n <= 0:
+            return []
+
+        # zero bytes of the diff are positions whose base equals the
+        # base p further on
+        a = int.from_bytes(codes[first : first + n], "big")
+        b = int.from_bytes(
+            codes[first + p : first + p + n].translate(N_SHIFT_TABLE), "big"
+        )
+        diff = (a ^ b).to_bytes(n, "big")
+
+        g = offset + first
+
+        ret = []
+        pos = 0
+
+        if self.open is not None:
+            lead = n - len(diff.lstrip(b"\x00"))
+
+            if lead == n:
+                return ret
+
+            start, unit = self.open
+            self.open = None
+
+            r = self.repeat(chr, start, g + lead, unit)
+
+            if r is not None:
+                ret.append(r)
+
+            pos = lead
+
+        for match in self.pattern.finditer(diff, pos):
+            s = first + match.start()
+
+            if match.end() == n:
+                self.open = (g + match.start(), codes[s : s + p])
+            else:
+                r = self.repeat(
+                    chr, g + match.start(), g + match.end(), codes[s : s + p]
+                )
+
+                if r is not None:
+                    ret.append(r)
+
+        if self.open is None:
+            # a short run at the end may continue into the next chunk
+            tail = n - len(diff.rstrip(b"\x00"))
+
+            if 0 < tail and n - tail >= pos:
+                s = first + n - tail
+                self.open = (g + n - tail, codes[s : s + p])
+
+        return ret
+
+    def close(self, chr: str, end: int) -> list:
+        """
+        Finish an open run at the end of a chromosome, where end is the
+        index of the first comparison past the chromosome.
+        """
+
+        if self.open is None:
+            return []
+
+        start, unit = self.open
+        self.open = None
+
+        r = self.repeat(chr, start, end, unit)
+
+        return [r] if r is not None else []
+
+
+def find_repeats(
+    dna,
+    chrs: list = None,
+    periods=DEFAULT_REPEAT_PERIODS,
+    min_length=DEFAULT_REPEAT_MIN_LENGTH,
+    chunk_size: int = DEFAULT_REPEAT_CHUNK_SIZE,
+):
+    """
+    Stream homopolymers and short tandem repeats from a genome.
+
+    Each chromosome is read as numeric base codes in large chunks. For
+    each period p the codes are compared with the codes p bases further
+    on by XOR-ing them as big integers, so runs of zero bytes in the
+    result are runs of periodic sequence, which a regular expression
+    finds without a Python level loop over bases. Runs that reach the
+    end of a chunk are carried into the next one. N bases never match
+    so repeats stop at them.
+
+    Parameters
+    ----------
+    dna : DNA2Bit or DNA4Bit
+        Reader.
+    chrs : list, optional
+        Chromosomes to scan. Defaults to all in the manifest.
+    periods : tuple, optional
+        Repeat unit lengths to look for, from 1 to 6.
+    min_length : int or dict, optional
+        Shortest repeat reported, for all periods or per period.
+    chunk_size : int, optional
+        Bases read at a time.
+
+    Returns
+    -------
+    generator
+        Repeat(chr, start, end, period, unit, copies) with 1-based
+        coordinates, sorted by chromosome and start. A repeat is reported
+        at its shortest period only, e.g. AAAAAA is not also reported as
+        (AA)3.
+    """
+
+    if chrs is None:
+        chrs = dna.manifest.chrs
+
+    max_period = max(periods)
+
+    for chr in chrs:
+        length = dna.chr_length(chr)
+
+        scans = [_PeriodScan(p, _min_length(min_length, p)) for p in periods]
+
+        # repeats waiting to be released in sorted order
+        heap = []
+        tail = b""
+
+        for s in range(0, length, chunk_size):
+            e = min(s + chunk_size, length)
+
+            codes = tail + dna._read_codes(gal.genomic.Location(chr, s + 1, e))
+            offset = s - len(tail)
+
+            for scan in scans:
+                # comparisons up to the previous chunk's end were done
+                first = max(len(tail) - scan.period, 0)
+
+                for r in scan.scan(chr, codes, offset, first):
+                    heapq.heappush(heap, (r.start, r.period, r))
+
+            tail = bytes(codes[-max_period:])
+
+            # nothing found later can start before an open run or before
+            # the comparisons of the next chunk
+            bound = e - max_period + 1
+
+            for scan in scans:
+                if scan.open is not None:
+                    bound = min(bound, scan.open[0] + 1)
+
+            while len(heap) > 0 and heap[0][0] < bound:
+                yield heapq.heappop(heap)[2]
+
+        for scan in scans:
+            for r in scan.close(chr, length - scan.period):
+                heapq.heappush(heap, (r.start, r.period, r))
+
+        while len(heap) > 0:
+            yield heapq.heappop(heap)[2]
@@ -0,0 +1,490 @@
+"""
+Long running extraction server that keeps DNA readers and their caches
+warm between queries, and a thin client for it.
+
+Messages in both directions are a 4 byte big-endian length followed by
+a compact JSON object. Requests have an 'op' of 'dna', 'batch' or
+'stats':
+
+    {"op": "dna", "loc": ["chr1", 100, 200], "mask": "lower",
+     "rev_comp": false, "lowercase": false}
+    {"op": "batch", "locs": [["chr1", 100, 200], ...], ...}
+    {"op": "stats"}
+
+Responses contain either 'seq', 'seqs' or 'stats', or 'error' if the
+request failed.
+
+Run a server with
+
+    libdna serve --dir /path/to/2bit --socket /tmp/libdna.sock
+
+and query it with
+
+    libdna query --socket /tmp/libdna.sock chr1:100-200
+
+The same commands are available as python -m libdna.server.
+"""
+
+import argparse
+import json
+import os
+import socket
+import socketserver
+import stat
+import struct
+import sys
+import threading
+import gal
+
+from .cache import DNACache, DEFAULT_CACHE_BYTES
+from .decode import DNA, DNA4Bit, CachedDNA2Bit
+from .libdna import format_dna, parse_locations
+
+DEFAULT_SOCKET = "/tmp/libdna.sock"
+
+HEADER = struct.Struct(">I")
+
+
+def send_message(sock: socket.socket, message: dict):
+    """
+    Send a length prefixed JSON message.
+    """
+
+    data = json.dumps(message, separators=(",", ":")).encode("utf-8")
+
+    sock.sendall(HEADER.pack(len(data)) + data)
+
+
+def _recv_exactly(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+
+    while len(buf) < n:
+        data = sock.recv(n - len(buf))
+
+        if not data:
+            return None
+
+        buf.extend(data)
+
+    return bytes(buf)
+
+
+def recv_message(sock: socket.socket) -> dict:
+    """
+    Receive a length prefixed JSON message.
+
+    Returns
+    -------
+    dict
+        The message or None if the connection was closed.
+    """
+
+    header = _recv_exactly(sock, HEADER.size)
+
+    if header is None:
+        return None
+
+    data = _recv_exactly(sock, HEADER.unpack(header)[0])
+
+    if data is None:
+        return None
+
+    return json.loads(data)
+
+
+class _DNARequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        # a connection can carry any number of requests
+        while True:
+            request = recv_message(self.request)
+
+            if request is None:
+                break
+
+            try:
+                response = self.server.process(request)
+            except Exception as e:
+                response = {"error": str(e)}
+
+            send_message(self.request, response)
+
+
+def _remove_stale_socket(socket_path: str):
+    """
+    Remove a socket file left behind by a server that is no longer
+    running. Anything else at the path, including the socket of a live
+    server, is left alone and an error raised.
+    """
+
+    try:
+        mode = os.stat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(f"{socket_path} exists and is not a socket")
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except ConnectionRefusedError:
+            os.remove(socket_path)
+            return
+
+    raise OSError(f"a server is already listening on {socket_path}")
+
+
+class DNAServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Serves DNA queries over a Unix domain socket from a single reader
+    whose caches stay warm for the lifetime of the server.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, dna: DNA):
+        """
+        Parameters
+        ----------
+        socket_path : str
+            Path of the Unix domain socket to listen on. A stale socket
+            file at this path is removed, but if anything else is there,
+            or another server is listening on it, an error is raised.
+        dna : DNA
+            Reader to serve queries from.
+        """
+
+        _remove_stale_socket(socket_path)
+
+        self.__socket_path = socket_path
+        self.__dna = dna
+        # the shared reader and its cache are not thread safe, requests
+        # are otherwise handled concurrently
+        self.__lock = threading.Lock()
+
+        super().__init__(socket_path, _DNARequestHandler)
+
+    @property
+    def socket_path(self) -> str:
+        return self.__socket_path
+
+    @property
+    def dna(self) -> DNA:
+        return self.__dna
+
+    def _dna(self, locs, request: dict) -> list:
+        locs = [gal.genomic.Location(loc[0], int(loc[1]), int(loc[2])) for loc in locs]
+        mask = request.get("mask", "lower")
+        rev_comp = request.get("rev_comp", False)
+        lowercase = request.get("lowercase", False)
+
+        with self.__lock:
+            return [
+                self.__dna.dna(loc, mask=mask, rev_comp=rev_comp, lowercase=lowercase)
+                for loc in locs
+            ]
+
+    def process(self, request: dict) -> dict:
+        """
+        Process a single request.
+
+        Parameters
+        ----------
+        request : dict
+            Decoded request message.
+
+        Returns
+        -------
+        dict
+            Response message.
+        """
+
+        op = request.get("op")
+
+        if op == "dna":
+            return {"seq": self._dna([request["loc"]], request)[0]}
+        elif op == "batch":
+            return {"seqs": self._dna(request["locs"], request)}
+        elif op == "stats":
+            if isinstance(self.__dna, DNACache):
+                with self.__lock:
+                    return {"stats": self.__dna.stats()}
+            else:
+                return {"stats": {}}
+        else:
+            return {"error": f"unknown op {op}"}
+
+    def server_close(self):
+        super().server_close()
+
+        if os.path.exists(self.__socket_path):
+            os.remove(self.__socket_path)
+
+
+def create_server(
+    dir: str,
+    socket_path: str = DEFAULT_SOCKET,
+    format: str = "2bit",
+    cache_bytes: int = DEFAULT_CACHE_BYTES,
+) -> DNAServer:
+    """
+    Create a server for a genome directory with a chromosome cached
+    reader and a decoded region cache in front of it.
+
+    Parameters
+    ----------
+    dir : str
+        Directory of encoded chromosomes.
+    socket_path : str, optional
+        Unix domain socket to listen on.
+    format : str, optional
+        Either '2bit' or '4bit'.
+    cache_bytes : int, optional
+        Size of the decoded region cache.
+
+    Returns
+    -------
+    DNAServer
+        Server ready to serve_forever().
+    """
+
+    if format == "4bit":
+        dna = DNA4Bit(dir)
+    else:
+        dna = CachedDNA2Bit(dir)
+
+    return DNAServer(socket_path, DNACache(dna, max_bytes=cache_bytes))
+
+
+class DNAClient(DNA):
+    """
+    Client for a DNAServer. A single connection is kept open and reused
+    for every request.
+    """
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET):
+        self.__socket_path = socket_path
+        self.__sock = None
+
+    @property
+    def socket_path(self) -> str:
+        return self.__socket_path
+
+    def _request(self, request: dict) -> dict:
+        if self.__sock is None:
+            self.__sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.__sock.connect(self.__socket_path)
+
+        send_message(self.__sock, request)
+
+        response = recv_message(self.__sock)
+
+        if response is None:
+            self.close()
+            raise ConnectionError(f"{self.__socket_path} closed the connection")
+
+        if "error" in response:
+            raise ValueError(response["error"])
+
+        return response
+
+    def dna(
+        self, loc: gal.genomic.Location, mask="lower", rev_comp=False, lowercase=False
+    ):
+        """
+        Returns the DNA for a location from the server.
+
+        Parameters
+        ----------
+        loc : gal.genomic.Location
+            Genomic Location
+        mask : str, optional
+            Indicate whether masked bases should be represented as is
+            ('upper'), lowercase ('lower'), or as N ('n')
+        rev_comp : bool, optional
+            Whether to reverse complement the sequence.
+        lowercase : bool, optional
+            Indicates whether sequence should be displayed as upper or
+            lowercase.
+
+        Returns
+        -------
+        str
+            DNA sequence.
+        """
+
+        return self._request(
+            {
+                "op": "dna",
+                "loc": [loc.chr, loc.start, loc.end],
+                "mask": mask,
+                "rev_comp": rev_comp,
+                "lowercase": lowercase,
+            }
+        )["seq"]
+
+    def dna_batch(self, locs, mask="lower", rev_comp=False, lowercase=False):
+        """
+        Returns the DNA for many locations in a single request.
+
+        Parameters
+        ----------
+        locs : list
+            List of gal.genomic.Location.
+
+        Returns
+        -------
+        list
+            DNA sequences in the same order as locs.
+        """
+
+        return self._request(
+            {
+                "op": "batch",
+                "locs": [[loc.chr, loc.start, loc.end] for loc in locs],
+                "mask": mask,
+                "rev_comp": rev_comp,
+                "lowercase": lowercase,
+            }
+        )["seqs"]
+
+    def stats(self) -> dict:
+        return self._request({"op": "stats"})["stats"]
+
+    def close(self):
+        if self.__sock is not None:
+            self.__sock.close()
+            self.__sock = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def serve(
+    dir: str,
+    socket_path: str = DEFAULT_SOCKET,
+    format: str = "2bit",
+    cache_bytes: int = DEFAULT_CACHE_BYTES,
+):
+    """
+    Run a server until interrupted. See create_server.
+    """
+
+    server = create_server(dir, socket_path, format=format, cache_bytes=cache_bytes)
+
+    print(f"Listening on {socket_path}...", file=sys.stderr)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def query(
+    locs: list,
+    socket_path: str = DEFAULT_SOCKET,
+    out=None,
+    mask: str = "lower",
+    rev_comp: bool = False,
+    stats: bool = False,
+):
+    """
+    Query a running server and write the sequences as FASTA.
+
+    Parameters
+    ----------
+    locs : list
+        Location strings, e.g. chr1:100-200.
+    socket_path : str, optional
+        Socket the server listens on.
+    out : file, optional
+        Where to write sequences. Defaults to stdout.
+    mask : str, optional
+        Either 'upper', 'lower' or 'n'.
+    rev_comp : bool, optional
+        Whether to reverse complement the sequences.
+    stats : bool, optional
+        Write the server's cache statistics as JSON first.
+    """
+
+    if out is None:
+        out = sys.stdout
+
+    parsed = parse_locations(locs)
+
+    if len(parsed.bad) > 0:
+        raise ValueError(f"{locs[parsed.bad[0]]} is not a valid location")
+
+    locs = [
+        gal.genomic.Location(chr, start, end)
+        for chr, start, end in zip(parsed.chrs, parsed.starts, parsed.ends)
+    ]
+
+    with DNAClient(socket_path) as client:
+        if stats:
+            print(json.dumps(client.stats()), file=out)
+
+        if len(locs) > 0:
+            seqs = client.dna_batch(locs, mask=mask, rev_comp=rev_comp)
+
+            for loc, seq in zip(locs, seqs):
+                print(f">{loc}", file=out)
+                print(format_dna(seq), end="", file=out)
+
+
+def add_arguments(commands):
+    """
+    Add the serve and query commands to a set of argparse subparsers.
+    """
+
+    serve = commands.add_parser("serve", help="run an extraction server")
+    serve.add_argument("--dir", required=True, help="genome directory")
+    serve.add_argument("--socket", default=DEFAULT_SOCKET, help="socket path")
+    serve.add_argument("--format", choices=["2bit", "4bit"], default="2bit")
+    serve.add_argument(
+        "--cache-bytes", type=int, default=DEFAULT_CACHE_BYTES, help="cache size"
+    )
+
+    query = commands.add_parser("query", help="query a running extraction server")
+    query.add_argument("locs", nargs="*", help="locations, e.g. chr1:100-200")
+    query.add_argument("--socket", default=DEFAULT_SOCKET, help="socket path")
+    query.add_argument("--mask", choices=["upper", "lower", "n"], default="lower")
+    query.add_argument("--rev-comp", action="store_true")
+    query.add_argument("--stats", action="store_true", help="print cache stats")
+
+
+def run(args):
+    """
+    Run a serve or query command parsed with add_arguments.
+    """
+
+    if args.command == "serve":
+        serve(args.dir, args.socket, format=args.format, cache_bytes=args.cache_bytes)
+    else:
+        query(
+            args.locs,
+            args.socket,
+            mask=args.mask,
+            rev_comp=args.rev_comp,
+            stats=args.stats,
+        )
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m libdna.server", description="libdna extraction server"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add_arguments(commands)
+
+    run(parser.parse_args(args))
+
+
+if __name__ == "__main__":
+    main()
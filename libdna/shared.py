@@ -0,0 +1,255 @@
+import hashlib
+import os
+import struct
+import sys
+import threading
+from multiprocessing import resource_tracker, shared_memory
+
+from .decode import DNA2Bit
+
+# Each segment starts with the size of the file it holds since segments
+# may be rounded up to a whole number of pages
+SEGMENT_HEADER = struct.Struct("<Q")
+
+SHARED_FILE_SUFFIXES = (".dna.2bit", ".n.1bit", ".mask.1bit")
+
+
+def shared_prefix(dir: str) -> str:
+    """
+    Default prefix for the shared memory segments of a genome directory
+    so that different genomes do not collide.
+    """
+
+    h = hashlib.md5(os.path.abspath(dir).encode("utf-8")).hexdigest()[0:8]
+
+    return f"libdna_{h}"
+
+
+def segment_name(prefix: str, file: str) -> str:
+    return f"{prefix}_{file.lower()}"
+
+
+# Serializes patching resource_tracker.register before Python 3.13
+_ATTACH_LOCK = threading.Lock()
+
+
+def _attach(name: str):
+    """
+    Attach to an existing segment without registering it with the
+    resource tracker, which would otherwise unlink it when this process
+    exits even though other processes are still using it.
+    """
+
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+
+    # Unregistering after attaching is not enough: forked workers share
+    # the owner's tracker so this would drop the owner's registration.
+    # Only this segment is skipped so other threads registering their
+    # own resources while it is patched are unaffected.
+    with _ATTACH_LOCK:
+        register = resource_tracker.register
+
+        def _register(n, rtype):
+            if rtype != "shared_memory" or n.lstrip("/") != name:
+                register(n, rtype)
+
+        resource_tracker.register = _register
+
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+class SharedGenome:
+    """
+    Loads the packed files of a DNA2Bit genome directory into shared
+    memory segments once so that any number of worker processes can
+    read them through SharedDNA2Bit without holding their own copy.
+
+    The process that creates a SharedGenome owns the segments and must
+    call unlink(), or use it as a context manager, to free them.
+    """
+
+    def __init__(self, dir: str, chrs=None, prefix: str = None):
+        """
+        Parameters
+        ----------
+        dir : str
+            Genome directory.
+        chrs : list, optional
+            Chromosomes to load. All chromosomes are loaded by default.
+        prefix : str, optional
+            Segment name prefix. Defaults to shared_prefix(dir).
+        """
+
+        self.__dir = dir
+        self.__prefix = prefix if prefix is not None else shared_prefix(dir)
+        # file -> SharedMemory
+        self.__segments = {}
+
+        if chrs is not None:
+            chrs = set([chr.lower() for chr in chrs])
+
+        for file in sorted(os.listdir(dir)):
+            name = file.lower()
+
+            if not name.endswith(SHARED_FILE_SUFFIXES):
+                continue
+
+            if chrs is not None and name.split(".")[0] not in chrs:
+                continue
+
+            self._load(file)
+
+    @property
+    def dir(self) -> str:
+        return self.__dir
+
+    @property
+    def prefix(self) -> str:
+        return self.__prefix
+
+    @property
+    def files(self) -> list:
+        return sorted(self.__segments)
+
+    @property
+    def size(self) -> int:
+        """
+        Total number of bytes held in shared memory.
+        """
+
+        return sum([shm.size for shm in self.__segments.values()])
+
+    def _load(self, file: str):
+        path = os.path.join(self.__dir, file)
+        size = os.path.getsize(path)
+
+        shm = shared_memory.SharedMemory(
+            name=segment_name(self.__prefix, file),
+            create=True,
+            size=SEGMENT_HEADER.size + max(size, 1),
+        )
+
+        SEGMENT_HEADER.pack_into(shm.buf, 0, size)
+
+        with open(path, "rb") as f:
+            f.readinto(shm.buf[SEGMENT_HEADER.size : SEGMENT_HEADER.size + size])
+
+        self.__segments[file.lower()] = shm
+
+    def reader(self) -> "SharedDNA2Bit":
+        """
+        Returns a reader attached to this genome.
+        """
+
+        return SharedDNA2Bit(self.__dir, prefix=self.__prefix)
+
+    def close(self):
+        """
+        Close this process's handles to the segments.
+        """
+
+        for shm in self.__segments.values():
+            shm.close()
+
+    def unlink(self):
+        """
+        Close and free the segments. Readers in other processes must not
+        be used afterwards.
+        """
+
+        for shm in self.__segments.values():
+            shm.close()
+            shm.unlink()
+
+        self.__segments.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.unlink()
+
+
+class SharedDNA2Bit(DNA2Bit):
+    """
+    DNA2Bit reader that decodes from shared memory segments created by
+    a SharedGenome, attaching to them by name on first use. Files
+    without a segment are read from disk.
+    """
+
+    def __init__(self, dir: str, prefix: str = None):
+        super().__init__(dir)
+
+        self.__prefix = prefix if prefix is not None else shared_prefix(dir)
+        # file -> (SharedMemory, size)
+        self.__segments = {}
+
+    @property
+    def prefix(self) -> str:
+        return self.__prefix
+
+    def _segment(self, file: str):
+        """
+        Returns the (SharedMemory, size) of a file's segment, or None if
+        there is none yet. Misses are not cached so a segment created
+        after the reader is picked up on a later read.
+        """
+
+        file = file.lower()
+
+        if file not in self.__segments:
+            try:
+                shm = _attach(segment_name(self.__prefix, file))
+            except FileNotFoundError:
+                return None
+
+            size = SEGMENT_HEADER.unpack_from(shm.buf, 0)[0]
+            self.__segments[file] = (shm, size)
+
+        return self.__segments[file]
+
+    def read_data(self, file: str, seek: int, n: int) -> bytes:
+        """
+        Reads data from a shared memory segment.
+
+        Parameter
+        ---------
+        file : str
+            Relative path to file
+        seek : int
+            Start offset in bytes
+        n : int
+            Amount of data to read in bytes
+
+        Returns
+        -------
+        bytes
+            Data from the segment
+        """
+
+        segment = self._segment(file)
+
+        if segment is None:
+            return super().read_data(file, seek, n)
+
+        shm, size = segment
+
+        s = SEGMENT_HEADER.size + min(seek, size)
+        e = SEGMENT_HEADER.size + min(seek + n, size)
+
+        # only the requested span is copied out of shared memory
+        return bytes(shm.buf[s:e])
+
+    def close(self):
+        """
+        Detach from all segments.
+        """
+
+        for shm, size in self.__segments.values():
+            shm.close()
+
+        self.__segments.clear()
@@ -0,0 +1,109 @@
+import gal
+
+from .libdna import location_blocks
+
+# Largest span read in one go when joining exons
+DEFAULT_SPLICED_BLOCK_SIZE = 1000000
+
+
+def exon_list(exons) -> list:
+    """
+    Returns the exons of a record sorted by position.
+
+    Parameters
+    ----------
+    exons : gal.genomic.Location or list
+        A location or a list of exon locations on one chromosome.
+
+    Returns
+    -------
+    list
+        Exon locations sorted by start.
+    """
+
+    if isinstance(exons, gal.genomic.Location):
+        return [exons]
+
+    exons = sorted(exons, key=lambda loc: loc.start)
+
+    if len(exons) == 0:
+        raise ValueError("a record must have at least one exon")
+
+    chr = exons[0].chr
+
+    for loc in exons:
+        if loc.chr != chr:
+            raise ValueError(f"{loc} is not on {chr}")
+
+    return exons
+
+
+def per_record(value, n: int, name: str) -> list:
+    """
+    Expand a parameter given for all records, or as a list with one
+    entry per record, into a list.
+    """
+
+    if isinstance(value, (list, tuple)):
+        if len(value) != n:
+            raise ValueError(f"{name} must have one entry per record")
+
+        return list(value)
+
+    return [value] * n
+
+
+def read_spliced(
+    read, records: list, block_size: int = DEFAULT_SPLICED_BLOCK_SIZE, join=None
+) -> list:
+    """
+    Read and join the exons of many records. Records are sorted by
+    position and nearby records are served by a single read over their
+    combined span of up to block_size bases. A record longer than
+    block_size has each exon read separately.
+
+    Parameters
+    ----------
+    read : function
+        read(loc) returning a sliceable sequence with one entry per base,
+        e.g. a bytearray or a PackedSeq.
+    records : list
+        Sorted exon lists from exon_list().
+    block_size : int, optional
+        Maximum span of a single read.
+    join : function, optional
+        Joins a list of the slices read. Defaults to bytearray().join.
+
+    Returns
+    -------
+    list
+        The joined exons of each record, in the same order as records.
+    """
+
+    if join is None:
+        join = bytearray().join
+
+    ret = [None] * len(records)
+
+    for block, members in location_blocks(
+        [exons[0].chr for exons in records],
+        [exons[0].start for exons in records],
+        [max([loc.end for loc in exons]) for exons in records],
+        block_size,
+    ):
+        if block.length > block_size:
+            # a single long record
+            ret[members[0]] = join([read(loc) for loc in records[members[0]]])
+            continue
+
+        seq = read(block)
+
+        for k in members:
+            ret[k] = join(
+                [
+                    seq[loc.start - block.start : loc.end - block.start + 1]
+                    for loc in records[k]
+                ]
+            )
+
+    return ret
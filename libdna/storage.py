@@ -0,0 +1,615 @@
+from abc import ABC, abstractmethod
+import collections
+import hashlib
+import http.client
+import json
+import os
+import threading
+import urllib.parse
+
+from .manifest import MANIFEST_FILE, GenomeManifest
+
+# Bytes per block fetched from remote storage
+DEFAULT_STORAGE_BLOCK_SIZE = 65536
+
+DEFAULT_MEMORY_CACHE_SIZE = 268435456
+
+DEFAULT_DISK_CACHE_SIZE = 4294967296
+
+# Smallest and largest read-ahead windows in bytes
+DEFAULT_READ_AHEAD_MIN = 65536
+DEFAULT_READ_AHEAD_MAX = 16777216
+
+# Number of attempts per request, e.g. if a kept alive connection was
+# closed by the server
+HTTP_RETRIES = 2
+
+
+class Storage(ABC):
+    """
+    Where the files of a genome directory are read from. Readers resolve
+    a file to a path with their manifest and then read byte spans of it
+    through their storage.
+    """
+
+    @abstractmethod
+    def manifest(self) -> GenomeManifest:
+        """
+        Load the manifest of the genome directory.
+        """
+
+        raise NotImplementedError
+
+    @abstractmethod
+    def read(self, path: str, seek: int, n: int) -> bytes:
+        """
+        Read up to n bytes at offset seek of a file. Fewer bytes are
+        returned at the end of the file.
+        """
+
+        raise NotImplementedError
+
+    def prefetch(self, path: str, ranges: list):
+        """
+        Hint that the (seek, n) byte ranges of a file are about to be
+        read so that they can be fetched together.
+        """
+
+        pass
+
+
+class LocalStorage(Storage):
+    """
+    Files in a local directory.
+    """
+
+    def __init__(self, dir: str):
+        self.__dir = dir
+
+    @property
+    def dir(self) -> str:
+        return self.__dir
+
+    def manifest(self) -> GenomeManifest:
+        return GenomeManifest.open(self.__dir)
+
+    def read(self, path: str, seek: int, n: int) -> bytes:
+        with open(path, "rb") as f:
+            f.seek(seek)
+            return f.read(n)
+
+    def prefetch(self, path: str, ranges: list):
+        if not hasattr(os, "posix_fadvise"):
+            return
+
+        fd = os.open(path, os.O_RDONLY)
+
+        try:
+            # ask the kernel to start reading the pages in the background
+            for seek, n in ranges:
+                if seek >= 0 and n > 0:
+                    os.posix_fadvise(fd, seek, n, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+
+
+class ReadAheadStorage(Storage):
+    """
+    Wraps a storage to detect sequential reads of each file, e.g. sliding
+    windows or a sorted BED file, and serve them from a buffer filled by
+    reads of a growing window ahead of the cursor. The window doubles on
+    each sequential refill up to max_window and shrinks back when a read
+    jumps backwards or far ahead, so random access costs no more than
+    before.
+    """
+
+    def __init__(
+        self,
+        storage: Storage,
+        min_window: int = DEFAULT_READ_AHEAD_MIN,
+        max_window: int = DEFAULT_READ_AHEAD_MAX,
+    ):
+        """
+        Parameters
+        ----------
+        storage : Storage
+            Storage to read from.
+        min_window : int, optional
+            Bytes read ahead once sequential access is detected.
+        max_window : int, optional
+            Largest number of bytes read ahead.
+        """
+
+        self.__storage = storage
+        self.__min_window = min_window
+        self.__max_window = max_window
+        self.__lock = threading.Lock()
+        # path -> [buffer offset, buffer, last seek, end of last read, window]
+        self.__files = {}
+        self.__hits = 0
+        self.__misses = 0
+
+    @property
+    def storage(self) -> Storage:
+        return self.__storage
+
+    @property
+    def hits(self) -> int:
+        """
+        Number of reads served from a read-ahead buffer.
+        """
+
+        return self.__hits
+
+    @property
+    def misses(self) -> int:
+        """
+        Number of reads passed to the wrapped storage.
+        """
+
+        return self.__misses
+
+    def manifest(self) -> GenomeManifest:
+        return self.__storage.manifest()
+
+    def prefetch(self, path: str, ranges: list):
+        self.__storage.prefetch(path, ranges)
+
+    def read(self, path: str, seek: int, n: int) -> bytes:
+        with self.__lock:
+            state = self.__files.get(path)
+
+            if state is None:
+                state = [0, b"", -1, -1, self.__min_window // 2]
+                self.__files[path] = state
+
+            offset, buf, last_seek, last_end, window = state
+
+            # reads of neighbouring regions may share a boundary byte so
+            # any read starting at or after the previous one counts
+            sequential = last_seek <= seek <= last_end + window
+
+            state[2] = seek
+            state[3] = seek + n
+
+            if seek >= offset and seek + n <= offset + len(buf):
+                self.__hits += 1
+                s = seek - offset
+                return buf[s : s + n]
+
+            self.__misses += 1
+
+        if sequential:
+            window = min(window * 2, self.__max_window)
+            data = self.__storage.read(path, seek, max(n, window))
+        else:
+            window = self.__min_window // 2
+            data = self.__storage.read(path, seek, n)
+
+        with self.__lock:
+            state[4] = window
+
+            if sequential:
+                state[0] = seek
+                state[1] = data
+
+        return data[:n]
+
+
+class BlockCache:
+    """
+    Two level LRU cache of blocks: an in memory level bounded by
+    max_bytes and an optional on disk level in a directory, bounded by
+    max_disk_bytes, that survives between processes.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_MEMORY_CACHE_SIZE,
+        dir: str = None,
+        max_disk_bytes: int = DEFAULT_DISK_CACHE_SIZE,
+    ):
+        """
+        Parameters
+        ----------
+        max_bytes : int, optional
+            Maximum bytes held in memory.
+        dir : str, optional
+            Directory of the disk cache. There is no disk level if not
+            given.
+        max_disk_bytes : int, optional
+            Maximum bytes held on disk.
+        """
+
+        self.__max_bytes = max_bytes
+        self.__dir = dir
+        self.__max_disk_bytes = max_disk_bytes
+        self.__lock = threading.Lock()
+        # key -> block
+        self.__blocks = collections.OrderedDict()
+        self.__bytes = 0
+        # disk file name -> size, oldest first
+        self.__files = collections.OrderedDict()
+        self.__disk_bytes = 0
+
+        if dir is not None:
+            os.makedirs(dir, exist_ok=True)
+
+            entries = [e for e in os.scandir(dir) if not e.name.endswith(".tmp")]
+
+            for e in sorted(entries, key=lambda e: e.stat().st_mtime):
+                size = e.stat().st_size
+                self.__files[e.name] = size
+                self.__disk_bytes += size
+
+    @property
+    def size(self) -> int:
+        """
+        Bytes held in memory.
+        """
+
+        return self.__bytes
+
+    @property
+    def disk_size(self) -> int:
+        """
+        Bytes held on disk.
+        """
+
+        return self.__disk_bytes
+
+    @staticmethod
+    def _file(key: str) -> str:
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> bytes:
+        """
+        Returns a block or None if it is not cached.
+        """
+
+        with self.__lock:
+            if key in self.__blocks:
+                self.__blocks.move_to_end(key)
+                return self.__blocks[key]
+
+            if self.__dir is None:
+                return None
+
+            name = BlockCache._file(key)
+
+            if name not in self.__files:
+                return None
+
+            self.__files.move_to_end(name)
+
+        path = os.path.join(self.__dir, name)
+
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+
+            # record the access for the next process
+            os.utime(path)
+        except FileNotFoundError:
+            # evicted by another process
+            with self.__lock:
+                self.__disk_bytes -= self.__files.pop(name, 0)
+
+            return None
+
+        self._put_memory(key, data)
+
+        return data
+
+    def put(self, key: str, data: bytes):
+        """
+        Add a block to the cache.
+        """
+
+        self._put_memory(key, data)
+
+        if self.__dir is None:
+            return
+
+        name = BlockCache._file(key)
+        path = os.path.join(self.__dir, name)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+        with open(tmp, "wb") as f:
+            f.write(data)
+
+        os.replace(tmp, path)
+
+        evict = []
+
+        with self.__lock:
+            self.__disk_bytes += len(data) - self.__files.pop(name, 0)
+            self.__files[name] = len(data)
+
+            while self.__disk_bytes > self.__max_disk_bytes and len(self.__files) > 1:
+                old, size = self.__files.popitem(last=False)
+                self.__disk_bytes -= size
+                evict.append(old)
+
+        for old in evict:
+            try:
+                os.remove(os.path.join(self.__dir, old))
+            except FileNotFoundError:
+                pass
+
+    def _put_memory(self, key: str, data: bytes):
+        with self.__lock:
+            if key in self.__blocks:
+                self.__bytes -= len(self.__blocks.pop(key))
+
+            self.__blocks[key] = data
+            self.__bytes += len(data)
+
+            while self.__bytes > self.__max_bytes and len(self.__blocks) > 1:
+                old, block = self.__blocks.popitem(last=False)
+                self.__bytes -= len(block)
+
+    def clear(self):
+        """
+        Empty the in memory level.
+        """
+
+        with self.__lock:
+            self.__blocks.clear()
+            self.__bytes = 0
+
+
+class HTTPStorage(Storage):
+    """
+    Genome directory served over HTTP(S), e.g. from object storage.
+    Files are fetched in fixed size aligned blocks with range requests
+    and kept in a BlockCache so repeated and nearby queries do not pay
+    a round trip. Runs of adjacent missing blocks are fetched with a
+    single request.
+
+    The directory must contain a manifest.json, created by the encoders
+    or by build_manifest, since it cannot be listed.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        block_size: int = DEFAULT_STORAGE_BLOCK_SIZE,
+        cache: BlockCache = None,
+        cache_dir: str = None,
+        timeout: float = 60,
+    ):
+        """
+        Parameters
+        ----------
+        url : str
+            URL of the genome directory.
+        block_size : int, optional
+            Bytes per block.
+        cache : BlockCache, optional
+            Cache to use, e.g. shared between readers.
+        cache_dir : str, optional
+            Directory for an on disk cache if cache is not given.
+        timeout : float, optional
+            Socket timeout in seconds.
+        """
+
+        self.__url = url.rstrip("/")
+        self.__block_size = block_size
+        self.__cache = cache if cache is not None else BlockCache(dir=cache_dir)
+        self.__timeout = timeout
+        # one kept alive connection per thread
+        self.__local = threading.local()
+        self.__requests = 0
+        self.__lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return self.__url
+
+    @property
+    def block_size(self) -> int:
+        return self.__block_size
+
+    @property
+    def cache(self) -> BlockCache:
+        return self.__cache
+
+    @property
+    def requests(self) -> int:
+        """
+        Number of HTTP requests made.
+        """
+
+        return self.__requests
+
+    def _connection(self, parts) -> http.client.HTTPConnection:
+        conns = getattr(self.__local, "conns", None)
+
+        if conns is None:
+            conns = {}
+            self.__local.conns = conns
+
+        key = (parts.scheme, parts.netloc)
+
+        if key not in conns:
+            if parts.scheme == "https":
+                conns[key] = http.client.HTTPSConnection(
+                    parts.netloc, timeout=self.__timeout
+                )
+            else:
+                conns[key] = http.client.HTTPConnection(
+                    parts.netloc, timeout=self.__timeout
+                )
+
+        return conns[key]
+
+    def _get(self, url: str, start: int = None, end: int = None) -> bytes:
+        """
+        GET a URL, or the inclusive byte range [start, end] of it.
+
+        Returns
+        -------
+        bytes
+            Response body or None if the file does not exist.
+        """
+
+        parts = urllib.parse.urlsplit(url)
+        target = parts.path + (f"?{parts.query}" if parts.query else "")
+
+        headers = {}
+
+        if start is not None:
+            headers["Range"] = f"bytes={start}-{end}"
+
+        for attempt in range(HTTP_RETRIES):
+            conn = self._connection(parts)
+
+            try:
+                conn.request("GET", target, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                conn.close()
+
+                if attempt == HTTP_RETRIES - 1:
+                    raise
+
+        with self.__lock:
+            self.__requests += 1
+
+        if response.status == 404:
+            return None
+
+        if response.status == 416:
+            # range starts past the end of the file
+            return b""
+
+        if response.status == 200:
+            # the server ignored the range
+            if start is not None:
+                data = data[start : end + 1]
+        elif response.status != 206:
+            raise IOError(f"{url} returned {response.status} {response.reason}")
+
+        return data
+
+    def manifest(self) -> GenomeManifest:
+        data = self._get(f"{self.__url}/{MANIFEST_FILE}")
+
+        data = json.loads(data) if data is not None else {}
+
+        return GenomeManifest(
+            self.__url, data.get("chrs"), data.get("sources"), scan=False
+        )
+
+    def _key(self, path: str, block: int) -> str:
+        return f"{path}:{self.__block_size}:{block}"
+
+    def _fetch(self, path: str, blocks: list) -> dict:
+        """
+        Fetch blocks of a file not in the cache, merging runs of
+        adjacent blocks into one request.
+
+        Returns
+        -------
+        dict
+            Map of block index to block for the fetched blocks.
+        """
+
+        ret = {}
+
+        missing = [
+            b for b in sorted(set(blocks)) if self.__cache.get(self._key(path, b)) is None
+        ]
+
+        i = 0
+
+        while i < len(missing):
+            j = i + 1
+
+            while j < len(missing) and missing[j] == missing[j - 1] + 1:
+                j += 1
+
+            first = missing[i]
+            last = missing[j - 1]
+
+            data = self._get(
+                path,
+                first * self.__block_size,
+                (last + 1) * self.__block_size - 1,
+            )
+
+            if data is None:
+                data = b""
+
+            for b in range(first, last + 1):
+                s = (b - first) * self.__block_size
+                block = data[s : s + self.__block_size]
+                ret[b] = block
+                self.__cache.put(self._key(path, b), block)
+
+            i = j
+
+        return ret
+
+    def prefetch(self, path: str, ranges: list):
+        blocks = []
+
+        for seek, n in ranges:
+            if seek >= 0 and n > 0:
+                blocks.extend(
+                    range(
+                        seek // self.__block_size,
+                        (seek + n - 1) // self.__block_size + 1,
+                    )
+                )
+
+        self._fetch(path, blocks)
+
+    def read(self, path: str, seek: int, n: int) -> bytes:
+        if n <= 0:
+            return b""
+
+        first = seek // self.__block_size
+        last = (seek + n - 1) // self.__block_size
+
+        # blocks fetched now are used directly in case the cache is too
+        # small to hold them all
+        fetched = self._fetch(path, range(first, last + 1))
+
+        data = []
+
+        for b in range(first, last + 1):
+            block = fetched.get(b)
+
+            if block is None:
+                block = self.__cache.get(self._key(path, b))
+
+                if block is None:
+                    block = self._fetch(path, [b])[b]
+
+            data.append(block)
+
+            if len(block) < self.__block_size:
+                # end of file
+                break
+
+        data = b"".join(data)
+
+        s = seek - first * self.__block_size
+
+        return data[s : s + n]
+
+
+def open_storage(dir: str) -> Storage:
+    """
+    Returns the storage for a genome directory: HTTPStorage for http://
+    and https:// URLs and LocalStorage otherwise.
+    """
+
+    if dir.startswith(("http://", "https://")):
+        return HTTPStorage(dir)
+    else:
+        return LocalStorage(dir)
@@ -0,0 +1,155 @@
+from .libdna import location_blocks
+from .util import np, require_numpy
+
+if np is not None:
+    # complement of each base code, N stays as N
+    DNA_CODE_COMP = np.array([3, 2, 1, 0, 4], dtype=np.uint8)
+
+    # rows are the one-hot vectors of codes 0-4, N is all zeros
+    ONE_HOT_TABLE = np.eye(5, 4, dtype=np.float32)
+
+# Largest span of sequence read in one go when filling a batch
+DEFAULT_TENSOR_BLOCK_SIZE = 1000000
+
+
+def _rev_comp_flags(rev_comp, n: int) -> list:
+    if isinstance(rev_comp, bool):
+        return [rev_comp] * n
+
+    rev_comp = list(rev_comp)
+
+    if len(rev_comp) != n:
+        raise ValueError("rev_comp must have one entry per location")
+
+    return rev_comp
+
+
+def _interval_length(locs: list) -> int:
+    if len(locs) == 0:
+        return 0
+
+    length = locs[0].length
+
+    for loc in locs:
+        if loc.length != length:
+            raise ValueError(f"{loc} is not {length} bases long")
+
+    return length
+
+
+def dna_codes(
+    dna,
+    locs,
+    out=None,
+    rev_comp=False,
+    block_size: int = DEFAULT_TENSOR_BLOCK_SIZE,
+):
+    """
+    Fill a uint8 array with the base codes (A=0, C=1, G=2, T=3, N=4) of
+    a list of equal length locations, decoding straight from the packed
+    codes. Nearby locations are served from a single read of up to
+    block_size bases.
+
+    Parameters
+    ----------
+    dna : DNA2Bit or DNA4Bit
+        Reader.
+    locs : list
+        List of gal.genomic.Location of equal length.
+    out : numpy.ndarray, optional
+        Preallocated (batch, length) uint8 array to write into.
+    rev_comp : bool or list, optional
+        Reverse complement all locations, or those flagged in a list with
+        one entry per location, e.g. for random strand augmentation.
+    block_size : int, optional
+        Maximum span of a single read.
+
+    Returns
+    -------
+    numpy.ndarray
+        (batch, length) array of codes.
+    """
+
+    require_numpy("array output")
+
+    locs = list(locs)
+    n = len(locs)
+    length = _interval_length(locs)
+    rev_comp = _rev_comp_flags(rev_comp, n)
+
+    if out is None:
+        out = np.empty((n, length), dtype=np.uint8)
+    elif out.shape != (n, length):
+        raise ValueError(f"out must have shape {(n, length)}")
+
+    for block, members in location_blocks(
+        [loc.chr for loc in locs],
+        [loc.start for loc in locs],
+        [loc.end for loc in locs],
+        block_size,
+    ):
+        # reads past the end of a chromosome return the padding as A
+        dna._check_bounds(block)
+        codes = np.frombuffer(dna._read_codes(block), dtype=np.uint8)
+
+        for k in members:
+            s = locs[k].start - block.start
+            c = codes[s : s + length]
+
+            if rev_comp[k]:
+                # complement is 3 - code, N stays as 4
+                out[k] = DNA_CODE_COMP[c[::-1]]
+            else:
+                out[k] = c
+
+    return out
+
+
+def one_hot(
+    dna,
+    locs,
+    out=None,
+    rev_comp=False,
+    dtype=None,
+    block_size: int = DEFAULT_TENSOR_BLOCK_SIZE,
+):
+    """
+    Fill a (batch, length, 4) one-hot array, channels ordered A, C, G, T,
+    for a list of equal length locations. N is encoded as all zeros.
+
+    Parameters
+    ----------
+    dna : DNA2Bit or DNA4Bit
+        Reader.
+    locs : list
+        List of gal.genomic.Location of equal length.
+    out : numpy.ndarray, optional
+        Preallocated (batch, length, 4) array to write into.
+    rev_comp : bool or list, optional
+        Reverse complement all locations, or those flagged in a list with
+        one entry per location.
+    dtype : numpy.dtype, optional
+        Type of a newly allocated array. Default is float32.
+    block_size : int, optional
+        Maximum span of a single read.
+
+    Returns
+    -------
+    numpy.ndarray
+        (batch, length, 4) one-hot array.
+    """
+
+    require_numpy("array output")
+
+    codes = dna_codes(dna, locs, rev_comp=rev_comp, block_size=block_size)
+
+    n, length = codes.shape
+
+    if out is None:
+        out = np.empty((n, length, 4), dtype=dtype if dtype is not None else np.float32)
+    elif out.shape != (n, length, 4):
+        raise ValueError(f"out must have shape {(n, length, 4)}")
+
+    np.take(ONE_HOT_TABLE.astype(out.dtype, copy=False), codes, axis=0, out=out)
+
+    return out
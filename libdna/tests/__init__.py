@@ -0,0 +1,63 @@
+import os
+import random
+import tempfile
+
+import libdna
+
+
+def make_genome(seqs, dir=None):
+    """
+    Encode a small genome for testing.
+
+    Parameters
+    ----------
+    seqs : dict
+        Map of chr to sequence.
+    dir : str, optional
+        Directory to write files to. A temporary directory is created if
+        not given.
+
+    Returns
+    -------
+    str
+        Directory containing the encoded genome.
+    """
+
+    if dir is None:
+        dir = tempfile.mkdtemp()
+
+    cwd = os.getcwd()
+    os.chdir(dir)
+
+    try:
+        for chr, seq in seqs.items():
+            file = f"{chr}.fa"
+
+            with open(file, "w") as f:
+                print(f">{chr}", file=f)
+                print(seq, file=f)
+
+            libdna.encode_dna2bit(file)
+            libdna.encode_dna4bit(file)
+    finally:
+        os.chdir(cwd)
+
+    return dir
+
+
+def random_seq(n, seed=0):
+    """
+    Random sequence containing a block of Ns and a soft-masked block.
+    """
+
+    rnd = random.Random(seed)
+
+    seq = [rnd.choice("ACGT") for i in range(n)]
+
+    for i in range(n // 10, n // 10 + n // 20):
+        seq[i] = "N"
+
+    for i in range(n // 2, n // 2 + n // 10):
+        seq[i] = seq[i].lower()
+
+    return "".join(seq)
@@ -0,0 +1,94 @@
+import shutil
+import unittest
+
+import gal
+import libdna
+from libdna.tests import make_genome, random_seq
+
+
+def strata(s: str, n: int = libdna.DEFAULT_GC_STRATA) -> tuple:
+    """
+    GC and mask strata of a sequence.
+    """
+
+    acgt = len(s) - s.upper().count("N")
+    gc = sum([s.upper().count(b) for b in "CG"])
+    masked = sum([c.islower() for c in s])
+
+    return (min(gc * n // acgt, n - 1), min(masked * n // len(s), n - 1))
+
+
+class TestBackgroundSampler(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.seq = random_seq(20001)
+        cls.dir = make_genome({"chr1": cls.seq})
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir)
+
+    def test_sample(self):
+        foreground = [
+            gal.genomic.Location("chr1", s, s + 249) for s in [15001, 3001, 7777, 19001]
+        ]
+
+        for dna in [libdna.DNA2Bit(self.dir), libdna.DNA4Bit(self.dir)]:
+            sampler = libdna.BackgroundSampler(
+                dna, bin_size=200, avoid_masked=True, seed=0
+            )
+
+            summary = sampler.summary("chr1")
+            self.assertEqual(summary.n(0, summary.bins), self.seq.count("N"))
+
+            samples = sampler.sample(foreground, n=20)
+            self.assertEqual(len(samples), 80)
+
+            for i, loc in enumerate(samples):
+                s = self.seq[loc.start - 1 : loc.end]
+                target = foreground[i // 20]
+                t = self.seq[target.start - 1 : target.end]
+
+                self.assertEqual(len(s), 250)
+                self.assertNotIn("N", s)
+                self.assertEqual(s, s.upper())
+                self.assertEqual(strata(s)[0], strata(t)[0])
+
+    def test_sample_masked(self):
+        dna = libdna.DNA2Bit(self.dir)
+        sampler = libdna.BackgroundSampler(dna, bin_size=200, seed=1)
+
+        # the soft-masked block is 10001-12000 so these are fully, half
+        # and not masked, and the last includes Ns
+        foreground = [
+            gal.genomic.Location("chr1", s, s + 299) for s in [10501, 11851, 4001, 1901]
+        ]
+
+        samples = sampler.sample(foreground, n=10)
+
+        for i, loc in enumerate(samples):
+            s = self.seq[loc.start - 1 : loc.end]
+            target = foreground[i // 10]
+            t = self.seq[target.start - 1 : target.end]
+
+            self.assertNotIn("N", s.upper())
+            self.assertEqual(strata(s), strata(t))
+            self.assertEqual(sampler.strata(loc), strata(t))
+
+    def test_large_bins(self):
+        # a fully masked bin has too many masked bases for 16 bit counts
+        seq = random_seq(70001).lower()
+        dir = make_genome({"chr1": seq})
+
+        try:
+            for dna in [libdna.DNA2Bit(dir), libdna.DNA4Bit(dir)]:
+                sampler = libdna.BackgroundSampler(dna, bin_size=65536)
+                summary = sampler.summary("chr1")
+
+                self.assertEqual(summary.bins, 1)
+                self.assertEqual(summary.masked(0, 1), 65536)
+                self.assertEqual(
+                    summary.gc(0, 1), sum([seq[:65536].count(b) for b in "cg"])
+                )
+        finally:
+            shutil.rmtree(dir)
@@ -0,0 +1,56 @@
+import shutil
+import unittest
+
+import gal
+import libdna
+from libdna.tests import make_genome, random_seq
+
+
+class TestDNACache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.seq = random_seq(2003)
+        cls.dir = make_genome({"chr1": cls.seq})
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir)
+
+    def test_exact_hit(self):
+        cache = libdna.DNACache(libdna.DNA2Bit(self.dir))
+        loc = gal.genomic.Location("chr1", 100, 400)
+
+        s1 = cache.dna(loc)
+        s2 = cache.dna(loc)
+
+        self.assertEqual(s1, self.seq[99:400])
+        self.assertEqual(s1, s2)
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 1)
+
+    def test_contained_hit(self):
+        dna = libdna.DNA2Bit(self.dir)
+        cache = libdna.DNACache(dna)
+
+        for rev_comp in [False, True]:
+            cache.dna(gal.genomic.Location("chr1", 50, 1500), rev_comp=rev_comp)
+            loc = gal.genomic.Location("chr1", 990, 1111)
+            self.assertEqual(
+                cache.dna(loc, rev_comp=rev_comp), dna.dna(loc, rev_comp=rev_comp)
+            )
+
+        self.assertEqual(cache.contained_hits, 2)
+        self.assertEqual(cache.misses, 2)
+
+    def test_max_bytes(self):
+        cache = libdna.DNACache(libdna.DNA4Bit(self.dir), max_bytes=1000)
+
+        for s in range(1, 2000, 500):
+            cache.dna(gal.genomic.Location("chr1", s, s + 399))
+
+        self.assertLessEqual(cache.size, 1000)
+        self.assertEqual(cache.stats()["entries"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,163 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import libdna
+from libdna.cli import main
+from libdna.server import create_server
+from libdna.tests import random_seq
+
+DNA_COMP_TABLE = str.maketrans("ACGTNacgtn", "TGCANtgcan")
+
+
+def run(args) -> str:
+    """
+    Run a command and return what it wrote to stdout.
+    """
+
+    out = io.StringIO()
+
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(io.StringIO()):
+        main(args)
+
+    return out.getvalue()
+
+
+class TestCLI(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.seq = random_seq(3001)
+        cls.dir = os.path.join(cls.tmp, "genome")
+
+        cls.fasta = cls._write("genome.fa", f">chr1\n{cls.seq}\n")
+        run(["encode", cls.fasta, "--dir", cls.dir])
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    @classmethod
+    def _write(cls, name: str, text: str) -> str:
+        file = os.path.join(cls.tmp, name)
+
+        with open(file, "w") as f:
+            f.write(text)
+
+        return file
+
+    def test_extract(self):
+        bed = self._write("regions.bed", "chr1\t99\t200\tr1\t0\t-\nchr1\t0\t10\n")
+
+        self.assertEqual(
+            run(["extract", "--dir", self.dir, "--bed", bed, "--output", "tsv"]),
+            f"r1\t{self.seq[99:200].translate(DNA_COMP_TABLE)[::-1]}\n"
+            f"chr1:1-10\t{self.seq[0:10]}\n",
+        )
+
+        locs = self._write("locs.txt", "chr1:1,001-1,100\n")
+
+        out = run(["extract", "--dir", self.dir, "--bed", locs, "--mask", "upper"])
+
+        # FASTA lines are 80 bases
+        seq = self.seq[1000:1100].upper()
+        self.assertEqual(out, f">chr1:1001-1100\n{seq[:80]}\n{seq[80:]}\n")
+
+    def test_extract_locations(self):
+        dir = os.path.join(self.tmp, "names")
+        fasta = self._write("names.fa", f">chrUn_x\n{self.seq[:100]}\n>1\n{self.seq}\n")
+        run(["encode", fasta, "--dir", dir])
+
+        # any chromosome name, and reversed coordinates are swapped
+        locs = self._write("names.txt", "chrUn_x:10-20\n1:5-10\n 1:20-10 \n1:7\n")
+
+        self.assertEqual(
+            run(["extract", "--dir", dir, "--bed", locs, "--output", "tsv"]),
+            f"chrUn_x:10-20\t{self.seq[9:20]}\n"
+            f"1:5-10\t{self.seq[4:10]}\n"
+            f"1:10-20\t{self.seq[9:20]}\n"
+            f"1:7-7\t{self.seq[6]}\n",
+        )
+
+        for text in ["chr1:10-20junk\n", "chr1\n", "chr1:-5-10\n", "chr1\t20\t10\n"]:
+            bad = self._write("bad.txt", text)
+
+            with self.assertRaises(ValueError):
+                run(["extract", "--dir", self.dir, "--bed", bad])
+
+    def test_manifest(self):
+        os.remove(os.path.join(self.dir, "manifest.json"))
+
+        run(["manifest", "--dir", self.dir])
+
+        manifest = libdna.GenomeManifest.open(self.dir)
+
+        self.assertEqual(manifest.chrs, ["chr1"])
+        self.assertTrue(manifest.has_n("chr1"))
+        self.assertTrue(manifest.has_mask("chr1"))
+
+    def test_diff(self):
+        seq = self.seq[:500] + ("C" if self.seq[500] != "C" else "G") + self.seq[501:]
+
+        dir = os.path.join(self.tmp, "patched")
+        fasta = self._write("patched.fa", f">chr1\n{seq}\n")
+        run(["encode", fasta, "--dir", dir])
+
+        self.assertEqual(run(["diff", self.dir, dir]), "chr1\t500\t501\tchanged\n")
+
+    def test_transcripts(self):
+        gtf = self._write(
+            "genes.gtf",
+            'chr1\ttest\texon\t11\t20\t.\t-\t.\ttranscript_id "t1";\n'
+            'chr1\ttest\texon\t31\t40\t.\t-\t.\ttranscript_id "t1";\n',
+        )
+
+        seq = (self.seq[10:20] + self.seq[30:40]).translate(DNA_COMP_TABLE)[::-1]
+
+        self.assertEqual(
+            run(["transcripts", "--dir", self.dir, "--gtf", gtf]), f">t1\n{seq}\n"
+        )
+
+    def test_kmer(self):
+        index = os.path.join(self.tmp, "k12")
+        seqs = self._write("guides.txt", self.seq[2000:2012] + "\n")
+
+        run(["kmer-index", "--dir", self.dir, "--k", "12", "--out", index])
+
+        self.assertIn(
+            f"chr1\t2000\t2012\t{self.seq[2000:2012]}\t0\t+\n",
+            run(["kmer-search", "--index", index, "--seqs", seqs]),
+        )
+
+    def test_dataset(self):
+        out = os.path.join(self.tmp, "windows")
+        bed = self._write("windows.bed", "chr1\t0\t20\nchr1\t100\t120\t.\t0\t-\n")
+
+        run(["dataset", "--dir", self.dir, "--bed", bed, "--out", out])
+
+        ds = libdna.Dataset(out)
+
+        self.assertEqual(len(ds), 2)
+        self.assertEqual(ds.length, 20)
+
+    def test_query(self):
+        socket_path = os.path.join(self.tmp, "libdna.sock")
+        server = create_server(self.dir, socket_path)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+
+        try:
+            out = run(["query", "--socket", socket_path, "--rev-comp", "chr1:5-15"])
+
+            self.assertEqual(
+                out,
+                f">chr1:5-15\n{self.seq[4:15].translate(DNA_COMP_TABLE)[::-1]}\n",
+            )
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
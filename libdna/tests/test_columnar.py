@@ -0,0 +1,97 @@
+import shutil
+import unittest
+
+import gal
+import libdna
+import numpy as np
+from libdna.tests import make_genome, random_seq
+
+
+class TestColumnar(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.seq = random_seq(2001)
+        cls.seq2 = random_seq(1001, seed=1)
+        cls.dir = make_genome({"chr1": cls.seq, "chr2": cls.seq2})
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir)
+
+    def test_buffers(self):
+        dna = libdna.DNA2Bit(self.dir)
+
+        offsets, data = libdna.dna_buffers(
+            dna, ["chr1", "chr1", "chr1"], [1500, 0, 10], [1510, 5, 10], zero_based=True
+        )
+
+        self.assertEqual(list(offsets), [0, 10, 15, 15])
+        self.assertEqual(data.decode("ascii"), self.seq[1500:1510] + self.seq[0:5])
+
+    def test_numpy(self):
+        dna = libdna.DNA2Bit(self.dir)
+
+        # interleaved chromosomes, overlapping rows and a block boundary
+        chrs = np.array(["chr2", "chr1", "chr2", "chr1", "chr1"])
+        starts = np.array([901, 1, 11, 990, 1200], dtype=np.int32)
+        ends = np.array([1001, 300, 40, 1220, 1200], dtype=np.int32)
+        strands = np.array(["-", "+", "+", "-", "+"])
+
+        offsets, data = libdna.dna_buffers(
+            dna, chrs, starts, ends, rev_comp=strands, mask="upper", block_size=250
+        )
+
+        expected = [
+            dna.dna(
+                gal.genomic.Location(c, int(s), int(e)),
+                mask="upper",
+                rev_comp=strand == "-",
+            )
+            for c, s, e, strand in zip(chrs, starts, ends, strands)
+        ]
+
+        self.assertEqual(offsets.tolist(), [0, 101, 401, 431, 662, 663])
+        self.assertEqual(
+            [
+                data[offsets[i] : offsets[i + 1]].decode("ascii")
+                for i in range(len(chrs))
+            ],
+            expected,
+        )
+
+        # a list of bools flags rows to reverse complement
+        offsets, data = libdna.dna_buffers(
+            dna, ["chr1", "chr1"], [1, 1], [10, 10], rev_comp=[False, True]
+        )
+        rc = dna.dna(gal.genomic.Location("chr1", 1, 10), rev_comp=True)
+        self.assertEqual(data.decode("ascii"), self.seq[0:10] + rc)
+
+    def test_errors(self):
+        dna = libdna.DNA2Bit(self.dir)
+
+        offsets, data = libdna.dna_buffers(dna, [], [], [])
+        self.assertEqual(offsets.tolist(), [0])
+        self.assertEqual(data, bytearray())
+
+        with self.assertRaises(ValueError):
+            libdna.dna_buffers(dna, ["chr1", "chr2"], [10, 10], [20, 5])
+
+        with self.assertRaises(ValueError):
+            libdna.dna_buffers(dna, ["chr1"], [10, 10], [20, 30])
+
+        with self.assertRaises(ValueError):
+            libdna.dna_buffers(dna, ["chr2"], [990], [1010])
+
+    @unittest.skipIf(libdna.columnar.pa is None, "pyarrow is not installed")
+    def test_arrow(self):
+        dna = libdna.DNA4Bit(self.dir)
+
+        seqs = dna.dna_arrow(["chr1", "chr1"], [1, 101], [50, 150], rev_comp=["+", "-"])
+
+        self.assertEqual(
+            seqs.to_pylist(),
+            [
+                self.seq[0:50],
+                dna.dna(gal.genomic.Location("chr1", 101, 150), rev_comp=True),
+            ],
+        )
@@ -0,0 +1,85 @@
+import shutil
+import tempfile
+import unittest
+
+import gal
+import libdna
+from libdna.tests import make_genome, random_seq
+
+
+class TestDataset(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.dir = make_genome({"chr1": random_seq(2001)})
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir)
+
+    def setUp(self):
+        self.out = tempfile.mkdtemp()
+
+        # windows cross the N block at 200-300
+        self.intervals = [
+            (gal.genomic.Location("chr1", 150 + 10 * i, 162 + 10 * i), i % 3 == 0)
+            for i in range(23)
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.out)
+
+    def test_resume(self):
+        dna = libdna.DNA2Bit(self.dir)
+
+        expected = libdna.dna_codes(
+            dna,
+            [loc for loc, rc in self.intervals],
+            rev_comp=[rc for loc, rc in self.intervals],
+        )
+
+        def interrupted():
+            for i, interval in enumerate(self.intervals):
+                if i == 12:
+                    raise KeyboardInterrupt()
+
+                yield interval
+
+        with self.assertRaises(KeyboardInterrupt):
+            libdna.write_dataset(
+                dna,
+                interrupted(),
+                self.out,
+                encoding="2bit",
+                shard_rows=7,
+                batch_size=5,
+            )
+
+        ds = libdna.Dataset(self.out)
+        self.assertFalse(ds.complete)
+        self.assertEqual(len(ds), 10)
+
+        ds = libdna.write_dataset(
+            dna, self.intervals, self.out, encoding="2bit", shard_rows=7, batch_size=5
+        )
+
+        self.assertTrue(ds.complete)
+        self.assertEqual(ds.shards, 4)
+        self.assertEqual(ds[:].tolist(), expected.tolist())
+        self.assertEqual(ds[22].tolist(), expected[22].tolist())
+        self.assertEqual(ds[20:5:-3].tolist(), expected[20:5:-3].tolist())
+
+    def test_workers(self):
+        dna = libdna.DNA4Bit(self.dir)
+
+        ds = libdna.write_dataset(
+            dna, self.intervals, self.out, shard_rows=10, batch_size=4, workers=2
+        )
+
+        expected = libdna.dna_codes(
+            dna,
+            [loc for loc, rc in self.intervals],
+            rev_comp=[rc for loc, rc in self.intervals],
+        )
+
+        self.assertEqual(ds.length, 13)
+        self.assertEqual(ds.codes(0, len(ds)).tolist(), expected.tolist())
@@ -1,7 +1,14 @@
 import libdna
 import logging
+import shutil
 import unittest
 import sys
+import threading
+import time
+from collections import namedtuple
+
+import gal
+from libdna.tests import make_genome, random_seq
 
 class TestDecode(unittest.TestCase):
     def decode(self):
@@ -22,3 +29,180 @@ class TestDecode(unittest.TestCase):
         log.debug('what')
         
         self.assertTrue(isinstance(s, str))
+
+
+class TestDNA4Bit(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.seq = random_seq(1001)
+        cls.dir = make_genome({"chr1": cls.seq})
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir)
+
+    def test_mask(self):
+        dna = libdna.DNA4Bit(self.dir)
+
+        # spans the soft-masked block
+        loc = gal.genomic.Location("chr1", 480, 620)
+        seq = self.seq[479:620]
+
+        self.assertEqual(dna.dna(loc, mask="lower"), seq)
+        self.assertEqual(dna.dna(loc, mask="upper"), seq.upper())
+        self.assertEqual(
+            dna.dna(loc, mask="n"), "".join([b if b.isupper() else "N" for b in seq])
+        )
+
+    def test_rev_comp(self):
+        dna = libdna.DNA4Bit(self.dir)
+
+        for start, end in [(1, 1), (2, 10), (95, 160), (1, 1001)]:
+            loc = gal.genomic.Location("chr1", start, end)
+            seq = self.seq[start - 1 : end]
+            rc = seq.translate(str.maketrans("ACGTNacgtn", "TGCANtgcan"))[::-1]
+
+            self.assertEqual(dna.dna(loc, rev_comp=True), rc)
+
+
+Read = namedtuple("Read", ["chr", "pos", "length", "seq"])
+
+
+class TestMergeReadPairs(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.seqs = {"chr1": random_seq(2001), "chr2": random_seq(1001, seed=1)}
+        cls.dir = make_genome(cls.seqs)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir)
+
+    def _pair(self, chr, s1, l1, s2, l2):
+        seq = self.seqs[chr]
+
+        return (
+            Read(chr, s1, l1, seq[s1 - 1 : s1 + l1 - 1]),
+            Read(chr, s2, l2, seq[s2 - 1 : s2 + l2 - 1]),
+        )
+
+    def _check(self, dna, pairs, expected, **kwargs):
+        self.assertEqual(list(dna.merge_read_pair_seqs(pairs, **kwargs)), expected)
+        self.assertEqual(
+            [dna.merge_read_pair_seq(r1, r2) for r1, r2 in pairs], expected
+        )
+
+    def test_overlapping(self):
+        dna = libdna.DNA2Bit(self.dir)
+
+        # the reads are joined on their common bases without the genome
+        r1 = Read("chr1", 101, 10, "ACGTACGTAC")
+        r2 = Read("chr1", 106, 10, "CGTACTTTTT")
+
+        pairs = [(r1, r2), self._pair("chr1", 500, 50, 520, 50)]
+
+        self._check(dna, pairs, ["ACGTACGTACTTTTT", self.seqs["chr1"][499:569]])
+
+    def test_gapped(self):
+        dna = libdna.DNA2Bit(self.dir)
+
+        # touching, gapped, spanning the N and masked blocks, interleaved
+        # chromosomes and an overlapping pair in between
+        pairs = [
+            self._pair("chr1", 1, 20, 21, 20),
+            self._pair("chr2", 901, 30, 970, 32),
+            self._pair("chr1", 150, 50, 400, 50),
+            self._pair("chr1", 990, 30, 1000, 30),
+            self._pair("chr1", 1, 10, 1991, 11),
+        ]
+
+        expected = [
+            self.seqs["chr1"][0:40],
+            self.seqs["chr2"][900:1001],
+            self.seqs["chr1"][149:449],
+            self.seqs["chr1"][989:1029],
+            self.seqs["chr1"],
+        ]
+
+        self._check(dna, pairs, expected)
+        self._check(dna, pairs, expected, batch_size=2)
+
+    def test_block_boundary(self):
+        dna = libdna.DNA2Bit(self.dir)
+
+        # pairs longer than a block, pairs straddling where one block
+        # ends and the next starts, and sparse pairs sharing a block
+        pairs = [
+            self._pair("chr1", s, 20, s + 60, 20) for s in range(1, 1900, 37)
+        ] + [
+            self._pair("chr1", 90, 20, 300, 20),
+            self._pair("chr2", 1, 10, 991, 10),
+        ]
+
+        expected = [
+            self.seqs[r1.chr][r1.pos - 1 : r2.pos + r2.length - 1] for r1, r2 in pairs
+        ]
+
+        for block_size in [50, 100, 128, 1000, 10000]:
+            self._check(dna, pairs, expected, block_size=block_size)
+
+    def test_bounds(self):
+        dna = libdna.DNA2Bit(self.dir)
+
+        # the insert runs past the end of chr2
+        pair = (Read("chr2", 990, 10, "A" * 10), Read("chr2", 1000, 10, "A" * 10))
+
+        with self.assertRaises(ValueError):
+            list(dna.merge_read_pair_seqs([pair]))
+
+
+class TestCachedDNA2Bit(unittest.TestCase):
+    def test_threads(self):
+        seq = random_seq(5001)
+        dir = make_genome({"chr1": seq})
+
+        class SlowStorage(libdna.LocalStorage):
+            # widen the window in which threads miss together
+            def read(self, path, seek, n):
+                time.sleep(0.05)
+                return super().read(path, seek, n)
+
+        dna = libdna.CachedDNA2Bit(dir, storage=SlowStorage(dir))
+        results = []
+
+        def read(start):
+            loc = gal.genomic.Location("chr1", start, start + 99)
+            results.append(dna.dna(loc) == seq[start - 1 : start + 99])
+
+        try:
+            threads = [
+                threading.Thread(target=read, args=(s,)) for s in range(1, 4900, 300)
+            ]
+
+            for t in threads:
+                t.start()
+
+            for t in threads:
+                t.join()
+
+            self.assertTrue(all(results))
+            # the 2 bit, N and mask files are each loaded once
+            self.assertEqual(dna.loads, 3)
+        finally:
+            shutil.rmtree(dir)
+
+    def test_max_bytes(self):
+        dir = make_genome({"chr1": random_seq(4001), "chr2": random_seq(2001, 1)})
+
+        try:
+            # only the chr2 files are kept by default
+            for max_bytes, size in [(None, 1003), (10**6, 2003 + 1003)]:
+                dna = libdna.CachedDNA2Bit(dir, max_bytes=max_bytes)
+
+                dna.dna(gal.genomic.Location("chr1", 1, 100))
+                dna.dna(gal.genomic.Location("chr2", 1, 100))
+
+                self.assertEqual(dna.loads, 6)
+                self.assertEqual(dna.size, size)
+        finally:
+            shutil.rmtree(dir)
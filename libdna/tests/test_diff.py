@@ -0,0 +1,33 @@
+import shutil
+import unittest
+
+import libdna
+from libdna.tests import make_genome, random_seq
+
+
+class TestDiff(unittest.TestCase):
+    def test_diff(self):
+        seq = random_seq(20001)
+
+        s = list(seq)
+        # changes either side of a sub-block boundary and a case change
+        s[4095] = "T" if s[4095] != "T" else "A"
+        s[4096] = "T" if s[4096] != "T" else "A"
+        s[15000] = s[15000].swapcase()
+
+        dir1 = make_genome({"chr1": seq, "chr2": "ACGT"})
+        dir2 = make_genome({"chr1": "".join(s)})
+
+        try:
+            for format in ["2bit", "4bit"]:
+                self.assertEqual(
+                    list(libdna.diff_genomes(dir1, dir2, format=format)),
+                    [
+                        libdna.DiffInterval("chr1", 4096, 4097, "changed"),
+                        libdna.DiffInterval("chr1", 15001, 15001, "changed"),
+                        libdna.DiffInterval("chr2", 1, 4, "removed"),
+                    ],
+                )
+        finally:
+            shutil.rmtree(dir1)
+            shutil.rmtree(dir2)
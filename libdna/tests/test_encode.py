@@ -0,0 +1,156 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import gal
+import libdna
+from libdna.tests import random_seq
+
+
+class TestEncodeGenome(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.out = os.path.join(self.dir, "genome")
+        self.file = os.path.join(self.dir, "genome.fa")
+        self.seqs = {
+            "chr1": random_seq(1001),
+            "chr2": random_seq(500, seed=1),
+            "chr3": random_seq(333, seed=2),
+        }
+
+        self._write()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _write(self):
+        with open(self.file, "w") as f:
+            for chr, seq in self.seqs.items():
+                print(f">{chr}", file=f)
+                print(seq, file=f)
+
+    def _check(self, format="2bit"):
+        if format == "4bit":
+            dna = libdna.DNA4Bit(self.out)
+        else:
+            dna = libdna.DNA2Bit(self.out)
+
+        for chr, seq in self.seqs.items():
+            self.assertEqual(dna.dna(gal.genomic.Location(chr, 1, len(seq))), seq)
+
+    def test_skip(self):
+        for jobs in [1, 2]:
+            for format in ["2bit", "4bit"]:
+                shutil.rmtree(self.out, ignore_errors=True)
+
+                self.assertEqual(
+                    libdna.encode_genome(self.file, format, self.out, jobs=jobs),
+                    ["chr1", "chr2", "chr3"],
+                )
+                self._check(format)
+
+                # the whole file is unchanged
+                self.assertEqual(
+                    libdna.encode_genome(self.file, format, self.out, jobs=jobs), []
+                )
+
+                # only the changed chromosome is encoded again
+                self.seqs["chr2"] = self.seqs["chr2"][::-1]
+                self._write()
+
+                self.assertEqual(
+                    libdna.encode_genome(self.file, format, self.out, jobs=jobs),
+                    ["chr2"],
+                )
+                self._check(format)
+
+                self.assertEqual(
+                    libdna.encode_genome(
+                        self.file, format, self.out, jobs=jobs, force=True
+                    ),
+                    ["chr1", "chr2", "chr3"],
+                )
+
+    def test_checksum(self):
+        libdna.encode_genome(self.file, "2bit", self.out)
+        libdna.encode_genome(self.file, "4bit", self.out)
+
+        manifest = libdna.GenomeManifest.open(self.out)
+
+        for chr, seq in self.seqs.items():
+            cs = libdna.checksum(seq)
+            encoded = manifest.entry(chr)["encoded"]
+
+            self.assertEqual(sorted(encoded), ["2bit", "4bit"])
+            self.assertEqual(encoded["2bit"]["checksum"], cs)
+            self.assertEqual(encoded["4bit"]["checksum"], cs)
+            self.assertEqual(encoded["2bit"]["source"], os.path.abspath(self.file))
+
+            self.assertTrue(libdna.is_encoded(manifest, chr, "2bit", cs))
+            self.assertTrue(libdna.is_encoded(manifest, chr, "4bit", cs))
+            self.assertFalse(libdna.is_encoded(manifest, chr, "2bit", "0" * 64))
+
+    def test_replaced_file(self):
+        libdna.encode_genome(self.file, "2bit", self.out)
+
+        # a same sized file written over one output is not accepted
+        path = os.path.join(self.out, "chr1.n.1bit")
+        size = os.path.getsize(path)
+
+        with open(path, "wb") as f:
+            f.write(bytes(size))
+
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000))
+
+        manifest = libdna.GenomeManifest.open(self.out)
+        cs = libdna.checksum(self.seqs["chr1"])
+
+        self.assertFalse(libdna.is_encoded(manifest, "chr1", "2bit", cs))
+        cs = libdna.checksum(self.seqs["chr2"])
+        self.assertTrue(libdna.is_encoded(manifest, "chr2", "2bit", cs))
+
+        self.assertEqual(libdna.encode_genome(self.file, "2bit", self.out), ["chr1"])
+        self._check()
+
+        # a missing output is not accepted either
+        os.remove(os.path.join(self.out, "chr3.mask.1bit"))
+
+        self.assertEqual(libdna.encode_genome(self.file, "2bit", self.out), ["chr3"])
+        self._check()
+
+    def test_resume(self):
+        libdna.encode_genome(self.file, "2bit", self.out)
+
+        old = self.seqs["chr1"]
+        self.seqs["chr1"] = self.seqs["chr2"][::-1] + old[500:]
+        self._write()
+
+        replace = os.replace
+
+        def _replace(src, dst):
+            # crash after the 2 bit file of the first chromosome is in place
+            if dst.endswith("chr1.n.1bit"):
+                raise KeyboardInterrupt
+
+            replace(src, dst)
+
+        with mock.patch("os.replace", _replace):
+            with self.assertRaises(KeyboardInterrupt):
+                libdna.encode_genome(self.file, "2bit", self.out)
+
+        manifest = libdna.GenomeManifest.open(self.out)
+
+        # the mixed set of outputs is not taken as the old or new sequence
+        self.assertNotIn("2bit", manifest.entry("chr1").get("encoded", {}))
+
+        # going back to the old sequence must not reuse the new 2 bit file
+        self.seqs["chr1"] = old
+        self._write()
+
+        self.assertEqual(libdna.encode_genome(self.file, "2bit", self.out), ["chr1"])
+        self._check()
+
+        self.assertEqual(libdna.encode_genome(self.file, "2bit", self.out), [])
@@ -0,0 +1,59 @@
+import shutil
+import tempfile
+import unittest
+
+import libdna
+from libdna.tests import make_genome
+
+
+class TestKmerIndex(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # GGATCC is palindromic and the N block breaks the k-mers over it
+        cls.seq = "ACGTTGCAGGATCCTTTNNNNAACGTTGCAGGAACCGTAAC"
+        cls.dir = make_genome({"chr1": cls.seq})
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir)
+
+    def setUp(self):
+        self.out = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.out)
+
+    def test_lookup(self):
+        dna = libdna.DNA2Bit(self.dir)
+
+        for canonical in [False, True]:
+            idx = libdna.build_kmer_index(
+                dna, 6, self.out, canonical=canonical, shard_size=16
+            )
+
+            self.assertEqual(len(idx), len(self.seq) - 5 - 9)
+
+            self.assertEqual(
+                [(h.start, h.strand) for h in idx.lookup("ACGTTG")],
+                [(1, "+"), (23, "+")],
+            )
+
+            # reverse complement of GTTCCT at 30
+            self.assertEqual(
+                [(h.start, h.strand) for h in idx.lookup("AGGAAC")], [(30, "+")]
+            )
+            self.assertEqual(idx.lookup("GTTCCT")[0][3], "-")
+
+            # palindrome reported once
+            self.assertEqual(
+                [(h.start, h.strand) for h in idx.lookup("GGATCC")], [(9, "+")]
+            )
+
+            # N is stored as A so TTTNNN would be TTTAAA if not skipped
+            self.assertEqual(idx.lookup("TTTAAA"), [])
+
+            # ATCCTT at 11 is AAGGAT on the minus strand
+            self.assertEqual(
+                [(h.start, h.strand, h.mismatches) for h in idx.lookup("CAGGAT", 1)],
+                [(7, "+", 0), (11, "-", 1), (29, "+", 1)],
+            )
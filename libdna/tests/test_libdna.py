@@ -0,0 +1,27 @@
+import unittest
+
+import libdna
+
+
+class TestParseLocations(unittest.TestCase):
+    def test_parse(self):
+        locs = libdna.parse_locations(
+            [
+                "chr1:1,000-2,000",
+                "chr2:5",
+                " chrUn_KI270742v1:10-3 ",
+                "bad",
+                None,
+                "chr3:1-2x",
+                "chr1:99999999999999999999-3",
+                "chr1:9223372036854775808",
+                "chr1:\u0663-\u0665",
+                "chr1:" + "9" * 5000,
+                "chrX:9223372036854775807",
+            ]
+        )
+
+        self.assertEqual(locs.chrs, ["chr1", "chr2", "chrUn_KI270742v1", "chrX"])
+        self.assertEqual(list(locs.starts), [1000, 5, 3, 2**63 - 1])
+        self.assertEqual(list(locs.ends), [2000, 5, 10, 2**63 - 1])
+        self.assertEqual(locs.bad, [3, 4, 5, 6, 7, 8, 9])
@@ -0,0 +1,118 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import gal
+import libdna
+from libdna.tests import make_genome, random_seq
+
+
+class TestManifest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.seq = random_seq(1001)
+        # no N or soft-masked bases
+        cls.seq2 = random_seq(500, seed=1).upper().replace("N", "A")
+        cls.dir = make_genome({"chr1": cls.seq, "chr2": cls.seq2})
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir)
+
+    def test_encoded(self):
+        manifest = libdna.GenomeManifest.open(self.dir)
+
+        self.assertEqual(manifest.chrs, ["chr1", "chr2"])
+        self.assertEqual(manifest.length("chr1"), 1001)
+        self.assertEqual(manifest.length("chr2"), 500)
+        self.assertTrue(manifest.has_n("chr1"))
+        self.assertTrue(manifest.has_mask("chr1"))
+        self.assertFalse(manifest.has_n("chr2"))
+        self.assertFalse(manifest.has_mask("chr2"))
+
+        path = os.path.join(self.dir, "chr1.dna.2bit")
+        self.assertEqual(manifest.path("CHR1.dna.2bit"), path)
+        self.assertEqual(manifest.file_size("chr1.dna.2bit"), os.path.getsize(path))
+        self.assertEqual(manifest.file_size("chr1.dna.4bit"), 1 + 1001 // 2 + 1)
+
+        self.assertIsNone(manifest.path("chr3.dna.2bit"))
+        self.assertIsNone(manifest.file_size("chr3.dna.2bit"))
+        self.assertIsNone(manifest.file_size("chr1.fa"))
+        self.assertIsNone(manifest.entry("chr3"))
+        self.assertIsNone(manifest.has_n("chr3"))
+
+    def test_output_dir(self):
+        cwd = os.getcwd()
+        work = tempfile.mkdtemp()
+        out = os.path.join(work, "genome")
+
+        try:
+            os.chdir(work)
+
+            with open("chr1.fa", "w") as f:
+                print(">chr1", file=f)
+                print(self.seq, file=f)
+
+            libdna.encode_dna2bit("chr1.fa", dir=out)
+            libdna.encode_dna4bit("chr1.fa", dir=out)
+
+            self.assertFalse(os.path.exists(libdna.manifest.MANIFEST_FILE))
+
+            with open(os.path.join(out, libdna.manifest.MANIFEST_FILE)) as f:
+                data = json.load(f)
+
+            self.assertEqual(
+                sorted(data["chrs"]["chr1"]["files"]),
+                ["chr1.dna.2bit", "chr1.dna.4bit", "chr1.mask.1bit", "chr1.n.1bit"],
+            )
+            self.assertEqual(sorted(data["chrs"]["chr1"]["encoded"]), ["2bit", "4bit"])
+
+            dna = libdna.DNA2Bit(out)
+            self.assertEqual(dna.dna(gal.genomic.Location("chr1", 1, 1001)), self.seq)
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(work)
+
+    def test_build(self):
+        dir = tempfile.mkdtemp()
+
+        try:
+            for file in os.listdir(self.dir):
+                if file != libdna.manifest.MANIFEST_FILE:
+                    shutil.copy(os.path.join(self.dir, file), dir)
+
+            # without manifest.json the files come from a listing and
+            # nothing else is known
+            manifest = libdna.GenomeManifest.open(dir)
+            self.assertEqual(manifest.chrs, ["chr1", "chr2"])
+            self.assertIsNone(manifest.length("chr1"))
+            self.assertIsNone(manifest.has_n("chr1"))
+            self.assertIsNone(manifest.has_mask("chr1"))
+            self.assertEqual(
+                manifest.file_size("chr2.n.1bit"),
+                os.path.getsize(os.path.join(dir, "chr2.n.1bit")),
+            )
+
+            manifest = libdna.build_manifest(dir)
+
+            for m in [manifest, libdna.GenomeManifest.open(dir)]:
+                self.assertEqual(m.length("chr1"), 1001)
+                self.assertEqual(m.length("chr2"), 500)
+                self.assertTrue(m.has_n("chr1"))
+                self.assertTrue(m.has_mask("chr1"))
+                self.assertFalse(m.has_n("chr2"))
+                self.assertFalse(m.has_mask("chr2"))
+
+            # 2 bit files alone leave the length unknown
+            for file in os.listdir(dir):
+                if file.endswith(".4bit") or file == libdna.manifest.MANIFEST_FILE:
+                    os.remove(os.path.join(dir, file))
+
+            manifest = libdna.build_manifest(dir)
+            self.assertIsNone(manifest.length("chr1"))
+            self.assertTrue(manifest.has_n("chr1"))
+            self.assertFalse(manifest.has_mask("chr2"))
+        finally:
+            shutil.rmtree(dir)
@@ -0,0 +1,86 @@
+import re
+import shutil
+import unittest
+
+import gal
+import libdna
+from libdna.tests import make_genome, random_seq
+
+IUPAC_REGEX = {
+    b: "[" + "".join(["ACGT"[c] for c in codes]) + "]"
+    for b, codes in libdna.IUPAC_CODES.items()
+}
+
+
+def find(seq: str, pattern: str, offset: int = 1) -> list:
+    """
+    Overlapping matches of an IUPAC pattern found with a regex.
+    """
+
+    regex = re.compile("(?=(" + "".join([IUPAC_REGEX[b] for b in pattern]) + "))")
+
+    return [
+        (m.start() + offset, m.start() + offset + len(pattern) - 1)
+        for m in regex.finditer(seq.upper())
+    ]
+
+
+class TestMotif(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.seq = random_seq(2000)
+        cls.dir = make_genome({"chr1": cls.seq})
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir)
+
+    def _expected(self, pattern, start=1, end=2000):
+        seq = self.seq[start - 1 : end]
+
+        hits = [(s, e, "+") for s, e in find(seq, pattern, start)]
+
+        rev_pattern = libdna.rev_comp_pattern(pattern)
+
+        if rev_pattern != pattern:
+            hits += [(s, e, "-") for s, e in find(seq, rev_pattern, start)]
+
+        return sorted(hits, key=lambda h: (h[1], h[2]))
+
+    def test_search(self):
+        for reader in [libdna.DNA2Bit, libdna.DNA4Bit]:
+            dna = reader(self.dir)
+
+            # GATC is palindromic
+            for pattern in ["ACG", "TGASTCA", "GATC", "RYN", "AAAA"]:
+                # small chunks so matches span chunk edges
+                hits = list(libdna.search(dna, pattern, "chr1", chunk_size=7))
+
+                self.assertEqual(
+                    [(s, e, strand) for chr, s, e, strand in hits],
+                    self._expected(pattern),
+                )
+
+            loc = gal.genomic.Location("chr1", 150, 1100)
+            hits = list(libdna.search(dna, "CNG", loc, both_strands=False))
+
+            self.assertEqual(
+                [(s, e) for chr, s, e, strand in hits],
+                find(self.seq[149:1100], "CNG", 150),
+            )
+
+    def test_n(self):
+        dna = libdna.DNA2Bit(self.dir)
+
+        # the N block at 201-300 is stored as A but never matches
+        hits = list(libdna.search(dna, "N", gal.genomic.Location("chr1", 195, 305)))
+
+        self.assertEqual(
+            [h[1] for h in hits], list(range(195, 201)) + list(range(301, 306))
+        )
+
+    def test_bounds(self):
+        dna = libdna.DNA2Bit(self.dir)
+
+        with self.assertRaises(ValueError):
+            list(libdna.search(dna, "AAAA", gal.genomic.Location("chr1", 1990, 2004)))
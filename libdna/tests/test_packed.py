@@ -0,0 +1,54 @@
+import shutil
+import unittest
+
+import gal
+import libdna
+from libdna.tests import make_genome, random_seq
+
+DNA_COMP_TABLE = str.maketrans("ACGTacgtNn", "TGCAtgcaNn")
+
+
+class TestPackedSeq(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.seq = random_seq(1003)
+        cls.dir = make_genome({"chr1": cls.seq})
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir)
+
+    def test_packed(self):
+        # spans the N block at 100-150 and the masked block at 501-600
+        loc = gal.genomic.Location("chr1", 95, 603)
+        seq = self.seq[94:603]
+
+        for dna in [libdna.DNA2Bit(self.dir), libdna.DNA4Bit(self.dir)]:
+            p = dna._read_packed(loc)
+
+            self.assertEqual(len(p), len(seq))
+            self.assertEqual(p.decode(), seq)
+            self.assertEqual(p.decode(mask="upper"), seq.upper())
+            self.assertEqual(p[3:61].decode(), seq[3:61])
+            self.assertEqual(
+                p[401:].rev_comp().decode(), seq[401:].translate(DNA_COMP_TABLE)[::-1]
+            )
+            self.assertEqual(
+                libdna.PackedSeq.join([p[7:20], p[30:31].rev_comp(), p[401:]]).decode(),
+                seq[7:20] + seq[30:31].translate(DNA_COMP_TABLE) + seq[401:],
+            )
+
+    def test_transcript(self):
+        exons = [
+            gal.genomic.Location("chr1", 90, 110),
+            gal.genomic.Location("chr1", 495, 507),
+        ]
+
+        seq = self.seq[89:110] + self.seq[494:507]
+
+        for dna in [libdna.DNA2Bit(self.dir), libdna.DNA4Bit(self.dir)]:
+            self.assertEqual(
+                dna.transcript(exons, strand="-", mask="n"),
+                "".join(["N" if c.islower() else c for c in seq])
+                .translate(DNA_COMP_TABLE)[::-1],
+            )
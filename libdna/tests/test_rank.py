@@ -0,0 +1,47 @@
+import shutil
+import unittest
+
+import gal
+import libdna
+from libdna.tests import make_genome, random_seq
+
+
+class TestRank(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # spans several superblocks so that skipping is exercised
+        cls.seq = random_seq(20001)
+        cls.dir = make_genome({"chr1": cls.seq})
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir)
+
+    def test_count(self):
+        dna = libdna.DNA2Bit(self.dir)
+
+        for start, end in [(1, 20001), (1990, 3010), (9999, 12500), (7, 7)]:
+            s = self.seq[start - 1 : end]
+            loc = gal.genomic.Location("chr1", start, end)
+
+            self.assertEqual(dna.count_n(loc), s.upper().count("N"))
+            self.assertEqual(
+                dna.count_masked(loc), sum([c.islower() for c in s])
+            )
+
+    def test_next(self):
+        dna = libdna.DNA2Bit(self.dir)
+
+        for pos in [1, 2001, 2500, 3000, 15000]:
+            self.assertEqual(
+                dna.next_non_n("chr1", pos),
+                next(i + 1 for i in range(pos - 1, 20001) if self.seq[i] != "N"),
+            )
+
+            self.assertEqual(
+                dna.next_masked("chr1", pos),
+                next(
+                    (i + 1 for i in range(pos - 1, 20001) if self.seq[i].islower()),
+                    None,
+                ),
+            )
@@ -0,0 +1,26 @@
+import shutil
+import unittest
+
+import libdna
+from libdna.tests import make_genome
+
+
+class TestRepeats(unittest.TestCase):
+    def test_find(self):
+        seq = "ACGT" + "A" * 12 + "G" + "CA" * 8 + "T" + "CAG" * 5 + "NNCAGCAG" + "AAAAA"
+        dir = make_genome({"chr1": seq})
+
+        try:
+            for dna in [libdna.DNA2Bit(dir), libdna.DNA4Bit(dir)]:
+                # small chunks so repeats span chunk boundaries
+                repeats = [
+                    (r.start, r.end, r.period, r.unit)
+                    for r in libdna.find_repeats(dna, chunk_size=8)
+                ]
+
+                self.assertEqual(
+                    repeats,
+                    [(5, 16, 1, "A"), (18, 33, 2, "CA"), (35, 49, 3, "CAG")],
+                )
+        finally:
+            shutil.rmtree(dir)
@@ -0,0 +1,129 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import gal
+import libdna
+from libdna.server import DNAClient, DNAServer, create_server
+from libdna.tests import make_genome, random_seq
+
+
+class TestDNAServer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.seq = random_seq(2003)
+        cls.dir = make_genome({"chr1": cls.seq})
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir)
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.socket = os.path.join(self.tmp, "libdna.sock")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _serve(self):
+        server = create_server(self.dir, self.socket)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+
+        def stop():
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+        self.addCleanup(stop)
+
+        return server
+
+    def test_round_trip(self):
+        self._serve()
+
+        dna = libdna.DNA2Bit(self.dir)
+        locs = [
+            gal.genomic.Location("chr1", 1, 2003),
+            gal.genomic.Location("chr1", 190, 320),
+            gal.genomic.Location("chr1", 995, 1210),
+        ]
+
+        with DNAClient(self.socket) as client:
+            self.assertEqual(client.dna(locs[1]), dna.dna(locs[1]))
+            self.assertEqual(
+                client.dna(locs[2], mask="n", rev_comp=True),
+                dna.dna(locs[2], mask="n", rev_comp=True),
+            )
+            self.assertEqual(
+                client.dna_batch(locs, mask="upper"),
+                [dna.dna(loc, mask="upper") for loc in locs],
+            )
+
+            # the whole chromosome is fetched first so the rest of the
+            # batch is sliced from it
+            stats = client.stats()
+            self.assertEqual(stats["misses"], 3)
+            self.assertEqual(stats["contained_hits"], 2)
+
+            with self.assertRaises(ValueError):
+                client.dna(gal.genomic.Location("chr1", 1990, 2010))
+
+            # the connection survives an error
+            self.assertEqual(client.dna(locs[1]), dna.dna(locs[1]))
+
+    def test_concurrent_clients(self):
+        self._serve()
+
+        dna = libdna.DNA2Bit(self.dir)
+        errors = []
+
+        def query(i):
+            loc = gal.genomic.Location("chr1", 1 + 50 * i, 400 + 50 * i)
+
+            with DNAClient(self.socket) as client:
+                for j in range(20):
+                    if client.dna(loc) != dna.dna(loc):
+                        errors.append(i)
+
+        threads = [threading.Thread(target=query, args=(i,)) for i in range(8)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+
+    def test_socket_path(self):
+        # a regular file is never removed
+        with open(self.socket, "w") as f:
+            f.write("data")
+
+        with self.assertRaises(FileExistsError):
+            DNAServer(self.socket, libdna.DNA2Bit(self.dir))
+
+        self.assertTrue(os.path.isfile(self.socket))
+        os.remove(self.socket)
+
+        # nor is the socket of a running server
+        self._serve()
+
+        with self.assertRaises(OSError):
+            DNAServer(self.socket, libdna.DNA2Bit(self.dir))
+
+        with DNAClient(self.socket) as client:
+            self.assertEqual(len(client.dna(gal.genomic.Location("chr1", 1, 10))), 10)
+
+    def test_stale_socket(self):
+        server = create_server(self.dir, self.socket)
+        # close the listening socket but leave the file behind
+        server.socket.close()
+        self.assertTrue(os.path.exists(self.socket))
+
+        server = DNAServer(self.socket, libdna.DNA2Bit(self.dir))
+        server.server_close()
+        self.assertFalse(os.path.exists(self.socket))
@@ -0,0 +1,130 @@
+import multiprocessing
+import os
+import shutil
+import threading
+import unittest
+from multiprocessing import resource_tracker
+
+import gal
+import libdna
+from libdna.tests import make_genome, random_seq
+
+
+def _read(args):
+    """
+    Worker reading a location through shared memory.
+    """
+
+    dir, prefix, chr, start, end = args
+
+    dna = libdna.SharedDNA2Bit(dir, prefix=prefix)
+
+    try:
+        seq = dna.dna(gal.genomic.Location(chr, start, end))
+
+        return seq, dna._segment(f"{chr}.dna.2bit") is not None
+    finally:
+        dna.close()
+
+
+class TestShared(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.seq = random_seq(2001)
+        cls.seq2 = random_seq(1001, seed=1)
+        cls.dir = make_genome({"chr1": cls.seq, "chr2": cls.seq2})
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir)
+
+    def setUp(self):
+        self.prefix = f"libdna_test_{os.getpid()}"
+
+    def _jobs(self):
+        return [
+            (self.dir, self.prefix, "chr1", s, s + 199) for s in range(1, 1800, 150)
+        ] + [(self.dir, self.prefix, "chr2", 1, 1001)]
+
+    def _expected(self):
+        return [
+            self.seq[s - 1 : e] if chr == "chr1" else self.seq2[s - 1 : e]
+            for dir, prefix, chr, s, e in self._jobs()
+        ]
+
+    def test_reader(self):
+        dna = libdna.SharedDNA2Bit(self.dir, prefix=self.prefix)
+        loc = gal.genomic.Location("chr1", 101, 400)
+
+        try:
+            # without segments files are read from disk
+            self.assertEqual(dna.dna(loc), self.seq[100:400])
+            self.assertIsNone(dna._segment("chr1.dna.2bit"))
+
+            with libdna.SharedGenome(self.dir, chrs=["chr1"], prefix=self.prefix) as g:
+                self.assertEqual(
+                    g.files, ["chr1.dna.2bit", "chr1.mask.1bit", "chr1.n.1bit"]
+                )
+
+                # a segment created after a miss is picked up
+                self.assertIsNotNone(dna._segment("chr1.dna.2bit"))
+                self.assertEqual(dna.dna(loc), self.seq[100:400])
+
+                self.assertIsNone(dna._segment("chr2.dna.2bit"))
+                self.assertEqual(
+                    dna.dna(gal.genomic.Location("chr2", 1, 1001)), self.seq2
+                )
+        finally:
+            dna.close()
+
+    def _pool(self, method: str):
+        with libdna.SharedGenome(self.dir, prefix=self.prefix):
+            ctx = multiprocessing.get_context(method)
+
+            with ctx.Pool(2) as pool:
+                ret = pool.map(_read, self._jobs())
+
+            self.assertEqual([seq for seq, shared in ret], self._expected())
+            self.assertTrue(all([shared for seq, shared in ret]))
+
+            # the workers exiting does not free the owner's segments
+            seq, shared = _read(self._jobs()[0])
+            self.assertTrue(shared)
+            self.assertEqual(seq, self._expected()[0])
+
+    @unittest.skipIf(
+        "fork" not in multiprocessing.get_all_start_methods(), "fork is unavailable"
+    )
+    def test_fork(self):
+        self._pool("fork")
+
+    def test_spawn(self):
+        self._pool("spawn")
+
+    def test_threads(self):
+        register = resource_tracker.register
+        errors = []
+
+        def _run(jobs):
+            try:
+                for job in jobs:
+                    seq, shared = _read(job)
+
+                    if not shared:
+                        errors.append(job)
+            except Exception as e:
+                errors.append(e)
+
+        with libdna.SharedGenome(self.dir, prefix=self.prefix):
+            threads = [
+                threading.Thread(target=_run, args=(self._jobs(),)) for i in range(8)
+            ]
+
+            for t in threads:
+                t.start()
+
+            for t in threads:
+                t.join()
+
+        self.assertEqual(errors, [])
+        self.assertIs(resource_tracker.register, register)
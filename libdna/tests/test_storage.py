@@ -0,0 +1,188 @@
+import http.server
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import gal
+import libdna
+from libdna.tests import make_genome, random_seq
+
+
+class RangeHandler(http.server.SimpleHTTPRequestHandler):
+    """
+    Serves files from the directory of the server with support for
+    single range requests.
+    """
+
+    def do_GET(self):
+        path = self.translate_path(self.path)
+
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+
+        with open(path, "rb") as f:
+            data = f.read()
+
+        r = self.headers.get("Range")
+
+        if r is None:
+            self.send_response(200)
+        else:
+            start, end = r.split("=")[1].split("-")
+            start = int(start)
+
+            if start >= len(data):
+                self.send_error(416)
+                return
+
+            end = min(int(end), len(data) - 1)
+            data = data[start : end + 1]
+            self.send_response(206)
+
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHTTPStorage(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.seq = random_seq(20001)
+        cls.dir = make_genome({"chr1": cls.seq})
+
+        cls.server = http.server.ThreadingHTTPServer(
+            ("127.0.0.1", 0),
+            lambda *args: RangeHandler(*args, directory=cls.dir),
+        )
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        shutil.rmtree(cls.dir)
+
+    def test_read(self):
+        for reader in [libdna.DNA2Bit, libdna.DNA4Bit]:
+            storage = libdna.HTTPStorage(self.url, block_size=1024)
+            dna = reader(self.url, storage=storage)
+
+            self.assertEqual(dna.chr_length("chr1"), 20001)
+
+            loc = gal.genomic.Location("chr1", 1900, 2600)
+            self.assertEqual(dna.dna(loc), self.seq[1899:2600])
+
+            # served from the block cache
+            requests = storage.requests
+            self.assertEqual(dna.dna(loc), self.seq[1899:2600])
+            self.assertEqual(storage.requests, requests)
+
+    def test_batch(self):
+        storage = libdna.HTTPStorage(self.url, block_size=1024)
+        dna = libdna.DNA2Bit(self.url, storage=storage)
+        dna.manifest
+
+        locs = [gal.genomic.Location("chr1", s, s + 99) for s in range(1, 19000, 3000)]
+
+        # one merged fetch per file for all locations
+        self.assertEqual(
+            dna.dna_batch(locs, block_size=100),
+            [self.seq[loc.start - 1 : loc.end] for loc in locs],
+        )
+        self.assertEqual(storage.requests, 4)
+
+    def test_rank(self):
+        storage = libdna.HTTPStorage(self.url, block_size=1024)
+        dna = libdna.DNA2Bit(self.url, storage=storage)
+
+        loc = gal.genomic.Location("chr1", 1500, 2500)
+        self.assertEqual(dna.count_n(loc), self.seq[1499:2500].count("N"))
+        self.assertEqual(
+            dna.next_non_n("chr1", 2001),
+            next(i + 1 for i in range(2000, 20001) if self.seq[i] != "N"),
+        )
+        self.assertEqual(
+            dna.count_masked(gal.genomic.Location("chr1", 1, 20001)),
+            sum([c.islower() for c in self.seq]),
+        )
+
+        # the index was built in memory, not saved next to the remote file
+        self.assertFalse(os.path.exists(os.path.join(self.dir, "chr1.n.1bit.rank")))
+
+    def test_disk_cache(self):
+        cache_dir = tempfile.mkdtemp()
+
+        try:
+            loc = gal.genomic.Location("chr1", 5000, 9000)
+
+            storage = libdna.HTTPStorage(self.url, cache_dir=cache_dir)
+            libdna.DNA2Bit(self.url, storage=storage).dna(loc)
+
+            storage = libdna.HTTPStorage(self.url, cache_dir=cache_dir)
+            dna = libdna.DNA2Bit(self.url, storage=storage)
+            dna.manifest
+            self.assertEqual(dna.dna(loc), self.seq[4999:9000])
+            # only the manifest was requested
+            self.assertEqual(storage.requests, 1)
+        finally:
+            shutil.rmtree(cache_dir)
+
+
+class TestReadAheadStorage(unittest.TestCase):
+    def test_sequential(self):
+        seq = random_seq(20001)
+        dir = make_genome({"chr1": seq})
+
+        try:
+            storage = libdna.ReadAheadStorage(libdna.LocalStorage(dir))
+            dna = libdna.DNA2Bit(dir, storage=storage)
+
+            for s in range(1, 19900, 50):
+                loc = gal.genomic.Location("chr1", s, s + 99)
+                self.assertEqual(dna.dna(loc), seq[s - 1 : s + 99])
+
+            # most windows are served from the read-ahead buffers
+            self.assertGreater(storage.hits, 10 * storage.misses)
+        finally:
+            shutil.rmtree(dir)
+
+
+class TestLocalStorage(unittest.TestCase):
+    def test_prefetch(self):
+        seq = random_seq(2001)
+        dir = make_genome({"chr1": seq})
+
+        try:
+            storage = libdna.LocalStorage(dir)
+
+            # empty, negative and out of range hints are ignored
+            storage.prefetch(
+                os.path.join(dir, "chr1.dna.2bit"),
+                [(0, 0), (10, -5), (-4, 8), (0, 100), (10**6, 10)],
+            )
+
+            # invalid locations are reported by the read, not the prefetch
+            for reader in [libdna.DNA2Bit, libdna.DNA4Bit]:
+                dna = reader(dir, storage=storage)
+
+                for loc in [
+                    gal.genomic.Location("chr1", 20, 10),
+                    gal.genomic.Location("chr1", 0, 10),
+                    gal.genomic.Location("chr1", 1990, 2010),
+                ]:
+                    with self.assertRaises(ValueError):
+                        dna.dna_batch([gal.genomic.Location("chr1", 1, 10), loc])
+
+                self.assertEqual(
+                    dna.dna_batch([gal.genomic.Location("chr1", 1, 10)]), [seq[0:10]]
+                )
+        finally:
+            shutil.rmtree(dir)
@@ -0,0 +1,69 @@
+import shutil
+import unittest
+
+import gal
+import libdna
+from libdna.tests import make_genome, random_seq
+
+CODES = {"A": 0, "C": 1, "G": 2, "T": 3, "N": 4}
+
+DNA_COMP_TABLE = str.maketrans("ACGTN", "TGCAN")
+
+
+class TestTensor(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.seq = random_seq(2000)
+        cls.dir = make_genome({"chr1": cls.seq})
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir)
+
+    def _codes(self, loc, rev_comp=False):
+        seq = self.seq[loc.start - 1 : loc.end].upper()
+
+        if rev_comp:
+            seq = seq.translate(DNA_COMP_TABLE)[::-1]
+
+        return [CODES[c] for c in seq]
+
+    def test_codes(self):
+        # windows cross the N block and a chunk edge
+        locs = [gal.genomic.Location("chr1", s, s + 49) for s in [1, 180, 1951, 990]]
+        rev_comp = [False, True, False, True]
+
+        for reader in [libdna.DNA2Bit, libdna.DNA4Bit]:
+            dna = reader(self.dir)
+
+            codes = libdna.dna_codes(dna, locs, rev_comp=rev_comp, block_size=100)
+
+            self.assertEqual(
+                codes.tolist(),
+                [self._codes(loc, rc) for loc, rc in zip(locs, rev_comp)],
+            )
+
+            one_hot = libdna.one_hot(dna, locs, rev_comp=rev_comp)
+
+            self.assertEqual(one_hot.shape, (4, 50, 4))
+            self.assertEqual(one_hot.argmax(axis=2)[0].tolist(), codes[0].tolist())
+            # N is all zeros
+            self.assertEqual(
+                (one_hot[1].sum(axis=1) == 0).tolist(), (codes[1] == 4).tolist()
+            )
+
+    def test_bounds(self):
+        for reader in [libdna.DNA2Bit, libdna.DNA4Bit]:
+            dna = reader(self.dir)
+
+            with self.assertRaises(ValueError):
+                libdna.dna_codes(dna, [gal.genomic.Location("chr1", 1955, 2004)])
+
+            with self.assertRaises(ValueError):
+                libdna.dna_codes(
+                    dna,
+                    [
+                        gal.genomic.Location("chr1", 1000, 1049),
+                        gal.genomic.Location("chr1", 1990, 2039),
+                    ],
+                )
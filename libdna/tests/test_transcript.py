@@ -0,0 +1,61 @@
+import shutil
+import unittest
+
+import gal
+import libdna
+from libdna.tests import make_genome
+
+
+class TestTranscript(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # ATG GCC TGA, an intron, then TGG NGA on the plus strand
+        cls.dir = make_genome({"chr1": "ATGGCCTGAccccTGGNGA"})
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir)
+
+    def test_transcript(self):
+        for dna in [libdna.DNA2Bit(self.dir), libdna.DNA4Bit(self.dir)]:
+            exons = [
+                gal.genomic.Location("chr1", 14, 19),
+                gal.genomic.Location("chr1", 1, 9),
+            ]
+
+            self.assertEqual(dna.transcript(exons), "ATGGCCTGATGGNGA")
+            self.assertEqual(
+                dna.transcript_batch(
+                    [exons, [gal.genomic.Location("chr1", 8, 12)]], strand="-"
+                ),
+                ["TCNCCATCAGGCCAT", "gggTC"],
+            )
+
+    def test_modules(self):
+        # the function must not shadow its submodule in the package
+        self.assertIs(libdna.transcript.transcript_dna, libdna.transcript_dna)
+
+        dna = libdna.DNA2Bit(self.dir)
+        loc = gal.genomic.Location("chr1", 1, 9)
+
+        self.assertEqual(libdna.transcript_dna(dna, loc, strand="-"), "TCAGGCCAT")
+
+    def test_bounds(self):
+        for dna in [libdna.DNA2Bit(self.dir), libdna.DNA4Bit(self.dir)]:
+            for exons in [
+                # runs past the end, lies wholly past it or before the start
+                [
+                    gal.genomic.Location("chr1", 1, 9),
+                    gal.genomic.Location("chr1", 14, 21),
+                ],
+                [
+                    gal.genomic.Location("chr1", 1, 9),
+                    gal.genomic.Location("chr1", 25, 30),
+                ],
+                gal.genomic.Location("chr1", 0, 5),
+            ]:
+                with self.assertRaises(ValueError):
+                    dna.transcript(exons)
+
+                with self.assertRaises(ValueError):
+                    dna.transcript_batch([gal.genomic.Location("chr1", 1, 9), exons])
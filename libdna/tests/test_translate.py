@@ -0,0 +1,73 @@
+import shutil
+import unittest
+
+import gal
+import libdna
+from libdna.tests import make_genome
+
+
+class TestTranslate(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # ATG GCC TGA, an intron, then TGG NGA on the plus strand
+        cls.dir = make_genome({"chr1": "ATGGCCTGAccccTGGNGA"})
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir)
+
+    def test_translate(self):
+        for dna in [libdna.DNA2Bit(self.dir), libdna.DNA4Bit(self.dir)]:
+            exons = [
+                gal.genomic.Location("chr1", 14, 19),
+                gal.genomic.Location("chr1", 1, 9),
+            ]
+
+            self.assertEqual(dna.translate(exons), "MA*WX")
+            self.assertEqual(dna.translate(exons, frame=1), "WPDX")
+            # TCN CCA TCA GGC CAT
+            self.assertEqual(dna.translate(exons, strand="-"), "XPSGH")
+            # vertebrate mitochondrial code reads TGA as W
+            self.assertEqual(
+                dna.translate(gal.genomic.Location("chr1", 1, 9), table=2), "MAW"
+            )
+
+    def test_batch(self):
+        dna = libdna.DNA2Bit(self.dir)
+
+        self.assertEqual(
+            dna.translate_batch(
+                [gal.genomic.Location("chr1", 1, 6), gal.genomic.Location("chr1", 4, 9)],
+                strand=["+", "-"],
+            ),
+            ["MA", "SG"],
+        )
+
+    def test_bounds(self):
+        for dna in [libdna.DNA2Bit(self.dir), libdna.DNA4Bit(self.dir)]:
+            # runs past the end, lies wholly past it or before the start
+            for loc in [
+                gal.genomic.Location("chr1", 10, 21),
+                gal.genomic.Location("chr1", 25, 30),
+                gal.genomic.Location("chr1", 0, 5),
+            ]:
+                with self.assertRaises(ValueError):
+                    dna.translate(loc)
+
+                with self.assertRaises(ValueError):
+                    dna.translate([gal.genomic.Location("chr1", 1, 9), loc])
+
+                with self.assertRaises(ValueError):
+                    dna.translate_batch([gal.genomic.Location("chr1", 1, 9), loc])
+
+                with self.assertRaises(ValueError):
+                    dna.translate_frames(loc)
+
+    def test_modules(self):
+        # the function must not shadow its submodule in the package
+        self.assertEqual(libdna.translate.NCBI_CODON_TABLES[1][0:4], "FFLL")
+
+        dna = libdna.DNA2Bit(self.dir)
+        loc = gal.genomic.Location("chr1", 1, 9)
+
+        self.assertEqual(libdna.translate_dna(dna, loc), "MA*")
@@ -0,0 +1,121 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import gal
+import libdna
+from libdna.tests import make_genome
+
+DNA_COMP_TABLE = str.maketrans("ACGT", "TGCA")
+
+SEQ = "ACGTACGTAACCGGTTACGTACGTAACCGGTTACGT"
+
+
+class TestVariants(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.dir = make_genome({"chr1": SEQ})
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir)
+
+    def setUp(self):
+        self.variants = libdna.VariantIndex(
+            [
+                # SNV G>T at 3
+                libdna.Variant("chr1", 3, "G", "T", "snv"),
+                # insertion after 8
+                libdna.Variant("chr1", 8, "T", "TGGG", "ins"),
+                # deletion of 13-15
+                libdna.Variant("chr1", 12, "CGGT", "C", "del"),
+                # overlaps the deletion so is skipped
+                libdna.Variant("chr1", 14, "G", "A", "skip"),
+                # MNV at 21-23
+                libdna.Variant("chr1", 21, "ACG", "TTT", "mnv"),
+            ]
+        )
+
+        self.dna = libdna.VariantDNA(
+            libdna.DNA2Bit(self.dir), self.variants, check_ref=True
+        )
+
+    def test_overlapping(self):
+        def ids(s, e):
+            loc = gal.genomic.Location("chr1", s, e)
+            return [v.id for v in self.variants.overlapping(loc)]
+
+        self.assertEqual(ids(1, 36), ["snv", "ins", "del", "skip", "mnv"])
+        # the deletion starts before the location and the MNV runs past it
+        self.assertEqual(ids(14, 22), ["del", "skip", "mnv"])
+        self.assertEqual(ids(16, 20), [])
+
+    def test_dna(self):
+        loc = gal.genomic.Location("chr1", 1, 36)
+
+        expected = SEQ[0:2] + "T" + SEQ[3:8] + "GGG" + SEQ[8:12] + SEQ[15:20]
+        expected += "TTT" + SEQ[23:]
+
+        self.assertEqual(self.dna.dna(loc), expected)
+        self.assertEqual(
+            self.dna.dna(loc, rev_comp=True, lowercase=True),
+            expected.translate(DNA_COMP_TABLE)[::-1].lower(),
+        )
+
+    def test_clip(self):
+        # the end of the deletion and the start of the MNV are inside
+        self.assertEqual(
+            self.dna.dna(gal.genomic.Location("chr1", 14, 22)), SEQ[15:20] + "TT"
+        )
+
+        # the deletion keeps its first base, the insertion is kept in full
+        self.assertEqual(
+            self.dna.dna(gal.genomic.Location("chr1", 8, 13)), "TGGG" + SEQ[8:12]
+        )
+
+        locs = [
+            gal.genomic.Location("chr1", 14, 22),
+            gal.genomic.Location("chr1", 8, 13),
+            gal.genomic.Location("chr1", 1, 36),
+        ]
+
+        self.assertEqual(
+            self.dna.dna_batch(locs, block_size=10),
+            [self.dna.dna(loc) for loc in locs],
+        )
+
+    def test_check_ref(self):
+        dna = libdna.VariantDNA(
+            libdna.DNA2Bit(self.dir),
+            libdna.VariantIndex([libdna.Variant("chr1", 1, "AT", "A", "bad")]),
+            check_ref=True,
+        )
+
+        with self.assertRaises(ValueError):
+            dna.dna(gal.genomic.Location("chr1", 1, 10))
+
+        # only the clipped part of the allele is checked
+        self.assertEqual(dna.dna(gal.genomic.Location("chr1", 1, 1)), "A")
+
+    def test_read_vcf(self):
+        dir = tempfile.mkdtemp()
+
+        try:
+            file = os.path.join(dir, "test.vcf")
+
+            with open(file, "w") as f:
+                print("##fileformat=VCFv4.2", file=f)
+                print("#CHROM\tPOS\tID\tREF\tALT", file=f)
+                print("chr1\t3\trs1\tG\tT,C", file=f)
+                print("chr1\t5\trs2\tA\t<DEL>", file=f)
+                print("chr1\t7\trs3\tG\t*,GA", file=f)
+
+            self.assertEqual(
+                [(v.id, v.pos, v.alt) for v in libdna.read_vcf(file)],
+                [("rs1", 3, "T"), ("rs1", 3, "C"), ("rs3", 7, "GA")],
+            )
+
+            self.assertEqual(len(libdna.VariantIndex.from_vcf(file)), 3)
+        finally:
+            shutil.rmtree(dir)
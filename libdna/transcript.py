@@ -0,0 +1,172 @@
+import collections
+import gzip
+
+import gal
+
+from .packed import PackedSeq
+from .spliced import DEFAULT_SPLICED_BLOCK_SIZE, exon_list, per_record, read_spliced
+
+Transcript = collections.namedtuple("Transcript", ["id", "strand", "exons"])
+
+
+def _gtf_id(attributes: str, key: str) -> str:
+    """
+    Returns the value of a GTF (key "value";) or GFF3 (key=value;)
+    attribute or None.
+    """
+
+    for attribute in attributes.split(";"):
+        attribute = attribute.strip()
+
+        if attribute.startswith(f"{key} "):
+            return attribute[len(key) + 1 :].strip().strip('"')
+
+        if attribute.startswith(f"{key}="):
+            # GFF3 parents may be a comma separated list
+            return attribute[len(key) + 1 :].split(",")[0]
+
+    return None
+
+
+def read_transcripts(file: str, feature: str = "exon") -> list:
+    """
+    Read the exons of each transcript in a GTF or GFF3 file. Exons are
+    grouped by their transcript_id attribute, or Parent in GFF3.
+
+    Parameters
+    ----------
+    file : str
+        GTF or GFF3 file, optionally gzipped.
+    feature : str, optional
+        Feature type to collect, e.g. 'exon' or 'CDS'.
+
+    Returns
+    -------
+    list
+        Transcript(id, strand, exons) in the order first seen.
+    """
+
+    if "gz" in file:
+        f = gzip.open(file, "rt")
+    else:
+        f = open(file, "r")
+
+    transcripts = collections.OrderedDict()
+
+    with f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+
+            tokens = line.rstrip("\n").split("\t")
+
+            if len(tokens) < 9 or tokens[2] != feature:
+                continue
+
+            id = _gtf_id(tokens[8], "transcript_id")
+
+            if id is None:
+                id = _gtf_id(tokens[8], "Parent")
+
+            if id is None:
+                continue
+
+            loc = gal.genomic.Location(tokens[0], int(tokens[3]), int(tokens[4]))
+
+            if id not in transcripts:
+                transcripts[id] = Transcript(id, tokens[6], [])
+
+            transcripts[id].exons.append(loc)
+
+    return list(transcripts.values())
+
+
+def transcript_dna(dna, exons, strand: str = "+", mask: str = "lower") -> str:
+    """
+    Returns the spliced sequence of a transcript.
+
+    Parameters
+    ----------
+    dna : DNA2Bit or DNA4Bit
+        Reader.
+    exons : gal.genomic.Location or list
+        Exon locations on one chromosome, in any order.
+    strand : str, optional
+        '+' or '-'. Minus strand transcripts are reverse complemented.
+    mask : str, optional
+        Indicate whether masked bases should be represented as is
+        ('upper'), lowercase ('lower'), or as N ('n')
+
+    Returns
+    -------
+    str
+        Transcript sequence 5' to 3'.
+    """
+
+    return transcript_batch(dna, [exons], strand=strand, mask=mask)[0]
+
+
+def transcript_batch(
+    dna,
+    records,
+    strand="+",
+    mask: str = "lower",
+    block_size: int = DEFAULT_SPLICED_BLOCK_SIZE,
+) -> list:
+    """
+    Returns the spliced sequences of many transcripts. Each gene is
+    served by one read over its genomic span, shared with neighbouring
+    genes. The span is kept packed, so introns are never decoded, the
+    exons are cut and joined as packed bases, minus strand transcripts
+    are reverse complemented packed and each transcript is decoded once.
+
+    Parameters
+    ----------
+    dna : DNA2Bit or DNA4Bit
+        Reader.
+    records : list
+        Exon lists, or Transcript records from read_transcripts whose
+        strands are then used.
+    strand : str or list, optional
+        Strand of all records or one per record.
+    mask : str, optional
+        Either 'upper', 'lower' or 'n'.
+    block_size : int, optional
+        Maximum span of a single read.
+
+    Returns
+    -------
+    list
+        Transcript sequences in the same order as records.
+    """
+
+    records = list(records)
+
+    if len(records) > 0 and all([isinstance(r, Transcript) for r in records]):
+        strand = [r.strand for r in records]
+        records = [r.exons for r in records]
+
+    records = [exon_list(exons) for exons in records]
+    strands = per_record(strand, len(records), "strand")
+
+    # reads past the end of a chromosome return the padding
+    for exons in records:
+        for loc in exons:
+            dna._check_bounds(loc)
+
+    seqs = read_spliced(
+        lambda loc: dna._read_packed(loc, mask=mask),
+        records,
+        block_size=block_size,
+        join=PackedSeq.join,
+    )
+
+    ret = []
+
+    for i, seq in enumerate(seqs):
+        if strands[i] == "-":
+            seq = seq.rev_comp()
+
+        ret.append(seq.decode(mask=mask))
+
+    return ret
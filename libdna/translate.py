@@ -0,0 +1,235 @@
+from .spliced import DEFAULT_SPLICED_BLOCK_SIZE, exon_list, per_record, read_spliced
+
+# NCBI genetic codes. Codons are ordered by the bases TCAG, i.e. TTT,
+# TTC, TTA, TTG, TCT, ...
+NCBI_CODON_TABLES = {
+    # standard
+    1: "FFLLSSSSYY**CC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG",
+    # vertebrate mitochondrial
+    2: "FFLLSSSSYY**CCWWLLLLPPPPHHQQRRRRIIMMTTTTNNKKSS**VVVVAAAADDEEGGGG",
+    # yeast mitochondrial
+    3: "FFLLSSSSYY**CCWWTTTTPPPPHHQQRRRRIIMMTTTTNNKKSSRRVVVVAAAADDEEGGGG",
+    # mold, protozoan and coelenterate mitochondrial
+    4: "FFLLSSSSYY**CCWWLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG",
+    # invertebrate mitochondrial
+    5: "FFLLSSSSYY**CCWWLLLLPPPPHHQQRRRRIIMMTTTTNNKKSSSSVVVVAAAADDEEGGGG",
+    # ciliate, dasycladacean and hexamita nuclear
+    6: "FFLLSSSSYYQQCC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG",
+    # bacterial, archaeal and plant plastid
+    11: "FFLLSSSSYY**CC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG",
+}
+
+# position of each base code (A=0, C=1, G=2, T=3) in the NCBI TCAG order
+NCBI_BASE_ORDER = [2, 1, 3, 0]
+
+# Codon indices at or above this contain an N
+CODON_N = 64
+
+# Scale the base codes of each codon position so that the three scaled
+# codes sum to the codon index 16 * b1 + 4 * b2 + b3. N maps to
+# CODON_N so any codon containing N sums to at least CODON_N, and the
+# largest sum, 3 * CODON_N, still fits in a byte.
+CODON_POSITION_TABLES = [
+    bytes([v * m if v < 4 else CODON_N for v in range(256)]) for m in [16, 4, 1]
+]
+
+# complement of each base code, N stays as N
+CODE_COMP_TABLE = bytes([3, 2, 1, 0] + list(range(4, 256)))
+
+
+def _codon_table(ncbi: str) -> bytes:
+    """
+    Convert an NCBI codon string into a 256 entry translation table
+    indexed by codon index with ACGT order, where every index containing
+    an N translates to X.
+    """
+
+    ret = bytearray(b"X" * 256)
+
+    for b1 in range(4):
+        for b2 in range(4):
+            for b3 in range(4):
+                i = (
+                    NCBI_BASE_ORDER[b1] * 16
+                    + NCBI_BASE_ORDER[b2] * 4
+                    + NCBI_BASE_ORDER[b3]
+                )
+                ret[b1 * 16 + b2 * 4 + b3] = ord(ncbi[i])
+
+    return bytes(ret)
+
+
+CODON_TABLES = {id: _codon_table(ncbi) for id, ncbi in NCBI_CODON_TABLES.items()}
+
+
+def _codon_table_for(table) -> bytes:
+    if isinstance(table, str):
+        if len(table) != 64:
+            raise ValueError("a codon table must have 64 entries in TCAG order")
+
+        return _codon_table(table)
+
+    if table not in CODON_TABLES:
+        raise ValueError(f"unknown codon table {table}")
+
+    return CODON_TABLES[table]
+
+
+def translate_codes(codes: bytes, frame: int = 0, table=1) -> str:
+    """
+    Translate base codes (A=0, C=1, G=2, T=3, N=4) into protein. The
+    codes of the three codon positions are scaled with translation
+    tables and summed as big integers, one byte per codon, which
+    cannot carry between bytes, so each byte of the sum is a codon index
+    that a final table maps to an amino acid. There is no Python level
+    loop over codons.
+
+    Parameters
+    ----------
+    codes : bytes
+        Base codes.
+    frame : int, optional
+        Offset of the first codon, 0, 1 or 2.
+    table : int or str, optional
+        NCBI genetic code id or a 64 character codon string in TCAG
+        order.
+
+    Returns
+    -------
+    str
+        Amino acids, with X for codons containing N and * for stops.
+    """
+
+    n = (len(codes) - frame) // 3
+
+    if n <= 0:
+        return ""
+
+    codes = codes[frame : frame + 3 * n]
+
+    index = 0
+
+    for i, t in enumerate(CODON_POSITION_TABLES):
+        index += int.from_bytes(codes[i::3].translate(t), "big")
+
+    return index.to_bytes(n, "big").translate(_codon_table_for(table)).decode("ascii")
+
+
+def _strand_codes(codes: bytearray, strand: str) -> bytearray:
+    if strand == "-":
+        codes = codes.translate(CODE_COMP_TABLE)
+        codes.reverse()
+
+    return codes
+
+
+def translate_dna(dna, exons, frame: int = 0, strand: str = "+", table=1) -> str:
+    """
+    Translate a location, or the joined exons of a CDS, into protein
+    straight from the packed base codes of a reader.
+
+    Parameters
+    ----------
+    dna : DNA2Bit or DNA4Bit
+        Reader.
+    exons : gal.genomic.Location or list
+        A location or a list of exon locations on one chromosome.
+    frame : int, optional
+        Offset of the first codon from the 5' end on the given strand.
+    strand : str, optional
+        '+' or '-'. Minus strand sequence is reverse complemented
+        before translation.
+    table : int or str, optional
+        NCBI genetic code id or a 64 character codon string in TCAG
+        order.
+
+    Returns
+    -------
+    str
+        Protein sequence.
+    """
+
+    return translate_batch(dna, [exons], frame=frame, strand=strand, table=table)[0]
+
+
+def translate_batch(
+    dna,
+    records,
+    frame=0,
+    strand="+",
+    table=1,
+    block_size: int = DEFAULT_SPLICED_BLOCK_SIZE,
+) -> list:
+    """
+    Translate many CDS records. Nearby records are served by one read
+    of their combined span.
+
+    Parameters
+    ----------
+    dna : DNA2Bit or DNA4Bit
+        Reader.
+    records : list
+        Locations or lists of exon locations.
+    frame : int or list, optional
+        Frame of all records or one per record.
+    strand : str or list, optional
+        Strand of all records or one per record.
+    table : int or str, optional
+        NCBI genetic code id or a 64 character codon string.
+    block_size : int, optional
+        Maximum span of a single read.
+
+    Returns
+    -------
+    list
+        Protein sequences in the same order as records.
+    """
+
+    records = [exon_list(exons) for exons in records]
+    frames = per_record(frame, len(records), "frame")
+    strands = per_record(strand, len(records), "strand")
+
+    # reads past the end of a chromosome return the padding
+    for exons in records:
+        for loc in exons:
+            dna._check_bounds(loc)
+
+    codes = read_spliced(dna._read_codes, records, block_size=block_size)
+
+    return [
+        translate_codes(_strand_codes(c, strands[i]), frames[i], table)
+        for i, c in enumerate(codes)
+    ]
+
+
+def translate_frames(dna, loc, table=1) -> dict:
+    """
+    Six frame translation of a location from a single read.
+
+    Parameters
+    ----------
+    dna : DNA2Bit or DNA4Bit
+        Reader.
+    loc : gal.genomic.Location
+        Genomic location.
+    table : int or str, optional
+        NCBI genetic code id or a 64 character codon string.
+
+    Returns
+    -------
+    dict
+        Map of (strand, frame) to protein sequence.
+    """
+
+    dna._check_bounds(loc)
+
+    codes = dna._read_codes(loc)
+    rc = _strand_codes(codes, "-")
+
+    ret = {}
+
+    for frame in range(3):
+        ret[("+", frame)] = translate_codes(codes, frame, table)
+        ret[("-", frame)] = translate_codes(rc, frame, table)
+
+    return ret
@@ -0,0 +1,22 @@
+"""
+Optional dependencies shared by the array based modules.
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def require_numpy(what: str):
+    """
+    Raise an ImportError if numpy, needed for a feature, is missing.
+
+    Parameters
+    ----------
+    what : str
+        The feature, e.g. 'array output'.
+    """
+
+    if np is None:
+        raise ImportError(f"numpy is required for {what}")
@@ -0,0 +1,318 @@
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+import gzip
+import gal
+
+from .decode import DNA, DNA_COMP_TABLE, DEFAULT_BATCH_BLOCK_SIZE
+from .libdna import location_blocks
+
+Variant = namedtuple("Variant", ["chr", "pos", "ref", "alt", "id"])
+
+
+def read_vcf(file: str):
+    """
+    Read SNVs and indels from a VCF-like file. Multi-allelic records
+    produce one variant per alt allele. Symbolic alleles such as <DEL>
+    and missing alleles are skipped.
+
+    Parameters
+    ----------
+    file : str
+        VCF file, optionally gzipped.
+
+    Returns
+    -------
+    generator
+        Variant records in file order.
+    """
+
+    if "gz" in file:
+        f = gzip.open(file, "rt")
+    else:
+        f = open(file, "r")
+
+    with f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+
+            tokens = line.rstrip("\n").split("\t")
+
+            if len(tokens) < 5:
+                continue
+
+            chr = tokens[0]
+            pos = int(tokens[1])
+            id = tokens[2]
+            ref = tokens[3]
+
+            for alt in tokens[4].split(","):
+                if alt in (".", "*") or alt.startswith("<") or "[" in alt or "]" in alt:
+                    continue
+
+                yield Variant(chr, pos, ref, alt, id)
+
+
+class VariantIndex:
+    """
+    Per-chromosome index of variants sorted by position so that the
+    variants overlapping a region can be found by binary search.
+    """
+
+    def __init__(self, variants=None):
+        # chr -> list of variants
+        self.__variants = {}
+        # chr -> sorted list of positions
+        self.__positions = {}
+        # chr -> longest reference allele
+        self.__max_ref = {}
+        self.__sorted = True
+
+        if variants is not None:
+            for v in variants:
+                self.add(v)
+
+    @staticmethod
+    def from_vcf(file: str):
+        return VariantIndex(read_vcf(file))
+
+    def add(self, v: Variant):
+        if v.chr not in self.__variants:
+            self.__variants[v.chr] = []
+
+        self.__variants[v.chr].append(v)
+        self.__sorted = False
+
+    def _sort(self):
+        if self.__sorted:
+            return
+
+        for chr, variants in self.__variants.items():
+            variants.sort(key=lambda v: (v.pos, len(v.ref)))
+            self.__positions[chr] = [v.pos for v in variants]
+            self.__max_ref[chr] = max([len(v.ref) for v in variants])
+
+        self.__sorted = True
+
+    def __len__(self):
+        return sum([len(v) for v in self.__variants.values()])
+
+    @property
+    def chrs(self):
+        return sorted(self.__variants)
+
+    def overlapping(self, loc: gal.genomic.Location):
+        """
+        Returns the variants whose reference allele overlaps a location,
+        including those that start before it or run past its end.
+
+        Parameters
+        ----------
+        loc : gal.genomic.Location
+            Genomic location.
+
+        Returns
+        -------
+        list
+            Variants sorted by position.
+        """
+
+        self._sort()
+
+        positions = self.__positions.get(loc.chr)
+
+        if positions is None:
+            return []
+
+        variants = self.__variants[loc.chr]
+
+        # variants starting up to the longest allele before the location
+        # may reach into it
+        i1 = bisect_left(positions, loc.start - self.__max_ref[loc.chr] + 1)
+        i2 = bisect_right(positions, loc.end)
+
+        return [v for v in variants[i1:i2] if v.pos + len(v.ref) - 1 >= loc.start]
+
+
+class VariantDNA(DNA):
+    """
+    Extracts alternate haplotype sequence by applying a set of variants
+    to the reference sequence from a DNA reader such as DNA2Bit or
+    DNA4Bit.
+    """
+
+    def __init__(self, dna: DNA, variants: VariantIndex, check_ref=False):
+        """
+        Parameters
+        ----------
+        dna : DNA
+            Reference sequence reader.
+        variants : VariantIndex
+            Variants to apply.
+        check_ref : bool, optional
+            If True, raise a ValueError when a variant's reference allele
+            does not match the reference sequence.
+        """
+
+        self.__dna = dna
+        self.__variants = variants
+        self.__check_ref = check_ref
+
+    @property
+    def reader(self) -> DNA:
+        return self.__dna
+
+    @property
+    def variants(self) -> VariantIndex:
+        return self.__variants
+
+    def _apply(self, ref: str, loc: gal.genomic.Location) -> str:
+        """
+        Rebuild the sequence of a location from slices of the reference
+        and the alt alleles of the overlapping variants. Variants that
+        overlap a variant already applied are skipped.
+
+        Variants crossing the edges of the location are clipped to it.
+        The ref and alt alleles are aligned from their first base, as in
+        VCF, and the same number of bases is removed from each, so that a
+        deletion spanning the start removes only the bases inside the
+        location. Alt bases beyond the ref allele are kept unless the
+        ref allele runs past the end.
+        """
+
+        variants = self.__variants.overlapping(loc)
+
+        if len(variants) == 0:
+            return ref
+
+        pieces = []
+
+        # current position in the reference
+        p = loc.start
+
+        for v in variants:
+            # bases of the ref allele before and after the location
+            lead = max(loc.start - v.pos, 0)
+            trail = max(v.pos + len(v.ref) - 1 - loc.end, 0)
+
+            pos = v.pos + lead
+
+            if pos < p:
+                continue
+
+            r = v.ref[lead : len(v.ref) - trail]
+
+            if trail == 0:
+                alt = v.alt[lead:]
+            else:
+                alt = v.alt[lead : len(v.ref) - trail]
+
+            if self.__check_ref:
+                s = ref[pos - loc.start : pos - loc.start + len(r)]
+
+                if s.upper() != r.upper():
+                    raise ValueError(
+                        f"{v.chr}:{v.pos} ref {v.ref} does not match reference {s}"
+                    )
+
+            pieces.append(ref[p - loc.start : pos - loc.start])
+            pieces.append(alt)
+            p = pos + len(r)
+
+        pieces.append(ref[p - loc.start :])
+
+        return "".join(pieces)
+
+    @staticmethod
+    def _finish(seq: str, rev_comp: bool, lowercase: bool) -> str:
+        if rev_comp:
+            seq = seq.translate(DNA_COMP_TABLE)[::-1]
+
+        if lowercase:
+            seq = seq.lower()
+
+        return seq
+
+    def dna(
+        self, loc: gal.genomic.Location, mask="lower", rev_comp=False, lowercase=False
+    ):
+        """
+        Returns the alternate haplotype DNA for a location.
+
+        Parameters
+        ----------
+        loc : gal.genomic.Location
+            Genomic Location
+        mask : str, optional
+            Indicate whether masked bases should be represented as is
+            ('upper'), lowercase ('lower'), or as N ('n')
+        rev_comp : bool, optional
+            Whether to reverse complement the sequence.
+        lowercase : bool, optional
+            Indicates whether sequence should be displayed as upper or
+            lowercase.
+
+        Returns
+        -------
+        str
+            DNA sequence with variants applied.
+        """
+
+        ref = self.__dna.dna(loc, mask=mask)
+
+        return VariantDNA._finish(self._apply(ref, loc), rev_comp, lowercase)
+
+    def dna_batch(
+        self,
+        locs,
+        mask="lower",
+        rev_comp=False,
+        lowercase=False,
+        block_size=DEFAULT_BATCH_BLOCK_SIZE,
+    ):
+        """
+        Returns the alternate haplotype DNA for many locations. Locations
+        are sorted by position so that nearby regions are served from a
+        single read of the reference of up to block_size bases.
+
+        Parameters
+        ----------
+        locs : list
+            List of gal.genomic.Location.
+        mask : str, optional
+            Indicate whether masked bases should be represented as is
+            ('upper'), lowercase ('lower'), or as N ('n')
+        rev_comp : bool, optional
+            Whether to reverse complement the sequences.
+        lowercase : bool, optional
+            Indicates whether sequences should be displayed as upper or
+            lowercase.
+        block_size : int, optional
+            Maximum span of a single reference read.
+
+        Returns
+        -------
+        list
+            DNA sequences in the same order as locs.
+        """
+
+        locs = list(locs)
+
+        ret = [None] * len(locs)
+
+        for block, members in location_blocks(
+            [loc.chr for loc in locs],
+            [loc.start for loc in locs],
+            [loc.end for loc in locs],
+            block_size,
+        ):
+            seq = self.__dna.dna(block, mask=mask)
+
+            for k in members:
+                loc = locs[k]
+                ref = seq[loc.start - block.start : loc.end - block.start + 1]
+                ret[k] = VariantDNA._finish(
+                    self._apply(ref, loc), rev_comp, lowercase
+                )
+
+        return ret
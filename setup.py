@@ -8,6 +8,11 @@ setuptools.setup(
     description='A library for working with DNA.',
     url='https://github.com/antonybholmes/libdna',
     packages=setuptools.find_packages(),
+    entry_points={
+        'console_scripts': [
+            'libdna=libdna.cli:main',
+        ],
+    },
     test_suite='nose.collector',
     tests_require=['nose'],
     classifiers=[